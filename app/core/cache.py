@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from app.db.session import settings
+
+
+class TTLCache:
+    """
+    件数上限（LRU）と有効期限（TTL）付きのスレッドセーフなインメモリキャッシュ
+
+    ヒット・ミス・追い出し（件数上限による削除）・期限切れの回数を記録する。
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """キーに対応する値を取得（存在しないか期限切れの場合はNone）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return None
+
+            # 最近使用したエントリとして末尾に移動
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(
+        self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None
+    ) -> None:
+        """値を保存（件数上限を超えた場合は最も古く使われたエントリを削除）"""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        """キーに対応するエントリを削除（存在しない場合は何もしない）"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """全エントリと統計情報を破棄する"""
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+            self._expirations = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """キャッシュの統計情報を取得"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DataWatermark:
+    """
+    データの更新状況を表す値（MAX(updated_at)など）を一定間隔でポーリングして保持する
+
+    キャッシュのキーにこの値を含めることで、データが更新されると古いエントリが使われなくなる。
+    """
+
+    def __init__(self, poll_interval_seconds: float = 10.0):
+        self.poll_interval_seconds = poll_interval_seconds
+        self._value: Any = None
+        self._polled_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def current(self, fetch: Callable[[], Any]) -> Any:
+        """現在の値を取得（前回のポーリングから一定時間経過している場合のみfetchを呼ぶ）"""
+        with self._lock:
+            if self._needs_poll():
+                self._store(fetch())
+            return self._value
+
+    async def current_async(self, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """currentの非同期版（fetchはコルーチン関数）"""
+        if self._needs_poll():
+            value = await fetch()
+            with self._lock:
+                self._store(value)
+            return value
+        return self._value
+
+    def _needs_poll(self) -> bool:
+        return (
+            self._polled_at is None
+            or time.monotonic() - self._polled_at >= self.poll_interval_seconds
+        )
+
+    def _store(self, value: Any) -> None:
+        self._value = value
+        self._polled_at = time.monotonic()
+
+    def reset(self) -> None:
+        """保持している値を破棄し、次回の取得時にポーリングさせる"""
+        with self._lock:
+            self._value = None
+            self._polled_at = None
+
+
+# データ更新の透かし値（検索結果キャッシュとインメモリインデックスで共有）
+data_watermark = DataWatermark(
+    poll_interval_seconds=settings.data_watermark_poll_seconds
+)
+
+# search_storageのレスポンスキャッシュ
+search_response_cache = TTLCache(
+    max_entries=settings.search_cache_max_entries,
+    ttl_seconds=settings.search_cache_ttl_seconds,
+)
@@ -0,0 +1,111 @@
+import gzip
+import hashlib
+from dataclasses import dataclass, field
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+from app.db.session import settings
+
+
+@dataclass
+class CachedResponse:
+    """
+    シリアライズ済みのJSONと件数（検索結果キャッシュの値）
+
+    gzip圧縮したものは最初に要求されたときに作成して保持し、キャッシュのヒット時に再利用する。
+    """
+
+    body: bytes
+    row_count: int = 0
+    _gzip_body: Optional[bytes] = field(default=None, repr=False)
+
+    def gzip_body(self) -> bytes:
+        if self._gzip_body is None:
+            # 同じ内容から常に同じバイト列になるよう、更新日時（mtime）は0とする
+            self._gzip_body = gzip.compress(
+                self.body, compresslevel=settings.gzip_compress_level, mtime=0
+            )
+        return self._gzip_body
+
+
+def make_etag(key: str) -> str:
+    """正規化した検索条件とデータの透かし値を含むキーから強いETagを生成"""
+    return '"' + hashlib.blake2b(key.encode(), digest_size=16).hexdigest() + '"'
+
+
+def gzip_etag(etag: str) -> str:
+    """gzip圧縮した表現のETag（圧縮の有無で表現のバイト列が異なるため区別する）"""
+    return etag[:-1] + '-gzip"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    If-None-MatchのいずれかのETagが一致するか（弱い比較。圧縮した表現のETagも一致とみなす）
+    """
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates or gzip_etag(etag) in candidates
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """Accept-Encodingでgzipが許可されているか（q=0の指定は拒否とみなす）"""
+    if not accept_encoding:
+        return False
+    allowed = {}
+    for coding in accept_encoding.lower().split(","):
+        name, _, params = coding.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        allowed[name.strip()] = quality > 0
+    return allowed.get("gzip", allowed.get("*", False))
+
+
+def cache_headers(etag: Optional[str]) -> dict:
+    """ETag・Cache-Control・Varyのヘッダー"""
+    headers = {"Vary": "Accept-Encoding"}
+    if etag is not None:
+        headers["ETag"] = etag
+        headers[
+            "Cache-Control"
+        ] = f"public, max-age={settings.http_cache_max_age_seconds}"
+    return headers
+
+
+def not_modified_response(etag: str) -> Response:
+    """If-None-Matchが一致した場合の304レスポンス（本文なし）"""
+    return Response(status_code=304, headers=cache_headers(etag))
+
+
+def negotiated_response(
+    cached: CachedResponse,
+    request_headers: Headers,
+    etag: Optional[str] = None,
+    media_type: str = "application/json",
+) -> Response:
+    """
+    Accept-Encodingに応じて圧縮したレスポンスを返す（etagを指定した場合はETag・Cache-Controlを付ける）
+
+    AWS Lambda（Mangum）では、gzipのバイト列はUTF-8として解釈できないためbase64でエンコードされる。
+    """
+    if (
+        settings.gzip_enabled
+        and len(cached.body) >= settings.gzip_min_bytes
+        and accepts_gzip(request_headers.get("accept-encoding"))
+    ):
+        headers = cache_headers(gzip_etag(etag) if etag is not None else None)
+        headers["Content-Encoding"] = "gzip"
+        return Response(
+            content=cached.gzip_body(), media_type=media_type, headers=headers
+        )
+    return Response(
+        content=cached.body, media_type=media_type, headers=cache_headers(etag)
+    )
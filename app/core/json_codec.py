@@ -0,0 +1,46 @@
+import json
+from typing import Any
+
+from pydantic_core import from_json
+
+try:
+    # インストールされている場合は高速なorjsonを使用する
+    import orjson
+except ImportError:  # pragma: no cover - orjsonは任意の依存関係
+    orjson = None
+
+
+class RawJSON:
+    """DBから取得したデコード前のJSON文字列（必要になった時点でデコードする）"""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, RawJSON) and other.text == self.text
+
+    def __repr__(self) -> str:
+        return f"RawJSON({self.text!r})"
+
+
+def loads(data: Any) -> Any:
+    """JSON文字列をデコード（orjsonがない場合はpydantic-coreのパーサーを使用）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return from_json(data)
+
+
+def dumps(value: Any) -> str:
+    """値をJSON文字列にエンコード"""
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value, separators=(",", ":"))
+
+
+def decode_raw_json(value: Any) -> Any:
+    """RawJSONの場合はデコードし、それ以外の値はそのまま返す"""
+    if isinstance(value, RawJSON):
+        return loads(value.text)
+    return value
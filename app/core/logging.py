@@ -1,12 +1,24 @@
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
 from typing import Optional
 
 from app.db.session import settings
 
+# キュー経由で出力する場合のリスナー（バックグラウンドスレッドで実際の出力を行う）
+_queue_listener: Optional[logging.handlers.QueueListener] = None
+
 
 def setup_logging(log_level: Optional[str] = None) -> logging.Logger:
-    """ログ設定をセットアップする"""
+    """
+    ログ設定をセットアップする
+
+    LOG_QUEUE_ENABLEDが有効な場合は、ロガーにはキューへ積むだけのQueueHandlerを設定し、
+    フォーマット・出力はQueueListenerのスレッドで行う（リクエスト処理を出力でブロックしない）。
+    """
+    global _queue_listener
 
     # ログレベルを設定
     level = log_level or settings.log_level
@@ -18,6 +30,7 @@ def setup_logging(log_level: Optional[str] = None) -> logging.Logger:
 
     # 既存のハンドラーをクリア
     logger.handlers.clear()
+    stop_log_listener()
 
     # コンソールハンドラーを作成
     console_handler = logging.StreamHandler(sys.stdout)
@@ -32,11 +45,49 @@ def setup_logging(log_level: Optional[str] = None) -> logging.Logger:
     console_handler.setFormatter(formatter)
 
     # ハンドラーをロガーに追加
-    logger.addHandler(console_handler)
+    if settings.log_queue_enabled:
+        # task_done()で出力済みを確認できるよう、SimpleQueueではなくQueueを使用する
+        log_queue: queue.Queue = queue.Queue()
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        # ルートロガーのハンドラーでリクエスト処理中に同期的に出力されないよう、伝播させない
+        logger.propagate = False
+        _queue_listener = logging.handlers.QueueListener(
+            log_queue, console_handler, respect_handler_level=True
+        )
+        _queue_listener.start()
+    else:
+        logger.propagate = True
+        logger.addHandler(console_handler)
 
     return logger
 
 
+def stop_log_listener() -> None:
+    """キューに残っているログを出力してリスナーを停止する"""
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+
+def flush_logs() -> None:
+    """
+    キューに残っているログを出力する
+
+    Lambdaでは呼び出しの間は実行環境が停止するため、レスポンスを返す前に出力しておく。
+    """
+    listener = _queue_listener
+    if listener is not None:
+        # リスナーのスレッドは停止せず、キューに積まれたログが全て出力されるまで待つ
+        listener.queue.join()
+        for handler in listener.handlers:
+            handler.flush()
+
+
+# プロセス終了時にキューに残っているログを出力する
+atexit.register(stop_log_listener)
+
+
 def get_logger(name: str = "hakopita_fast_api") -> logging.Logger:
     """ロガーを取得する"""
     return logging.getLogger(name)
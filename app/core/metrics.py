@@ -0,0 +1,257 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core import json_codec
+from app.core.logging import get_logger
+
+if TYPE_CHECKING:
+    from app.core.request_log import RequestStats
+
+# Lambda環境でメトリクスを出力するロガー
+metrics_logger = get_logger("hakopita_fast_api.metrics")
+
+# レイテンシのヒストグラムのバケット（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# 件数のヒストグラムのバケット
+ROW_BUCKETS = (0, 1, 10, 100, 500, 1000, 2000, 5000, 10000)
+
+
+class Histogram:
+    """累積バケット形式（Prometheusのhistogram）の集計"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        # 末尾は+Inf（最大のバケットを超えた値）
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self) -> List[Tuple[str, int]]:
+        """(le, 累積件数)のリスト"""
+        result = []
+        total = 0
+        for bound, count in zip(
+            [*map(format_value, self.buckets), "+Inf"], self.counts
+        ):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+def format_value(value: float) -> str:
+    """Prometheusのテキスト形式の数値表記"""
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(labels: Dict[str, Any]) -> str:
+    """ラベルを{name="value",...}の形式に変換"""
+    if not labels:
+        return ""
+    pairs = (f'{name}="{escape_label_value(value)}"' for name, value in labels.items())
+    return "{" + ",".join(pairs) + "}"
+
+
+def escape_label_value(value: Any) -> str:
+    """ラベル値のバックスラッシュ・ダブルクォート・改行をエスケープ"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """
+    ルートごとのリクエストのメトリクスを集計する
+
+    リクエスト完了時にRequestStatsを1回記録するだけのため、本番環境で常時有効にできる。
+    キャッシュのヒット率はrender時に登録済みの統計情報から取得する。
+    """
+
+    # ヒストグラム名: (RequestStatsから値を取り出す関数, バケット, 説明)
+    HISTOGRAMS: Dict[
+        str, Tuple[Callable[["RequestStats"], float], Sequence[float], str]
+    ] = {
+        "request_duration_seconds": (
+            lambda stats: stats.elapsed_seconds(),
+            LATENCY_BUCKETS,
+            "Request latency",
+        ),
+        "db_duration_seconds": (
+            lambda stats: stats.db_seconds,
+            LATENCY_BUCKETS,
+            "Time spent in database access per request",
+        ),
+        "serialize_duration_seconds": (
+            lambda stats: stats.serialize_seconds,
+            LATENCY_BUCKETS,
+            "Time spent in schema conversion and serialization per request",
+        ),
+        "rows_returned": (
+            lambda stats: stats.row_count or 0,
+            ROW_BUCKETS,
+            "Rows returned per request",
+        ),
+    }
+
+    def __init__(self, prefix: str = "hakopita"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._requests: Dict[Tuple[str, str, int], int] = {}
+        self._rows_fetched: Dict[str, int] = {}
+        self._conversion_errors: Dict[str, int] = {}
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._caches: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self._last_logged_at = time.monotonic()
+
+    def register_cache(self, name: str, stats: Callable[[], Dict[str, Any]]) -> None:
+        """キャッシュの統計情報（TTLCache.stats形式）を出力対象に登録"""
+        self._caches[name] = stats
+
+    def record_request(self, route: str, stats: "RequestStats") -> None:
+        """完了したリクエストの記録を集計"""
+        with self._lock:
+            key = (route, stats.method, stats.status or 0)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            self._rows_fetched[route] = (
+                self._rows_fetched.get(route, 0) + stats.rows_fetched
+            )
+            self._conversion_errors[route] = (
+                self._conversion_errors.get(route, 0) + stats.conversion_errors
+            )
+            for name, (value_of, buckets, _) in self.HISTOGRAMS.items():
+                histogram = self._histograms.get((name, route))
+                if histogram is None:
+                    histogram = self._histograms[(name, route)] = Histogram(buckets)
+                histogram.observe(value_of(stats))
+
+    def render(self) -> str:
+        """Prometheusのテキスト形式で出力"""
+        p = self.prefix
+        lines: List[str] = []
+        with self._lock:
+            lines += [
+                f"# HELP {p}_requests_total Requests handled",
+                f"# TYPE {p}_requests_total counter",
+            ]
+            for (route, method, status), count in sorted(self._requests.items()):
+                labels = format_labels(
+                    {"route": route, "method": method, "status": status}
+                )
+                lines.append(f"{p}_requests_total{labels} {count}")
+
+            for name, values, help_text in (
+                (
+                    "rows_fetched_total",
+                    self._rows_fetched,
+                    "Rows fetched from the database",
+                ),
+                (
+                    "conversion_errors_total",
+                    self._conversion_errors,
+                    "Rows skipped by schema conversion errors",
+                ),
+            ):
+                lines += [
+                    f"# HELP {p}_{name} {help_text}",
+                    f"# TYPE {p}_{name} counter",
+                ]
+                for route, count in sorted(values.items()):
+                    lines.append(f"{p}_{name}{format_labels({'route': route})} {count}")
+
+            for name, (_, _, help_text) in self.HISTOGRAMS.items():
+                lines += [
+                    f"# HELP {p}_{name} {help_text}",
+                    f"# TYPE {p}_{name} histogram",
+                ]
+                for (hist_name, route), histogram in sorted(self._histograms.items()):
+                    if hist_name != name:
+                        continue
+                    for bound, count in histogram.cumulative_counts():
+                        labels = format_labels({"route": route, "le": bound})
+                        lines.append(f"{p}_{name}_bucket{labels} {count}")
+                    labels = format_labels({"route": route})
+                    lines.append(
+                        f"{p}_{name}_sum{labels} {format_value(histogram.sum)}"
+                    )
+                    lines.append(f"{p}_{name}_count{labels} {histogram.count}")
+
+        cache_stats = {name: stats() for name, stats in self._caches.items()}
+        for name, metric_type, help_text in (
+            ("hits", "counter", "Cache hits"),
+            ("misses", "counter", "Cache misses"),
+            ("evictions", "counter", "Cache evictions"),
+            ("entries", "gauge", "Cache entries"),
+            ("hit_rate", "gauge", "Cache hit rate"),
+        ):
+            metric = (
+                f"{p}_cache_{name}_total"
+                if metric_type == "counter"
+                else f"{p}_cache_{name}"
+            )
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {metric_type}"]
+            for cache_name, stats in cache_stats.items():
+                labels = format_labels({"cache": cache_name})
+                lines.append(f"{metric}{labels} {format_value(stats[name])}")
+
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """ルートごとの件数・レイテンシの概要とキャッシュの統計情報（ログ出力用）"""
+        with self._lock:
+            routes: Dict[str, Dict[str, Any]] = {}
+            for (route, _, status), count in self._requests.items():
+                summary = routes.setdefault(route, {"requests": 0, "errors": 0})
+                summary["requests"] += count
+                if status >= 500:
+                    summary["errors"] += count
+            for (name, route), histogram in self._histograms.items():
+                if name == "request_duration_seconds":
+                    routes[route]["latency_sum_seconds"] = round(histogram.sum, 6)
+                    routes[route]["latency_buckets"] = dict(
+                        histogram.cumulative_counts()
+                    )
+            for route, summary in routes.items():
+                summary["rows_fetched"] = self._rows_fetched.get(route, 0)
+                summary["conversion_errors"] = self._conversion_errors.get(route, 0)
+        return {
+            "routes": routes,
+            "caches": {name: stats() for name, stats in self._caches.items()},
+        }
+
+    def log_snapshot_if_due(
+        self, interval_seconds: float, now: Optional[float] = None
+    ) -> bool:
+        """
+        前回の出力からinterval_seconds以上経過していればsnapshotを1行のログに出力する
+
+        /metricsを収集できないLambda環境向け（ログから集計する）。
+        """
+        if interval_seconds <= 0:
+            return False
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if now - self._last_logged_at < interval_seconds:
+                return False
+            self._last_logged_at = now
+        metrics_logger.info(json_codec.dumps(self.snapshot()))
+        return True
+
+    def reset(self) -> None:
+        """集計をリセット（テスト用）"""
+        with self._lock:
+            self._requests.clear()
+            self._rows_fetched.clear()
+            self._conversion_errors.clear()
+            self._histograms.clear()
+            self._last_logged_at = time.monotonic()
+
+
+# アプリケーション全体のメトリクス
+metrics_registry = MetricsRegistry()
@@ -0,0 +1,136 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional
+
+from app.core import json_codec
+from app.core.logging import get_logger
+from app.core.metrics import MetricsRegistry
+
+# 1リクエスト1行のアクセスログを出力するロガー
+access_logger = get_logger("hakopita_fast_api.access")
+
+
+@dataclass
+class RequestStats:
+    """1リクエスト分の処理の記録（アクセスログに出力する）"""
+
+    route: str
+    method: str = "GET"
+    params: Dict[str, Any] = field(default_factory=dict)
+    status: Optional[int] = None
+    row_count: Optional[int] = None
+    cache: Optional[str] = None
+    rows_fetched: int = 0
+    conversion_errors: int = 0
+    db_seconds: float = 0.0
+    serialize_seconds: float = 0.0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    def elapsed_seconds(self) -> float:
+        """リクエスト開始からの経過時間"""
+        return time.perf_counter() - self.started_at
+
+    def to_log_line(self) -> str:
+        """コンパクトな1行のJSONに変換"""
+        record: Dict[str, Any] = {
+            "route": self.route,
+            "method": self.method,
+            "status": self.status,
+            "params": self.params,
+            "rows": self.row_count,
+            "db_ms": round(self.db_seconds * 1000, 2),
+            "serialize_ms": round(self.serialize_seconds * 1000, 2),
+            "total_ms": round(self.elapsed_seconds() * 1000, 2),
+        }
+        if self.cache is not None:
+            record["cache"] = self.cache
+        return json_codec.dumps(record)
+
+
+_current_stats: ContextVar[Optional[RequestStats]] = ContextVar(
+    "request_stats", default=None
+)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    """処理中のリクエストの記録を取得（リクエスト外ではNone）"""
+    return _current_stats.get()
+
+
+def update_request_stats(**values: Any) -> None:
+    """処理中のリクエストの記録を更新（リクエスト外では何もしない）"""
+    stats = _current_stats.get()
+    if stats is not None:
+        for name, value in values.items():
+            setattr(stats, name, value)
+
+
+def increment_request_stats(**amounts: int) -> None:
+    """処理中のリクエストの記録に件数を加算（リクエスト外では何もしない）"""
+    stats = _current_stats.get()
+    if stats is not None:
+        for name, amount in amounts.items():
+            setattr(stats, name, getattr(stats, name) + amount)
+
+
+@contextmanager
+def track_time(kind: str) -> Iterator[None]:
+    """
+    ブロック内の処理時間を処理中のリクエストの記録に加算する
+
+    Args:
+        kind: "db"（DBアクセス）または"serialize"（スキーマ変換・シリアライズ）
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = _current_stats.get()
+        if stats is not None:
+            attr = f"{kind}_seconds"
+            setattr(stats, attr, getattr(stats, attr) + time.perf_counter() - started)
+
+
+class RequestStatsMiddleware:
+    """
+    リクエストごとにRequestStatsを作成し、完了時にアクセスログの出力とメトリクスの集計を行うASGIミドルウェア
+
+    ペイロードは出力しないため、大きなレスポンスでもログのコストは一定となる。
+    メトリクスのルートはルーティングに一致したパスとし、一致しないパスは"unmatched"にまとめる。
+    """
+
+    def __init__(
+        self, app, access_log: bool = True, metrics: Optional[MetricsRegistry] = None
+    ):
+        self.app = app
+        self.access_log = access_log
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(route=scope["path"], method=scope["method"])
+        token = _current_stats.set(stats)
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                stats.status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            stats.status = 500
+            raise
+        finally:
+            _current_stats.reset(token)
+            if self.access_log:
+                access_logger.info(stats.to_log_line())
+            if self.metrics is not None:
+                # ルーティング後のscopeにはendpointが設定される
+                route = stats.route if "endpoint" in scope else "unmatched"
+                self.metrics.record_request(route, stats)
@@ -1,10 +1,86 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
 
-from sqlalchemy import and_, between, or_
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, between, func, literal, or_, select, true, type_coerce, union_all
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query, Session
 
-from app.models.storage_model import StorageData
-from app.schemas.storage_schemas import SearchStorageRequest
+from app.core.request_log import track_time
+from app.db.replicas import ReplicaRouter
+from app.models.storage_model import JSONEncodedDict, StorageData
+from app.schemas.storage_schemas import SearchStorageRequest, StorageDataResponse, StorageDataSearchResponse
+
+# 単一値指定時のデフォルトの許容範囲
+DEFAULT_TOLERANCE = 0.5
+
+# 検索対象の寸法
+DIMENSIONS = ("width", "depth", "height")
+
+# レスポンス用の読み取りでのJSON列の型（デコードせずRawJSONとして読み込み、スキーマへの変換時にデコードする）
+RAW_JSON_TYPE = JSONEncodedDict(lazy=True)
+
+
+def response_columns(schema: Any) -> Tuple[Any, ...]:
+    """
+    スキーマのフィールドに対応する列のみを読み込むための列のリスト
+
+    JSON列はRAW_JSON_TYPEとして読み込む（モデルの属性のデコードには影響しない）。
+    """
+    columns = []
+    for field_name in schema.model_fields:
+        column = getattr(StorageData, field_name)
+        if isinstance(column.type, JSONEncodedDict):
+            column = type_coerce(column, RAW_JSON_TYPE).label(field_name)
+        columns.append(column)
+    return tuple(columns)
+
+
+# 検索レスポンスに必要な列（StorageDataSearchResponseのフィールドに対応する列のみ）
+# image_url_listや分析結果の尤度など、検索レスポンスで使わない列は読み込まない
+SEARCH_RESPONSE_COLUMNS = response_columns(StorageDataSearchResponse)
+
+# fetch_storageのレスポンスに必要な列（StorageDataResponseのフィールドに対応する列のみ）
+FETCH_RESPONSE_COLUMNS = response_columns(StorageDataResponse)
+
+# 件数・分布の集計キューブ（/search_storage/facets）の構築に必要な列
+FACET_COLUMNS = (
+    StorageData.storage_data_id,
+    StorageData.width,
+    StorageData.depth,
+    StorageData.height,
+    StorageData.price,
+    StorageData.colors,
+    StorageData.materials,
+    StorageData.updated_at,
+)
+
+
+def resolve_dimension_bounds(
+    params: SearchStorageRequest,
+) -> Dict[str, Optional[Tuple[float, float]]]:
+    """
+    検索パラメータから寸法ごとの検索範囲（下限, 上限）を求める
+
+    範囲指定が有効で上下限が揃っている場合はその範囲を、
+    そうでなく単一値が指定されている場合は許容範囲付きの範囲を使用する。
+    指定がない寸法はNoneとなる。
+    """
+    bounds: Dict[str, Optional[Tuple[float, float]]] = {}
+    for dim in DIMENSIONS:
+        lower_limit = getattr(params, f"{dim}_lower_limit")
+        upper_limit = getattr(params, f"{dim}_upper_limit")
+        value = getattr(params, dim)
+        if (
+            getattr(params, f"use_{dim}_range")
+            and lower_limit is not None
+            and upper_limit is not None
+        ):
+            bounds[dim] = (lower_limit, upper_limit)
+        elif value is not None:
+            bounds[dim] = (value - DEFAULT_TOLERANCE, value + DEFAULT_TOLERANCE)
+        else:
+            bounds[dim] = None
+    return bounds
 
 
 class StorageDataCRUD:
@@ -21,17 +97,133 @@ class StorageDataCRUD:
             .first()
         )
 
-    def get_by_ids(self, storage_data_ids: List[str]) -> List[StorageData]:
-        """IDリストでストレージデータを取得"""
-        return (
-            self.db.query(StorageData)
-            .filter(StorageData.storage_data_id.in_(storage_data_ids))
-            .all()
-        )
+    def get_by_ids(
+        self, storage_data_ids: List[str], columns: Optional[Sequence[Any]] = None
+    ) -> List[Any]:
+        """
+        IDリストでストレージデータを取得
+
+        columnsを指定した場合はその列のみを読み込み、Rowのリストを返す。
+        """
+        query = self.db.query(*columns) if columns else self.db.query(StorageData)
+        return query.filter(StorageData.storage_data_id.in_(storage_data_ids)).all()
+
+    def search_by_params(
+        self,
+        params: SearchStorageRequest,
+        page: int = 0,
+        page_size: Optional[int] = None,
+        after_id: Optional[str] = None,
+    ) -> Tuple[List[Row], int]:
+        """
+        検索パラメータに基づいてストレージデータを検索
+
+        検索レスポンスに必要な列（SEARCH_RESPONSE_COLUMNS）のみを読み込み、Rowのリストを返す。
+        結果はstorage_data_id順に並ぶ。after_idを指定した場合はOFFSETを使わず、
+        after_idより後のデータから取得する（キーセットページネーション）。
+
+        Args:
+            params: 検索パラメータ
+            page: ページ番号（after_id指定時は無視）
+            page_size: ページサイズ（Noneの場合は全件を取得）
+            after_id: 前のページで最後に返したストレージデータID
+
+        Returns:
+            Tuple[List[Row], int]: (ページ内のストレージデータの行リスト, 一致した件数)
+            after_idを指定した場合、件数はafter_idより後の一致件数となる。
+        """
+        results = self.build_paged_search_query(
+            params, page=page, page_size=page_size, after_id=after_id
+        ).all()
+
+        if results:
+            return results, results[0].total_count
+
+        # ページが範囲外の場合は件数のみを別途取得
+        if page_size is not None and after_id is None and page > 0:
+            return [], self.build_search_query(params).count()
+        return [], 0
+
+    def build_paged_search_query(
+        self,
+        params: SearchStorageRequest,
+        page: int = 0,
+        page_size: Optional[int] = None,
+        after_id: Optional[str] = None,
+    ) -> Query:
+        """
+        1ページ分の検索クエリを構築する（storage_data_id順、各行に一致件数total_countを含む）
 
-    def search_by_params(self, params: SearchStorageRequest) -> List[StorageData]:
-        """検索パラメータに基づいてストレージデータを検索"""
-        query = self.db.query(StorageData)
+        引数はsearch_by_paramsと同じ。
+        """
+        query = self.build_search_query(params, after_id=after_id)
+
+        # 総件数はウィンドウ関数で同じクエリ内で取得し、ページ分の行のみを読み込む
+        paged_query = query.add_columns(
+            func.count().over().label("total_count")
+        ).order_by(StorageData.storage_data_id)
+        if page_size is not None:
+            if after_id is None:
+                paged_query = paged_query.offset(page * page_size)
+            paged_query = paged_query.limit(page_size)
+        return paged_query
+
+    def search_many_by_params(
+        self, params_list: Sequence[SearchStorageRequest]
+    ) -> List[Tuple[List[Row], int]]:
+        """
+        複数の検索条件をUNION ALLの1クエリで検索する
+
+        検索条件ごとのページ（search_by_paramsと同じくstorage_data_id順）を
+        1回の往復で取得する。各行にはquery_index（params_listの位置）とtotal_countが含まれる。
+
+        Returns:
+            List[Tuple[List[Row], int]]: 検索条件ごとの(ページ内の行リスト, 一致した件数)
+        """
+        pages = []
+        for index, params in enumerate(params_list):
+            paged_query = (
+                self.build_search_query(params)
+                .add_columns(
+                    literal(index).label("query_index"),
+                    func.count().over().label("total_count"),
+                )
+                .order_by(StorageData.storage_data_id)
+                .offset(params.page * params.page_size)
+                .limit(params.page_size)
+            )
+            # ORDER BY・LIMITを含むため、SQLiteでも結合できるようサブクエリとして包む
+            pages.append(select(paged_query.subquery()))
+        statement = pages[0] if len(pages) == 1 else union_all(*pages)
+
+        grouped: List[List[Row]] = [[] for _ in params_list]
+        for row in self.db.execute(statement).all():
+            grouped[row.query_index].append(row)
+
+        results = []
+        for params, rows in zip(params_list, grouped):
+            # UNION ALLの結果の順序は保証されないため、検索条件ごとに並べ直す
+            rows.sort(key=lambda row: row.storage_data_id)
+            if rows:
+                results.append((rows, rows[0].total_count))
+            elif params.page > 0:
+                # ページが範囲外の場合は件数のみを別途取得
+                results.append(([], self.build_search_query(params).count()))
+            else:
+                results.append(([], 0))
+        return results
+
+    def build_search_query(
+        self, params: SearchStorageRequest, after_id: Optional[str] = None
+    ) -> Query:
+        """
+        検索条件のクエリを構築する（並び順・ページネーションは含まない）
+
+        Args:
+            params: 検索パラメータ
+            after_id: 指定した場合、このIDより後のデータに絞り込む
+        """
+        query = self.db.query(*SEARCH_RESPONSE_COLUMNS)
 
         # ストレージカテゴリでフィルタ
         query = query.filter(
@@ -44,147 +236,157 @@ class StorageDataCRUD:
         # アクティブフラグでフィルタ
         query = query.filter(StorageData.active == True)
         
-        # 幅・奥行きの条件を生成する
-        wd_conditions = []
-        is_width_specified = False
-        is_depth_specified = False
-
-        # 幅の処理
-        if (
-            params.use_width_range
-            and params.width_lower_limit is not None
-            and params.width_upper_limit is not None
-        ):
-            wd_conditions.append(
-                between(
-                    StorageData.width,
-                    params.width_lower_limit,
-                    params.width_upper_limit,
-                )
-            )
-            is_width_specified = True
-        elif params.width is not None:
-            tolerance = 0.5
-            wd_conditions.append(
-                between(
-                    StorageData.width,
-                    params.width - tolerance,
-                    params.width + tolerance,
-                )
-            )
-            is_width_specified = True
+        bounds = resolve_dimension_bounds(params)
 
-        # 奥行きの処理
-        if (
-            params.use_depth_range
-            and params.depth_lower_limit is not None
-            and params.depth_upper_limit is not None
-        ):
-            wd_conditions.append(
-                between(
-                    StorageData.depth,
-                    params.depth_lower_limit,
-                    params.depth_upper_limit,
-                )
-            )
-            is_depth_specified = True
-        elif params.depth is not None:
-            tolerance = 0.5
-            wd_conditions.append(
-                between(
-                    StorageData.depth,
-                    params.depth - tolerance,
-                    params.depth + tolerance,
-                )
+        # 幅・奥行きの条件を生成する
+        if params.enable_inverted_search:
+            # 反転検索の場合：幅と奥行きの入れ替えを許容するため、向きに依存しない列で検索
+            query = query.filter(
+                self._get_canonical_conditions(bounds["width"], bounds["depth"])
             )
-            is_depth_specified = True
-        
-        # 反転検索が有効かつ、幅と奥行きのいずれかが指定されている場合は、反転検索の条件を作成
-        if all([
-            params.enable_inverted_search,
-            (is_width_specified or is_depth_specified)
-        ]):
-            # 反転検索の場合：幅と奥行きを入れ替えて検索
-            inverted_wd_conditions = self._get_inverted_conditions(params)
-            
-            # 元の幅・奥行きと、反転の幅・奥行きをORで結合
-            query = query.filter(or_(and_(True, *wd_conditions), and_(True, *inverted_wd_conditions)))
-        
-        # 反転検索が無効の場合は、幅・奥行きの条件をANDで結合
         else:
-            query = query.filter(and_(True, *wd_conditions))
+            # 反転検索が無効の場合は、幅・奥行きの条件をANDで結合
+            if bounds["width"] is not None:
+                query = query.filter(between(StorageData.width, *bounds["width"]))
+            if bounds["depth"] is not None:
+                query = query.filter(between(StorageData.depth, *bounds["depth"]))
 
         # 高さの処理
-        height_conditions = []
-        if (
-            params.use_height_range
-            and params.height_lower_limit is not None
-            and params.height_upper_limit is not None
-        ):
-            height_conditions.append(
-                between(
-                    StorageData.height,
-                    params.height_lower_limit,
-                    params.height_upper_limit,
-                )
+        if bounds["height"] is not None:
+            query = query.filter(between(StorageData.height, *bounds["height"]))
+        
+        # キーセットページネーション：前のページの最後のIDより後から取得
+        if after_id is not None:
+            query = query.filter(StorageData.storage_data_id > after_id)
+
+        return query
+
+    def _get_canonical_conditions(
+        self,
+        width_bounds: Optional[Tuple[float, float]],
+        depth_bounds: Optional[Tuple[float, float]],
+    ) -> Any:
+        """
+        反転検索の条件をdim_short（幅・奥行きの短い方）とdim_long（長い方）の条件として生成
+
+        「(幅が範囲A かつ 奥行きが範囲B) または (奥行きが範囲A かつ 幅が範囲B)」は、
+        短い方・長い方に対する条件に書き換えられる。
+        範囲の上下限がともに小さい方を短い方に割り当てられる場合は単純なANDの範囲条件となり、
+        複合インデックス（ix_storage_search_canonical）の範囲スキャンで処理できる。
+        """
+        short, long = StorageData.dim_short, StorageData.dim_long
+
+        if width_bounds is None and depth_bounds is None:
+            return true()
+
+        if width_bounds is None or depth_bounds is None:
+            # 片方のみ指定：短い方か長い方のどちらかが範囲内
+            lower_limit, upper_limit = width_bounds or depth_bounds
+            return and_(
+                short <= upper_limit,
+                long >= lower_limit,
+                or_(short >= lower_limit, long <= upper_limit),
             )
-        elif params.height is not None:
-            tolerance = 0.5  # デフォルトの許容範囲
-            height_conditions.append(
-                between(
-                    StorageData.height,
-                    params.height - tolerance,
-                    params.height + tolerance,
-                )
+
+        # 上下限がともに小さい範囲を短い方に割り当てる
+        smaller, larger = sorted([width_bounds, depth_bounds])
+        if smaller[1] <= larger[1]:
+            return and_(between(short, *smaller), between(long, *larger))
+
+        # 一方の範囲が他方を含む場合は、両方の割り当てをORで結合
+        return or_(
+            and_(between(short, *width_bounds), between(long, *depth_bounds)),
+            and_(between(short, *depth_bounds), between(long, *width_bounds)),
+        )
+
+    def get_dimension_rows(
+        self, country_code: str, storage_category: int
+    ) -> List[Tuple[str, float, float, float]]:
+        """寸法インデックス構築用に、アクティブなデータのIDとサイズのみを取得"""
+        return (
+            self.db.query(
+                StorageData.storage_data_id,
+                StorageData.width,
+                StorageData.depth,
+                StorageData.height,
             )
-        
-        if height_conditions:
-            query = query.filter(and_(True, *height_conditions))
-        
-        print(query.statement)
-        return query.all()
+            .filter(StorageData.country_code == country_code)
+            .filter(StorageData.storage_category == storage_category)
+            .filter(StorageData.active == True)
+            .all()
+        )
 
-    def _get_inverted_conditions(self, params: SearchStorageRequest) -> List[Any]:
-        """反転検索の条件を生成"""
- 
-        inverted_conditions = []
-        
-        # 幅と奥行きの条件を入れ替えて新しい条件を生成
-        for dim in ['width', 'depth']:
-            inverted_dim = 'depth' if dim == 'width' else 'width'
-            
-            # 範囲指定の場合
-            use_range_key = f'use_{dim}_range'
-            if getattr(params, use_range_key, False):
-                lower_limit_key = f'{dim}_lower_limit'
-                upper_limit_key = f'{dim}_upper_limit'
-                lower_limit = getattr(params, lower_limit_key)
-                upper_limit = getattr(params, upper_limit_key)
-                
-                if lower_limit is not None and upper_limit is not None:
-                    if inverted_dim == 'width':
-                        inverted_conditions.append(
-                            between(StorageData.width, lower_limit, upper_limit)
-                        )
-                    else:
-                        inverted_conditions.append(
-                            between(StorageData.depth, lower_limit, upper_limit)
-                        )
-            
-            # 単一値指定の場合
-            elif getattr(params, dim, None) is not None:
-                tolerance = 0.5  # デフォルトの許容範囲
-                value = getattr(params, dim)
-                
-                if inverted_dim == 'width':
-                    inverted_conditions.append(
-                        between(StorageData.width, value - tolerance, value + tolerance)
-                    )
-                else:
-                    inverted_conditions.append(
-                        between(StorageData.depth, value - tolerance, value + tolerance)
-                    )
-        return inverted_conditions
+    def get_facet_rows(self, country_code: str, storage_category: int) -> List[Row]:
+        """集計キューブ構築用に、アクティブなデータの寸法・価格・色・素材・更新日時のみを取得"""
+        return (
+            self.db.query(*FACET_COLUMNS)
+            .filter(StorageData.country_code == country_code)
+            .filter(StorageData.storage_category == storage_category)
+            .filter(StorageData.active == True)
+            .all()
+        )
+
+    def get_facet_rows_updated_since(self, since: Any) -> List[Row]:
+        """
+        updated_atがsince以降のデータの集計に必要な列を取得（集計キューブの差分更新用）
+
+        国コード・カテゴリ・アクティブフラグの変更も反映するため、これらの列も含め全データから取得する。
+        """
+        return (
+            self.db.query(
+                *FACET_COLUMNS,
+                StorageData.country_code,
+                StorageData.storage_category,
+                StorageData.active,
+            )
+            .filter(StorageData.updated_at >= since)
+            .all()
+        )
+
+    def count_active(self, country_code: str, storage_category: int) -> int:
+        """国コード・カテゴリごとのアクティブなデータの件数"""
+        return (
+            self.db.query(func.count())
+            .select_from(StorageData)
+            .filter(StorageData.country_code == country_code)
+            .filter(StorageData.storage_category == storage_category)
+            .filter(StorageData.active == True)
+            .scalar()
+        )
+
+    def get_by_ids_in_order(
+        self, storage_data_ids: List[str], columns: Optional[Sequence[Any]] = None
+    ) -> List[Any]:
+        """
+        IDリストでストレージデータを取得し、指定されたIDの順序に並べ替える
+
+        columnsを指定した場合はその列のみを読み込み、Rowのリストを返す。
+        """
+        query = self.db.query(*columns) if columns else self.db.query(StorageData)
+        rows = query.filter(StorageData.storage_data_id.in_(storage_data_ids)).all()
+        rows_by_id = {row.storage_data_id: row for row in rows}
+        return [rows_by_id[i] for i in storage_data_ids if i in rows_by_id]
+
+    def get_updated_at_by_ids(self, storage_data_ids: List[str]) -> Dict[str, Any]:
+        """IDリストで各データの更新日時のみを取得（存在しないIDは含まれない）"""
+        rows = (
+            self.db.query(StorageData.storage_data_id, StorageData.updated_at)
+            .filter(StorageData.storage_data_id.in_(storage_data_ids))
+            .all()
+        )
+        return {storage_data_id: updated_at for storage_data_id, updated_at in rows}
+
+    def get_data_watermark(self) -> Tuple[Any, int]:
+        """
+        データの更新状況を表す値（最終更新日時と件数）を取得
+
+        更新・追加ではMAX(updated_at)が、削除では件数が変化する。
+        updated_atのインデックスによりMAXはインデックスの末尾の参照のみで取得できる。
+        """
+        max_updated_at, row_count = self.db.query(
+            func.max(StorageData.updated_at), func.count()
+        ).one()
+        return max_updated_at, row_count
 
     def get_all(self, skip: int = 0, limit: int = 100) -> List[StorageData]:
         """全ストレージデータを取得（ページネーション付き）"""
@@ -214,4 +416,104 @@ class StorageDataCRUD:
 
     def count(self) -> int:
         """ストレージデータの総数を取得"""
-        return self.db.query(StorageData).count() 
\ No newline at end of file
+        return self.db.query(StorageData).count()
+
+
+class AsyncStorageDataCRUD:
+    """
+    ストレージデータの非同期CRUD操作クラス
+
+    AsyncSession.run_syncでStorageDataCRUDの処理を実行する（読み取り専用）。
+    クエリの組み立ては同期版と共通で、DBとの通信は非同期ドライバで行われるため
+    待ち時間中にイベントループを止めない。
+    """
+
+    def __init__(self, db: AsyncSession, router: Optional[ReplicaRouter] = None):
+        self.db = db
+        self.router = router
+
+    async def _run(self, method_name: str, *args: Any, **kwargs: Any) -> Any:
+        """
+        同期版の同名メソッドを非同期セッション上で実行
+
+        routerを指定した場合は、レプリカの異常検知・ヘッジ付きでrouter経由で実行する。
+        """
+
+        def call(session: Session) -> Any:
+            return getattr(StorageDataCRUD(session), method_name)(*args, **kwargs)
+
+        with track_time("db"):
+            if self.router is not None:
+                return await self.router.run_sync(call, session=self.db)
+            return await self.db.run_sync(call)
+
+    async def get_by_id(self, storage_data_id: str) -> Optional[StorageData]:
+        """IDでストレージデータを取得"""
+        return await self._run("get_by_id", storage_data_id)
+
+    async def get_by_ids(
+        self, storage_data_ids: List[str], columns: Optional[Sequence[Any]] = None
+    ) -> List[Any]:
+        """IDリストでストレージデータを取得"""
+        return await self._run("get_by_ids", storage_data_ids, columns=columns)
+
+    async def search_by_params(
+        self,
+        params: SearchStorageRequest,
+        page: int = 0,
+        page_size: Optional[int] = None,
+        after_id: Optional[str] = None,
+    ) -> Tuple[List[Row], int]:
+        """検索パラメータに基づいてストレージデータを検索（StorageDataCRUD.search_by_paramsを参照）"""
+        return await self._run(
+            "search_by_params", params, page=page, page_size=page_size, after_id=after_id
+        )
+
+    async def stream_search_by_params(
+        self,
+        params: SearchStorageRequest,
+        page: int = 0,
+        page_size: Optional[int] = None,
+        after_id: Optional[str] = None,
+        chunk_size: int = 500,
+    ) -> AsyncIterator[List[Row]]:
+        """
+        検索結果をサーバーサイドカーソルでchunk_size件ずつ読み込み、読み込んだ分から返す
+
+        引数・並び順はsearch_by_paramsと同じで、各行にはtotal_countが含まれる。
+        全件をメモリ上に保持しないため、ページサイズが大きい場合もメモリ使用量は一定となる。
+        レプリカのヘッジは行わない（読み込み途中で別の接続に切り替えられないため）。
+        """
+        statement = StorageDataCRUD(self.db.sync_session).build_paged_search_query(
+            params, page=page, page_size=page_size, after_id=after_id
+        ).statement
+        result = await self.db.stream(statement.execution_options(yield_per=chunk_size))
+        try:
+            async for rows in result.partitions():
+                yield rows
+        finally:
+            await result.close()
+
+    async def search_many_by_params(
+        self, params_list: Sequence[SearchStorageRequest]
+    ) -> List[Tuple[List[Row], int]]:
+        """複数の検索条件をUNION ALLの1クエリで検索（StorageDataCRUD.search_many_by_paramsを参照）"""
+        return await self._run("search_many_by_params", params_list)
+
+    async def get_by_ids_in_order(
+        self, storage_data_ids: List[str], columns: Optional[Sequence[Any]] = None
+    ) -> List[Any]:
+        """IDリストでストレージデータを取得し、指定されたIDの順序に並べ替える"""
+        return await self._run("get_by_ids_in_order", storage_data_ids, columns=columns)
+
+    async def get_updated_at_by_ids(self, storage_data_ids: List[str]) -> Dict[str, Any]:
+        """IDリストで各データの更新日時のみを取得"""
+        return await self._run("get_updated_at_by_ids", storage_data_ids)
+
+    async def get_data_watermark(self) -> Tuple[Any, int]:
+        """データの更新状況を表す値（最終更新日時と件数）を取得"""
+        return await self._run("get_data_watermark")
+
+    async def count(self) -> int:
+        """ストレージデータの総数を取得"""
+        return await self._run("count")
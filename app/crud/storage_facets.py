@@ -0,0 +1,461 @@
+import itertools
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import anyio
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.crud.storage_crud import DIMENSIONS, StorageDataCRUD, resolve_dimension_bounds
+from app.crud.storage_index import storage_index
+from app.db.session import settings
+from app.schemas.storage_schemas import SearchStorageRequest
+
+# 価格の区間の境界（最後の区間は上限なし）
+PRICE_BUCKET_EDGES = (0, 1000, 2000, 3000, 5000, 10000, 20000, 50000)
+
+# 寸法の区間の範囲（下限・上限のインデックス。上限は含まない）
+BucketRange = Tuple[int, int]
+
+
+class FacetCube:
+    """
+    (country_code, storage_category)ごとの、寸法（幅×奥行き×高さ）の区間ごとの件数とその累積和、
+    およびデータごとの価格帯・色・素材
+
+    3次元の累積和（prefix）により、寸法の直方体範囲の件数は一致件数によらず8点の参照で求められる。
+    最後の区間は上限なし（max_cm以上の寸法を含む）。
+    価格帯・色・素材はデータごとのチャネル（[価格の区間..., 色..., 素材...]）のリストとして
+    ID順の疎な形式（CSR）で保持し、一致したデータの分のみ集計する。
+    """
+
+    def __init__(
+        self,
+        bucket_size: float,
+        buckets: int,
+        colors: Sequence[int],
+        materials: Sequence[int],
+    ):
+        self.bucket_size = bucket_size
+        self.buckets = buckets
+        self.colors = list(colors)
+        self.materials = list(materials)
+        self.color_offset = len(PRICE_BUCKET_EDGES)
+        self.material_offset = self.color_offset + len(self.colors)
+        self.channels = self.material_offset + len(self.materials)
+        self._color_channels = {
+            value: self.color_offset + i for i, value in enumerate(self.colors)
+        }
+        self._material_channels = {
+            value: self.material_offset + i for i, value in enumerate(self.materials)
+        }
+
+        self.counts = np.zeros((buckets, buckets, buckets), dtype=np.int32)
+        self.prefix = np.zeros((buckets + 1, buckets + 1, buckets + 1), dtype=np.int32)
+        # データごとの(セルの位置, チャネル...)。差分更新時に以前の値の寄与を差し引くために保持する
+        self.entries: Dict[str, Tuple[int, ...]] = {}
+        # ID順のデータごとのチャネル（row_idsのi番目のチャネルは
+        # row_channels[row_offsets[i]:row_offsets[i + 1]]）
+        self.row_ids = np.empty(0, dtype=object)
+        self.row_offsets = np.zeros(1, dtype=np.int64)
+        self.row_channels = np.empty(0, dtype=np.int32)
+        self.max_updated_at: Any = None
+        self.watermark: Any = None
+        self.built_at = time.monotonic()
+
+    def copy(self) -> "FacetCube":
+        """差分更新用の複製（参照中のキューブは変更しない）"""
+        cube = FacetCube(self.bucket_size, self.buckets, self.colors, self.materials)
+        cube.counts = self.counts.copy()
+        cube.entries = dict(self.entries)
+        cube.max_updated_at = self.max_updated_at
+        cube.built_at = self.built_at
+        return cube
+
+    def bucket_of(self, value: float) -> int:
+        """寸法の値の区間のインデックス"""
+        return min(max(int(value // self.bucket_size), 0), self.buckets - 1)
+
+    def entry_for(self, row: Any) -> Optional[Tuple[int, ...]]:
+        """
+        行の(セルの位置, チャネル...)を求める
+
+        キューブの構築時になかった色・素材を含む場合はNone（キューブの再構築が必要）。
+        """
+        i, j, k = (self.bucket_of(getattr(row, dim)) for dim in DIMENSIONS)
+        price_bucket = (
+            int(np.searchsorted(PRICE_BUCKET_EDGES, row.price, side="right")) - 1
+        )
+        channels = [max(price_bucket, 0)]
+        for values, channel_map in (
+            (row.colors, self._color_channels),
+            (row.materials, self._material_channels),
+        ):
+            for value in set(values or []):
+                if value not in channel_map:
+                    return None
+                channels.append(channel_map[value])
+        return ((i * self.buckets + j) * self.buckets + k, *channels)
+
+    def add(self, storage_data_id: str, entry: Tuple[int, ...]) -> None:
+        self.counts.reshape(-1)[entry[0]] += 1
+        self.entries[storage_data_id] = entry
+
+    def remove(self, storage_data_id: str) -> None:
+        entry = self.entries.pop(storage_data_id, None)
+        if entry is not None:
+            self.counts.reshape(-1)[entry[0]] -= 1
+
+    def update_aggregates(self) -> None:
+        """件数の累積和とID順のデータごとのチャネルを再計算する"""
+        prefix = np.zeros_like(self.prefix)
+        prefix[1:, 1:, 1:] = (
+            self.counts.cumsum(axis=0, dtype=np.int32).cumsum(axis=1).cumsum(axis=2)
+        )
+        self.prefix = prefix
+
+        ids = sorted(self.entries)
+        lengths = np.array([len(self.entries[i]) - 1 for i in ids], dtype=np.int64)
+        self.row_ids = np.array(ids, dtype=object)
+        self.row_offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        self.row_channels = np.fromiter(
+            (channel for i in ids for channel in self.entries[i][1:]),
+            dtype=np.int32,
+            count=int(self.row_offsets[-1]),
+        )
+
+    def channel_totals(self, ids: np.ndarray) -> np.ndarray:
+        """IDリストのデータのチャネルごとの件数を返す（キューブにないIDは無視する）"""
+        positions = np.searchsorted(self.row_ids, ids)
+        found = positions < len(self.row_ids)
+        found[found] = self.row_ids[positions[found]] == ids[found]
+        positions = positions[found]
+
+        starts = self.row_offsets[positions]
+        lengths = self.row_offsets[positions + 1] - starts
+        # 各データのチャネルの位置を連結する
+        flat = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        flat += np.arange(lengths.sum())
+        return np.bincount(self.row_channels[flat], minlength=self.channels)
+
+    def box_sums(self, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        """
+        複数の直方体範囲（lower以上upper未満の区間のインデックス、形状(n, 3)）の件数を返す
+        """
+        upper = np.maximum(upper, lower)
+        sums = np.zeros(len(lower), dtype=np.int64)
+        for corner in itertools.product((0, 1), repeat=3):
+            index = tuple(
+                np.where(use_upper, upper[:, axis], lower[:, axis])
+                for axis, use_upper in enumerate(corner)
+            )
+            sign = 1 if (3 - sum(corner)) % 2 == 0 else -1
+            sums += sign * self.prefix[index]
+        return sums
+
+
+def query_boxes(
+    ranges: Sequence[BucketRange], inverted: bool
+) -> List[Tuple[Tuple[int, ...], Tuple[int, ...], int]]:
+    """
+    検索条件を直方体範囲の符号付きの和（(下限, 上限, 符号)のリスト）で表す
+
+    反転検索は「(幅がW かつ 奥行きがD) または (幅がD かつ 奥行きがW)」のため、
+    2つの直方体の和から共通部分（幅・奥行きともにW∩D）を差し引く。
+    """
+    (w0, w1), (d0, d1), (h0, h1) = ranges
+    boxes = [((w0, d0, h0), (w1, d1, h1), 1)]
+    if inverted:
+        i0, i1 = max(w0, d0), min(w1, d1)
+        boxes.append(((d0, w0, h0), (d1, w1, h1), 1))
+        boxes.append(((i0, i0, h0), (i1, i1, h1), -1))
+    return boxes
+
+
+class StorageFacetIndex:
+    """
+    検索条件に一致するデータの寸法・価格・色・素材の分布を返すための集計キューブのインメモリインデックス
+
+    国コードとストレージカテゴリごとにFacetCubeを持ち、データ更新の透かし値が変わると
+    updated_atが前回以降のデータのみを読み込んで差分を反映する。
+    削除されたデータや新しい色・素材がある場合、ttl_secondsを過ぎた場合は再構築する。
+    """
+
+    def __init__(
+        self,
+        bucket_size: float = 5.0,
+        max_cm: float = 200.0,
+        ttl_seconds: float = 3600.0,
+    ):
+        self.bucket_size = bucket_size
+        self.buckets = max(int(np.ceil(max_cm / bucket_size)), 1)
+        self.ttl_seconds = ttl_seconds
+        self._cubes: Dict[Tuple[str, int], FacetCube] = {}
+        self._lock = threading.Lock()
+
+    def clear(self) -> None:
+        """全キューブを破棄する"""
+        with self._lock:
+            self._cubes.clear()
+
+    def get_cube(
+        self,
+        db: Session,
+        country_code: str,
+        storage_category: int,
+        watermark: Any = None,
+    ) -> FacetCube:
+        """
+        キューブを取得（未構築・期限切れの場合は構築、データ更新済みの場合は差分を反映）
+
+        DBアクセスを含むため、ロックは保持せずに新しいキューブを作成し、置き換えのみロック内で行う。
+        run_sync内での構築は集計の間もイベントループを止めるため、
+        非同期の処理からは事前にprepare_cubeで構築しておく。
+        """
+        key = (country_code, storage_category)
+        cube = self._cached_cube(key)
+        if cube is not None and (watermark is None or cube.watermark == watermark):
+            return cube
+
+        refreshed = None
+        if cube is not None and cube.max_updated_at is not None:
+            rows, active_count = self._fetch_updates(
+                db, cube, country_code, storage_category
+            )
+            refreshed = self._refresh_cube(
+                cube, rows, active_count, country_code, storage_category
+            )
+        if refreshed is None:
+            rows = StorageDataCRUD(db).get_facet_rows(country_code, storage_category)
+            refreshed = self._build_cube(rows)
+        return self._store_cube(key, refreshed, watermark)
+
+    async def prepare_cube(
+        self,
+        db: AsyncSession,
+        country_code: str,
+        storage_category: int,
+        watermark: Any = None,
+    ) -> FacetCube:
+        """
+        キューブを事前に構築・更新（非同期版のget_cube）
+
+        DBからの読み込みのみrun_syncで行い、キューブの構築・差分の反映はワーカースレッドで
+        行うため、コールドスタート時も構築の間イベントループを止めない。
+        続けてrun_sync内で呼び出すget_cubeは構築済みのキューブを返す。
+        """
+        key = (country_code, storage_category)
+        cube = self._cached_cube(key)
+        if cube is not None and (watermark is None or cube.watermark == watermark):
+            return cube
+
+        refreshed = None
+        if cube is not None and cube.max_updated_at is not None:
+            rows, active_count = await db.run_sync(
+                self._fetch_updates, cube, country_code, storage_category
+            )
+            refreshed = await anyio.to_thread.run_sync(
+                self._refresh_cube,
+                cube,
+                rows,
+                active_count,
+                country_code,
+                storage_category,
+            )
+        if refreshed is None:
+            rows = await db.run_sync(
+                lambda session: StorageDataCRUD(session).get_facet_rows(
+                    country_code, storage_category
+                )
+            )
+            refreshed = await anyio.to_thread.run_sync(self._build_cube, rows)
+        return self._store_cube(key, refreshed, watermark)
+
+    def _cached_cube(self, key: Tuple[str, int]) -> Optional[FacetCube]:
+        """構築済みで期限内のキューブを返す（ない場合はNone）"""
+        with self._lock:
+            cube = self._cubes.get(key)
+        if cube is not None and time.monotonic() - cube.built_at > self.ttl_seconds:
+            return None
+        return cube
+
+    def _store_cube(
+        self, key: Tuple[str, int], cube: FacetCube, watermark: Any
+    ) -> FacetCube:
+        cube.watermark = watermark
+        with self._lock:
+            self._cubes[key] = cube
+        return cube
+
+    def _build_cube(self, rows: List[Any]) -> FacetCube:
+        """DBから読み込んだ全データからキューブを構築"""
+        colors, materials = set(), set()
+        for row in rows:
+            colors.update(row.colors or [])
+            materials.update(row.materials or [])
+        cube = FacetCube(
+            self.bucket_size, self.buckets, sorted(colors), sorted(materials)
+        )
+
+        for row in rows:
+            cube.entries[row.storage_data_id] = cube.entry_for(row)
+        cells = np.array([entry[0] for entry in cube.entries.values()], dtype=np.int64)
+        counts = np.bincount(cells, minlength=cube.counts.size)
+        cube.counts = counts.astype(np.int32).reshape(cube.counts.shape)
+        cube.max_updated_at = max((row.updated_at for row in rows), default=None)
+        cube.update_aggregates()
+        return cube
+
+    def _fetch_updates(
+        self, db: Session, cube: FacetCube, country_code: str, storage_category: int
+    ) -> Tuple[List[Any], int]:
+        """前回以降に更新されたデータと、現在の有効なデータの件数を読み込む"""
+        crud = StorageDataCRUD(db)
+        # 同じ更新日時のデータを取りこぼさないよう前回の最大値を含めて取得する（同じデータの再反映は冪等）
+        rows = crud.get_facet_rows_updated_since(cube.max_updated_at)
+        return rows, crud.count_active(country_code, storage_category)
+
+    def _refresh_cube(
+        self,
+        cube: FacetCube,
+        rows: List[Any],
+        active_count: int,
+        country_code: str,
+        storage_category: int,
+    ) -> Optional[FacetCube]:
+        """
+        前回以降に更新されたデータの差分を反映したキューブを返す
+
+        Returns:
+            Optional[FacetCube]: 差分を反映した新しいキューブ（再構築が必要な場合はNone）
+        """
+        refreshed = cube.copy()
+        for row in rows:
+            refreshed.remove(row.storage_data_id)
+            if (
+                row.active
+                and row.country_code == country_code
+                and row.storage_category == storage_category
+            ):
+                entry = refreshed.entry_for(row)
+                if entry is None:
+                    return None
+                refreshed.add(row.storage_data_id, entry)
+            refreshed.max_updated_at = max(refreshed.max_updated_at, row.updated_at)
+
+        # 削除されたデータはupdated_atで検知できないため、件数が一致しない場合は再構築する
+        if len(refreshed.entries) != active_count:
+            return None
+        refreshed.update_aggregates()
+        return refreshed
+
+    def facets(
+        self,
+        db: Session,
+        params: SearchStorageRequest,
+        watermark: Any = None,
+    ) -> Dict[str, Any]:
+        """
+        検索条件に一致する件数と分布を返す（StorageFacetsResponseの形式の辞書）
+
+        キューブの累積和から一致件数によらず一定の時間で求めるのは寸法の分布のみで、
+        その寸法以外の条件は区間の境界まで広げて評価する（スライダーの操作中も範囲外の分布を表示できる）。
+        一致件数と価格・色・素材の件数はsearch_storageと一致させるため、寸法インデックスで
+        検索条件どおりに絞り込んだデータから求める（パーティションの件数・一致件数に比例する時間がかかる）。
+        """
+        cube = self.get_cube(
+            db, params.country_code, params.storage_category, watermark=watermark
+        )
+        partition = storage_index.get_partition(
+            db, params.country_code, params.storage_category, watermark=watermark
+        )
+        matched_ids = partition.ids[storage_index.match_mask(partition, params)]
+        totals = cube.channel_totals(matched_ids)
+
+        bounds = resolve_dimension_bounds(params)
+        ranges = [
+            (0, cube.buckets)
+            if bounds[dim] is None
+            else (cube.bucket_of(bounds[dim][0]), cube.bucket_of(bounds[dim][1]) + 1)
+            for dim in DIMENSIONS
+        ]
+        inverted = bool(params.enable_inverted_search)
+
+        # 寸法ごとの分布：その寸法の条件を区間ごとに置き換えた件数
+        histograms = {}
+        for axis, dim in enumerate(DIMENSIONS):
+            all_boxes = []
+            for bucket in range(cube.buckets):
+                bucket_ranges = list(ranges)
+                bucket_ranges[axis] = (bucket, bucket + 1)
+                all_boxes.extend(
+                    (bucket, box) for box in query_boxes(bucket_ranges, inverted)
+                )
+            owners = np.array([bucket for bucket, _ in all_boxes])
+            lower, upper, signs = (
+                np.array(values) for values in zip(*(box for _, box in all_boxes))
+            )
+            sums = cube.box_sums(lower, upper) * signs
+            histograms[dim] = np.bincount(owners, weights=sums, minlength=cube.buckets)
+
+        def dimension_bucket(index: int) -> Tuple[float, Optional[float]]:
+            upper_value = (
+                None if index >= cube.buckets - 1 else (index + 1) * cube.bucket_size
+            )
+            return index * cube.bucket_size, upper_value
+
+        def value_counts(values: List[int], offset: int) -> List[Dict[str, int]]:
+            counts = [
+                (value, int(totals[offset + i])) for i, value in enumerate(values)
+            ]
+            counts = [(value, count) for value, count in counts if count > 0]
+            counts.sort(key=lambda item: (-item[1], item[0]))
+            return [{"value": value, "count": count} for value, count in counts]
+
+        price_edges = list(PRICE_BUCKET_EDGES) + [None]
+        return {
+            "total_items": len(matched_ids),
+            "bucket_size": cube.bucket_size,
+            # 下限が上限より大きい範囲が指定された場合も[下限, 上限]の順で返す
+            "applied_bounds": {
+                dim: None
+                if bounds[dim] is None
+                else [
+                    dimension_bucket(min(start, end - 1))[0],
+                    dimension_bucket(max(start, end - 1))[1],
+                ]
+                for dim, (start, end) in zip(DIMENSIONS, ranges)
+            },
+            # 寸法の条件がある場合、寸法の分布は区間の境界まで広げた条件での概数となる
+            "approximate_histograms": any(
+                bounds[dim] is not None for dim in DIMENSIONS
+            ),
+            **{
+                dim: [
+                    {"lower": lower_value, "upper": upper_value, "count": int(count)}
+                    for index, count in enumerate(histograms[dim])
+                    for lower_value, upper_value in [dimension_bucket(index)]
+                ]
+                for dim in DIMENSIONS
+            },
+            "price": [
+                {
+                    "lower": price_edges[i],
+                    "upper": price_edges[i + 1],
+                    "count": int(totals[i]),
+                }
+                for i in range(len(PRICE_BUCKET_EDGES))
+            ],
+            "colors": value_counts(cube.colors, cube.color_offset),
+            "materials": value_counts(cube.materials, cube.material_offset),
+        }
+
+
+# アプリケーション全体で共有するインデックス
+storage_facet_index = StorageFacetIndex(
+    bucket_size=settings.facet_bucket_cm,
+    max_cm=settings.facet_max_cm,
+    ttl_seconds=settings.facet_cube_ttl_seconds,
+)
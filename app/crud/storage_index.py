@@ -0,0 +1,486 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import anyio
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.crud.storage_crud import StorageDataCRUD, resolve_dimension_bounds
+from app.db.session import settings
+from app.schemas.storage_schemas import (
+    FitsStorageRequest,
+    NearestStorageRequest,
+    SearchStorageRequest,
+)
+
+
+@dataclass
+class DimensionPartition:
+    """(country_code, storage_category)ごとの列指向寸法データ"""
+
+    ids: np.ndarray
+    width: np.ndarray
+    depth: np.ndarray
+    height: np.ndarray
+    built_at: float
+    watermark: Any = None
+    # 寸法の近い順の検索用グリッド（初回の検索時に構築）
+    grid: Optional["DimensionGrid"] = None
+    # 収まるデータの検索用に向きの扱いごとに並べ替えた寸法（初回の検索時に構築）
+    fit_views: Optional[Dict[str, "FitView"]] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def orient_dimensions(dims: np.ndarray, rotation: str) -> np.ndarray:
+    """
+    寸法(幅, 奥行き, 高さ)を向きの扱いに応じた比較用の3つ組に変換する
+
+    - none: そのまま
+    - horizontal: (幅と奥行きの短い方, 長い方, 高さ)
+    - any: 昇順に並べた3辺
+
+    直方体Aが直方体Bに（許容する向きのいずれかで）収まるのは、
+    変換後の3つ組がそれぞれの成分でB以下の場合に限られる。
+    """
+    dims = np.asarray(dims, dtype=np.float64).reshape(-1, 3)
+    if rotation == "any":
+        return np.sort(dims, axis=1)
+    if rotation == "horizontal":
+        return np.column_stack(
+            [
+                np.minimum(dims[:, 0], dims[:, 1]),
+                np.maximum(dims[:, 0], dims[:, 1]),
+                dims[:, 2],
+            ]
+        )
+    return dims
+
+
+@dataclass
+class FitView:
+    """向きを変換した寸法を最も絞り込みやすい成分（長辺など）の昇順に並べたもの"""
+
+    # 並べ替え後の位置からパーティション内の位置への対応
+    order: np.ndarray
+    dims: np.ndarray
+    # 並べ替えに使った成分
+    key_axis: int
+
+    # 向きの扱いごとの並べ替えに使う成分（none: 幅、horizontal: 長辺、any: 最長辺）
+    KEY_AXES = {"none": 0, "horizontal": 1, "any": 2}
+
+    @classmethod
+    def build(cls, partition: "DimensionPartition", rotation: str) -> "FitView":
+        dims = orient_dimensions(
+            np.column_stack([partition.width, partition.depth, partition.height]),
+            rotation,
+        )
+        key_axis = cls.KEY_AXES[rotation]
+        order = np.argsort(dims[:, key_axis], kind="stable")
+        return cls(order=order, dims=dims[order], key_axis=key_axis)
+
+    def dominated_by(self, limits: np.ndarray) -> np.ndarray:
+        """
+        全ての成分がlimits以下のデータのパーティション内の位置を返す
+
+        並べ替えた成分は二分探索で範囲を絞り、残りの成分のみを比較する。
+        """
+        end = int(
+            np.searchsorted(
+                self.dims[:, self.key_axis], limits[self.key_axis], side="right"
+            )
+        )
+        candidates = self.dims[:end]
+        mask = np.all(candidates <= limits, axis=1)
+        return self.order[:end][mask]
+
+
+class DimensionGrid:
+    """
+    (幅, 奥行き, 高さ)の空間を一辺cell_sizeの立方体のセルに分割したグリッド
+
+    クエリ点のセルから外側へ1層ずつセルを調べ、未調査のセルに
+    暫定のk番目より近いデータが存在し得なくなった時点で打ち切る。
+    """
+
+    def __init__(self, points: np.ndarray, cell_size: float):
+        self.points = points
+        self.cell_size = cell_size
+        cells = np.floor(points / cell_size).astype(np.int64).reshape(-1, 3)
+        self.cells: Dict[Tuple[int, int, int], np.ndarray] = {}
+        if len(cells):
+            unique_cells, inverse = np.unique(cells, axis=0, return_inverse=True)
+            order = np.argsort(inverse.ravel(), kind="stable")
+            counts = np.bincount(inverse.ravel(), minlength=len(unique_cells))
+            for cell, indices in zip(
+                unique_cells, np.split(order, np.cumsum(counts)[:-1])
+            ):
+                self.cells[tuple(int(c) for c in cell)] = indices
+            self.min_cell = unique_cells.min(axis=0)
+            self.max_cell = unique_cells.max(axis=0)
+
+    def _ring(self, center: np.ndarray, radius: int) -> List[Tuple[int, int, int]]:
+        """centerからチェビシェフ距離がちょうどradiusのセル（データのあるもののみ）"""
+        if radius == 0:
+            key = tuple(int(c) for c in center)
+            return [key] if key in self.cells else []
+        cx, cy, cz = (int(c) for c in center)
+        keys = []
+        for dx in range(-radius, radius + 1):
+            for dy in range(-radius, radius + 1):
+                if abs(dx) == radius or abs(dy) == radius:
+                    dz_values = range(-radius, radius + 1)
+                else:
+                    dz_values = (-radius, radius)
+                for dz in dz_values:
+                    key = (cx + dx, cy + dy, cz + dz)
+                    if key in self.cells:
+                        keys.append(key)
+        return keys
+
+    def nearest(
+        self, query: np.ndarray, weights: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        重み付きユークリッド距離でqueryに近いk件を返す
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (行の位置, 距離)（距離の近い順）
+        """
+        if not self.cells:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        center = np.floor(query / self.cell_size).astype(np.int64)
+        # データのあるセルが存在する層の範囲（クエリがグリッドの外にある場合は内側の層を飛ばす）
+        min_radius = int(
+            np.maximum(
+                np.maximum(self.min_cell - center, center - self.max_cell), 0
+            ).max()
+        )
+        max_radius = int(
+            max(
+                np.abs(center - self.min_cell).max(),
+                np.abs(self.max_cell - center).max(),
+            )
+        )
+        min_weight = float(weights.min())
+
+        best_indices = np.empty(0, dtype=np.int64)
+        best_distances = np.empty(0)
+        for radius in range(min_radius, max_radius + 1):
+            ring_size = (2 * radius + 1) ** 3 - max(2 * radius - 1, 0) ** 3
+            if ring_size > len(self.cells):
+                # 1層のセル数がデータのあるセル数を超える場合は全件を調べる方が速い
+                return self._brute_force(query, weights, k)
+            ring = self._ring(center, radius)
+            if ring:
+                indices = np.concatenate(
+                    [best_indices, *(self.cells[key] for key in ring)]
+                )
+                diffs = (self.points[indices] - query) * weights
+                distances = np.sqrt((diffs * diffs).sum(axis=1))
+                order = np.argsort(distances, kind="stable")[:k]
+                best_indices, best_distances = indices[order], distances[order]
+            # radius層まで調べた時点で、未調査のセルとの距離はradius * cell_size以上
+            if (
+                len(best_indices) >= k
+                and best_distances[-1] <= radius * self.cell_size * min_weight
+            ):
+                break
+        return best_indices, best_distances
+
+    def _brute_force(
+        self, query: np.ndarray, weights: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """全件の距離を計算してk件を返す"""
+        diffs = (self.points - query) * weights
+        distances = np.sqrt((diffs * diffs).sum(axis=1))
+        order = np.argsort(distances, kind="stable")[:k]
+        return order, distances[order]
+
+
+def _interval_mask(values: np.ndarray, bounds: Tuple[float, float]) -> np.ndarray:
+    """値が範囲内（上下限を含む）にあるかどうかのマスクを返す"""
+    lower_limit, upper_limit = bounds
+    return (values >= lower_limit) & (values <= upper_limit)
+
+
+class StorageDimensionIndex:
+    """
+    アクティブなストレージデータの寸法をNumPy配列で保持するインメモリインデックス
+
+    国コードとストレージカテゴリごとにパーティションを持ち、
+    search_by_paramsと同じ範囲・許容範囲・反転検索の条件をベクトル化したマスクで評価する。
+    パーティションは初回アクセス時に構築し、ttl_secondsを過ぎるか
+    データ更新の透かし値（watermark）が変わると再構築する。
+    """
+
+    def __init__(self, ttl_seconds: float = 60.0, grid_cell_size: float = 5.0):
+        self.ttl_seconds = ttl_seconds
+        self.grid_cell_size = grid_cell_size
+        self._partitions: Dict[Tuple[str, int], DimensionPartition] = {}
+        self._lock = threading.Lock()
+
+    def clear(self) -> None:
+        """全パーティションを破棄する"""
+        with self._lock:
+            self._partitions.clear()
+
+    def get_partition(
+        self,
+        db: Session,
+        country_code: str,
+        storage_category: int,
+        watermark: Any = None,
+    ) -> DimensionPartition:
+        """
+        パーティションを取得（未構築・期限切れ・データ更新済みの場合は構築）
+
+        構築時のDBアクセスはAsyncSession.run_sync内ではイベントループ上で待機するため、
+        ロックは保持せずに構築し、構築済みのパーティションへの置き換えのみロック内で行う。
+        （同時に構築された場合はそれぞれ構築し、後から構築したものを残す）
+        run_sync内での構築はNumPy配列への変換の間もイベントループを止めるため、
+        非同期の処理からは事前にprepare_partitionで構築しておく。
+        """
+        key = (country_code, storage_category)
+        partition = self._cached_partition(key, watermark)
+        if partition is None:
+            rows = StorageDataCRUD(db).get_dimension_rows(
+                country_code, storage_category
+            )
+            partition = self._store_partition(
+                key, self._build_partition(rows), watermark
+            )
+        return partition
+
+    async def prepare_partition(
+        self,
+        db: AsyncSession,
+        country_code: str,
+        storage_category: int,
+        watermark: Any = None,
+    ) -> DimensionPartition:
+        """
+        パーティションを事前に構築（非同期版のget_partition）
+
+        DBからの読み込みのみrun_syncで行い、NumPy配列への変換と並べ替えはワーカースレッドで
+        行うため、コールドスタート時も構築の間イベントループを止めない。
+        続けてrun_sync内で呼び出すget_partitionは構築済みのパーティションを返す。
+        """
+        key = (country_code, storage_category)
+        partition = self._cached_partition(key, watermark)
+        if partition is None:
+            rows = await db.run_sync(
+                lambda session: StorageDataCRUD(session).get_dimension_rows(
+                    country_code, storage_category
+                )
+            )
+            partition = await anyio.to_thread.run_sync(self._build_partition, rows)
+            partition = self._store_partition(key, partition, watermark)
+        return partition
+
+    def _cached_partition(
+        self, key: Tuple[str, int], watermark: Any
+    ) -> Optional[DimensionPartition]:
+        """構築済みで期限内・データ更新のないパーティションを返す（ない場合はNone）"""
+        with self._lock:
+            partition = self._partitions.get(key)
+        if (
+            partition is not None
+            and not self._is_expired(partition)
+            and (watermark is None or partition.watermark == watermark)
+        ):
+            return partition
+        return None
+
+    def _store_partition(
+        self, key: Tuple[str, int], partition: DimensionPartition, watermark: Any
+    ) -> DimensionPartition:
+        partition.watermark = watermark
+        with self._lock:
+            self._partitions[key] = partition
+        return partition
+
+    def _is_expired(self, partition: DimensionPartition) -> bool:
+        return time.monotonic() - partition.built_at > self.ttl_seconds
+
+    def _build_partition(self, rows: List[Any]) -> DimensionPartition:
+        """DBから読み込んだ寸法列から、ID順に並べたパーティションを構築"""
+        ids = np.array([row[0] for row in rows], dtype=object)
+        dims = np.array([row[1:4] for row in rows], dtype=np.float64).reshape(-1, 3)
+
+        # 検索結果の順序を安定させるためにID順に並べる
+        order = np.argsort(ids, kind="stable")
+        return DimensionPartition(
+            ids=ids[order],
+            width=dims[order, 0],
+            depth=dims[order, 1],
+            height=dims[order, 2],
+            built_at=time.monotonic(),
+        )
+
+    def match_mask(
+        self, partition: DimensionPartition, params: SearchStorageRequest
+    ) -> np.ndarray:
+        """検索条件に一致する行のマスクを返す"""
+        bounds = resolve_dimension_bounds(params)
+        mask = np.ones(len(partition), dtype=bool)
+
+        # 幅・奥行きの条件
+        wd_mask: Optional[np.ndarray] = None
+        if bounds["width"] is not None:
+            wd_mask = _interval_mask(partition.width, bounds["width"])
+        if bounds["depth"] is not None:
+            depth_mask = _interval_mask(partition.depth, bounds["depth"])
+            wd_mask = depth_mask if wd_mask is None else wd_mask & depth_mask
+
+        if wd_mask is not None:
+            # 反転検索の場合：幅と奥行きを入れ替えた条件とORで結合
+            if params.enable_inverted_search:
+                inverted_mask = np.ones(len(partition), dtype=bool)
+                if bounds["width"] is not None:
+                    inverted_mask &= _interval_mask(partition.depth, bounds["width"])
+                if bounds["depth"] is not None:
+                    inverted_mask &= _interval_mask(partition.width, bounds["depth"])
+                wd_mask = wd_mask | inverted_mask
+            mask &= wd_mask
+
+        # 高さの条件（反転対象外）
+        if bounds["height"] is not None:
+            mask &= _interval_mask(partition.height, bounds["height"])
+
+        return mask
+
+    def search(
+        self,
+        db: Session,
+        params: SearchStorageRequest,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        after_id: Optional[str] = None,
+        watermark: Any = None,
+    ) -> Tuple[List[str], int]:
+        """
+        検索条件に一致するIDのページと総件数を返す
+
+        after_idを指定した場合はoffsetを使わず、after_idより後のIDから返す。
+        watermarkを指定した場合、構築時と値が異なるパーティションは再構築する。
+
+        Returns:
+            Tuple[List[str], int]: (ID順に並んだページ内のIDリスト, 一致した件数)
+            after_idを指定した場合、件数はafter_idより後の一致件数となる。
+        """
+        partition = self.get_partition(
+            db, params.country_code, params.storage_category, watermark=watermark
+        )
+        matched_ids = partition.ids[self.match_mask(partition, params)]
+        if after_id is not None:
+            # ID順に並んでいるため二分探索で開始位置を求める
+            start = int(np.searchsorted(matched_ids, after_id, side="right"))
+            matched_ids = matched_ids[start:]
+            offset = 0
+        end = None if limit is None else offset + limit
+        return matched_ids[offset:end].tolist(), len(matched_ids)
+
+    def nearest(
+        self,
+        db: Session,
+        params: NearestStorageRequest,
+        watermark: Any = None,
+    ) -> List[Tuple[str, float, bool]]:
+        """
+        指定寸法に近い順にk件のIDを返す
+
+        距離は軸ごとの差に重みを掛けたユークリッド距離。orientation_invariantの場合は
+        幅と奥行きを入れ替えた向きでも検索し、データごとに近い方の距離を使う。
+
+        Returns:
+            List[Tuple[str, float, bool]]: (ID, 距離, 入れ替えた向きで一致したか)のリスト（近い順）
+        """
+        partition = self.get_partition(
+            db, params.country_code, params.storage_category, watermark=watermark
+        )
+        grid = partition.grid
+        if grid is None:
+            points = np.column_stack(
+                [partition.width, partition.depth, partition.height]
+            )
+            grid = partition.grid = DimensionGrid(points, self.grid_cell_size)
+
+        weights = np.array(
+            [params.width_weight, params.depth_weight, params.height_weight]
+        )
+        query = np.array([params.width, params.depth, params.height])
+        candidates: Dict[int, Tuple[float, bool]] = {}
+        orientations = [(query, weights, False)]
+        if params.orientation_invariant:
+            # データを回転させた場合の距離は、クエリの幅と奥行き（と重み）を入れ替えた距離に等しい
+            orientations.append((query[[1, 0, 2]], weights[[1, 0, 2]], True))
+        for point, axis_weights, rotated in orientations:
+            indices, distances = grid.nearest(point, axis_weights, params.k)
+            for index, distance in zip(indices.tolist(), distances.tolist()):
+                if index not in candidates or distance < candidates[index][0]:
+                    candidates[index] = (distance, rotated)
+
+        # 距離が同じ場合はID順
+        ranked = sorted(
+            candidates.items(), key=lambda item: (item[1][0], partition.ids[item[0]])
+        )[: params.k]
+        return [
+            (partition.ids[index], distance, rotated)
+            for index, (distance, rotated) in ranked
+        ]
+
+    def fits(
+        self,
+        db: Session,
+        params: FitsStorageRequest,
+        watermark: Any = None,
+    ) -> Tuple[List[Tuple[str, float]], int]:
+        """
+        指定した空間に（すき間を確保して）収まるデータを充填率の高い順に返す
+
+        Returns:
+            Tuple[List[Tuple[str, float]], int]: (ページ内の(ID, 充填率)のリスト, 収まるデータの件数)
+        """
+        partition = self.get_partition(
+            db, params.country_code, params.storage_category, watermark=watermark
+        )
+        fit_views = partition.fit_views
+        if fit_views is None:
+            fit_views = partition.fit_views = {}
+        view = fit_views.get(params.rotation)
+        if view is None:
+            view = fit_views[params.rotation] = FitView.build(
+                partition, params.rotation
+            )
+
+        space = np.array([params.width, params.depth, params.height])
+        limits = orient_dimensions(space - params.clearance, params.rotation)[0]
+        matched = view.dominated_by(limits)
+
+        volumes = (
+            partition.width[matched]
+            * partition.depth[matched]
+            * partition.height[matched]
+        )
+        fill_ratios = volumes / float(np.prod(space))
+        # 充填率の高い順（同じ場合はID順）
+        order = np.lexsort((partition.ids[matched], -fill_ratios))
+        offset = params.page * params.page_size
+        page = order[offset : offset + params.page_size]
+        return (
+            [(partition.ids[matched[i]], float(fill_ratios[i])) for i in page],
+            len(matched),
+        )
+
+
+# アプリケーション全体で共有するインデックス
+storage_index = StorageDimensionIndex(
+    ttl_seconds=settings.search_index_ttl_seconds,
+    grid_cell_size=settings.nearest_grid_cell_cm,
+)
@@ -0,0 +1,89 @@
+from typing import Any, Dict, Iterable, Tuple
+
+from app.core.cache import TTLCache
+from app.db.session import settings
+
+
+class StorageItemCache:
+    """
+    storage_data_idごとに変換済みのストレージデータを保持するキャッシュ
+
+    各エントリは保存時のデータ更新の透かし値（watermark）を持つ。
+    透かし値が変わった後に参照されたエントリは、IDとupdated_atのみを一括で取得して
+    キャッシュ時のupdated_atと比較し、変更・削除されたものだけをミスとして扱う。
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300.0):
+        self._cache = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+    def clear(self) -> None:
+        """全エントリと統計情報を破棄する"""
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """キャッシュの統計情報を取得"""
+        return self._cache.stats()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def lookup(
+        self, storage_data_ids: Iterable[str], watermark: Any
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        キャッシュ済みのデータを取得する
+
+        Args:
+            storage_data_ids: 取得するストレージデータIDのリスト
+            watermark: 現在のデータ更新の透かし値
+
+        Returns:
+            Tuple[Dict[str, Any], Dict[str, Any]]: (最新のデータ, 透かし値が変わり再検証が必要なデータ)
+            いずれもIDをキーとした辞書。
+        """
+        fresh: Dict[str, Any] = {}
+        stale: Dict[str, Any] = {}
+        for storage_data_id in storage_data_ids:
+            entry = self._cache.get(storage_data_id)
+            if entry is None:
+                continue
+            item, cached_watermark = entry
+            if cached_watermark == watermark:
+                fresh[storage_data_id] = item
+            else:
+                stale[storage_data_id] = item
+        return fresh, stale
+
+    def revalidate(
+        self, stale: Dict[str, Any], current_updated_at: Dict[str, Any], watermark: Any
+    ) -> Dict[str, Any]:
+        """
+        再検証が必要なデータのうち、updated_atが変わっていないものを返す
+
+        変わっていないデータは現在の透かし値で保存し直し、更新・削除されたデータは破棄する。
+
+        Args:
+            stale: lookupが返した再検証が必要なデータ
+            current_updated_at: DBから取得した現在のupdated_at（IDをキーとした辞書）
+            watermark: 現在のデータ更新の透かし値
+        """
+        valid: Dict[str, Any] = {}
+        for storage_data_id, item in stale.items():
+            if current_updated_at.get(storage_data_id) == item.updated_at:
+                self._cache.set(storage_data_id, (item, watermark))
+                valid[storage_data_id] = item
+            else:
+                self._cache.delete(storage_data_id)
+        return valid
+
+    def set_many(self, items: Iterable[Any], watermark: Any) -> None:
+        """変換済みのデータ（storage_data_idとupdated_atを持つ）を保存"""
+        for item in items:
+            self._cache.set(item.storage_data_id, (item, watermark))
+
+
+# fetch_storageで共有するキャッシュ
+storage_item_cache = StorageItemCache(
+    max_entries=settings.item_cache_max_entries,
+    ttl_seconds=settings.item_cache_ttl_seconds,
+)
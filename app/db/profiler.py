@@ -0,0 +1,212 @@
+import json
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# SQLのプロファイル結果を出力するロガー
+sql_logger = logging.getLogger("hakopita_fast_api.sql")
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\([^)]+\)s|%s|\?|:\w+")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement: str) -> str:
+    """
+    SQLを正規化したフィンガープリントに変換する
+
+    リテラル・プレースホルダは?に、IN (?, ?, ...)はIN (...)にまとめ、空白を1つにする。
+    パラメータの値や個数だけが異なるクエリは同じフィンガープリントになる。
+    """
+    normalized = _STRING_LITERAL.sub("?", statement)
+    normalized = _PLACEHOLDER.sub("?", normalized)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _IN_LIST.sub("IN (...)", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+
+@dataclass
+class QueryStats:
+    """フィンガープリントごとの実行統計"""
+
+    fingerprint: str
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    slow_count: int = 0
+    # 最後に閾値を超えたときの実行計画（取得していない場合はNone）
+    explain: Optional[List[Any]] = None
+    explain_seconds: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "fingerprint": self.fingerprint,
+            "count": self.count,
+            "total_ms": round(self.total_seconds * 1000, 3),
+            "mean_ms": round(self.total_seconds / self.count * 1000, 3)
+            if self.count
+            else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 3),
+            "slow_count": self.slow_count,
+            "explain": self.explain,
+        }
+
+
+class QueryProfiler:
+    """
+    SQLAlchemyのbefore/after_cursor_executeイベントで全てのSQLの実行時間を計測する
+
+    フィンガープリントごとに集計し、slow_query_secondsを超えたSELECTは同じ接続で
+    EXPLAINを実行して実行計画を保持する（フィンガープリントごとにexplain_interval_secondsに1回まで）。
+    """
+
+    def __init__(
+        self,
+        slow_query_seconds: float = 0.1,
+        explain_slow_queries: bool = True,
+        explain_interval_seconds: float = 300.0,
+        max_fingerprints: int = 500,
+    ):
+        self.slow_query_seconds = slow_query_seconds
+        self.explain_slow_queries = explain_slow_queries
+        self.explain_interval_seconds = explain_interval_seconds
+        self.max_fingerprints = max_fingerprints
+        self._stats: Dict[str, QueryStats] = {}
+        self._explained_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._last_logged_at = time.monotonic()
+
+    def attach(self, engine: Engine) -> None:
+        """エンジンにイベントを登録（非同期エンジンの場合はsync_engineを指定する）"""
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+
+    def detach(self, engine: Engine) -> None:
+        """エンジンからイベントを削除"""
+        event.remove(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.remove(engine, "handle_error", self._handle_error)
+
+    def _before_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+    def _handle_error(self, context):
+        # 実行に失敗した場合はafter_cursor_executeが呼ばれないため、開始時刻をここで破棄する
+        conn = context.connection
+        if conn is not None and conn.info.get("query_started_at"):
+            conn.info["query_started_at"].pop()
+
+    def _after_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        started = conn.info["query_started_at"].pop()
+        elapsed = time.perf_counter() - started
+        key = fingerprint(statement)
+        is_slow = elapsed >= self.slow_query_seconds
+
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    # 種類が多すぎる場合は集計しない（メモリ使用量を抑える）
+                    return
+                stats = self._stats[key] = QueryStats(fingerprint=key)
+            stats.count += 1
+            stats.total_seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+            if not is_slow:
+                return
+            stats.slow_count += 1
+            should_explain = self._should_explain(key, statement, executemany, context)
+
+        sql_logger.warning(
+            f"Slow query ({elapsed * 1000:.1f} ms, "
+            f"threshold {self.slow_query_seconds * 1000:.0f} ms): {key}"
+        )
+        if should_explain:
+            plan = self._explain(conn, statement, parameters)
+            with self._lock:
+                stats.explain = plan
+                stats.explain_seconds = elapsed
+
+    def _should_explain(
+        self, key: str, statement: str, executemany: bool, context=None
+    ) -> bool:
+        """EXPLAINを取得するか（ロックを取得した状態で呼び出す）"""
+        if not self.explain_slow_queries or executemany:
+            return False
+        # サーバーサイドカーソル（stream_results・yield_per）の場合、結果を読み込む前に同じ接続で
+        # EXPLAINを実行すると未読の結果が破棄され得る（aiomysqlなど）ため取得しない
+        options = getattr(context, "execution_options", None) or {}
+        if options.get("stream_results") or options.get("yield_per"):
+            return False
+        if not statement.lstrip().upper().startswith("SELECT"):
+            return False
+        now = time.monotonic()
+        explained_at = self._explained_at.get(key)
+        if (
+            explained_at is not None
+            and now - explained_at < self.explain_interval_seconds
+        ):
+            return False
+        self._explained_at[key] = now
+        return True
+
+    def _explain(self, conn, statement: str, parameters) -> Optional[List[Any]]:
+        """
+        同じ接続でEXPLAINを実行して実行計画を取得する
+
+        DBAPIのカーソルを直接使うため、このクエリ自体はイベントで計測されない。
+        """
+        prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+        try:
+            cursor = conn.connection.cursor()
+            try:
+                cursor.execute(prefix + statement, parameters)
+                columns = [column[0] for column in cursor.description or []]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+        except Exception as e:
+            sql_logger.warning(f"EXPLAIN failed: {e}")
+            return None
+
+    def report(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """合計実行時間の長い順のフィンガープリントごとの統計"""
+        with self._lock:
+            stats = sorted(
+                self._stats.values(), key=lambda s: s.total_seconds, reverse=True
+            )
+            return [s.to_dict() for s in stats[:limit]]
+
+    def log_report_if_due(self, interval_seconds: float, limit: int = 20) -> bool:
+        """前回の出力からinterval_seconds以上経過していれば上位の統計を1行のログに出力する"""
+        if interval_seconds <= 0:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_logged_at < interval_seconds or not self._stats:
+                return False
+            self._last_logged_at = now
+        sql_logger.info(json.dumps({"sql_profile": self.report(limit)}, default=str))
+        return True
+
+    def reset(self) -> None:
+        """集計をリセット"""
+        with self._lock:
+            self._stats.clear()
+            self._explained_at.clear()
+            self._last_logged_at = time.monotonic()
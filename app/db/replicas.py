@@ -0,0 +1,144 @@
+import asyncio
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Sequence, Set
+
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+
+def is_connection_error(exc: BaseException) -> bool:
+    """接続断・接続不可など、接続先の異常を示す例外かどうかを判定"""
+    if isinstance(exc, (OperationalError, InterfaceError)):
+        return True
+    return isinstance(exc, DBAPIError) and exc.connection_invalidated
+
+
+class ReplicaRouter:
+    """
+    読み取りクエリを複数のレプリカに振り分ける
+
+    正常なレプリカをラウンドロビンで選択し、接続エラーが発生したレプリカは
+    retry_secondsの間は振り分け対象から外す（全て異常な場合は全レプリカを対象とする）。
+    hedge_after_secondsを指定した場合、クエリがその時間を超えると別のレプリカにも
+    同じクエリを発行し、先に完了した結果を使用する。
+    """
+
+    def __init__(
+        self,
+        engines: Sequence[AsyncEngine],
+        retry_seconds: float = 30.0,
+        hedge_after_seconds: Optional[float] = None,
+    ):
+        if not engines:
+            raise ValueError("At least one engine is required")
+        self.engines = list(engines)
+        self.retry_seconds = retry_seconds
+        self.hedge_after_seconds = hedge_after_seconds
+        self._counter = itertools.count()
+        self._unhealthy_until: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        # 採用されなかったヘッジ（先行）クエリのタスク（完了まで参照を保持する）
+        self._background_tasks: Set[asyncio.Task] = set()
+
+    def choose(self, exclude: Sequence[AsyncEngine] = ()) -> AsyncEngine:
+        """次に使用するエンジンを選択（excludeのエンジンは可能な限り避ける）"""
+        candidates = [e for e in self.engines if e not in exclude] or self.engines
+        healthy = [e for e in candidates if self.is_healthy(e)] or candidates
+        return healthy[next(self._counter) % len(healthy)]
+
+    def is_healthy(self, engine: AsyncEngine) -> bool:
+        """エンジンが振り分け対象かどうか"""
+        with self._lock:
+            until = self._unhealthy_until.get(id(engine))
+            if until is None:
+                return True
+            if until <= time.monotonic():
+                del self._unhealthy_until[id(engine)]
+                return True
+            return False
+
+    def mark_unhealthy(self, engine: AsyncEngine) -> None:
+        """接続エラーが発生したエンジンを一定時間振り分け対象から外す"""
+        with self._lock:
+            self._unhealthy_until[id(engine)] = time.monotonic() + self.retry_seconds
+
+    def session(self, engine: Optional[AsyncEngine] = None) -> AsyncSession:
+        """エンジン（省略時はchooseで選択）に接続するセッションを作成"""
+        return AsyncSession(
+            bind=engine or self.choose(), autoflush=False, expire_on_commit=False
+        )
+
+    async def run_sync(
+        self, fn: Callable[[Any], Any], session: Optional[AsyncSession] = None
+    ) -> Any:
+        """
+        同期版の処理fn(session)を読み取り用のセッションで実行する
+
+        ヘッジが無効な場合は指定されたセッション（省略時は新しいセッション）で実行する。
+        ヘッジが有効でレプリカが複数ある場合は、クエリごとに別のセッションを使用する。
+        接続エラーが発生したエンジンは振り分け対象から外す。
+        """
+        if self.hedge_after_seconds is None or len(self.engines) < 2:
+            if session is not None:
+                return await self._run_on_session(session, fn)
+            async with self.session() as new_session:
+                return await self._run_on_session(new_session, fn)
+        return await self._run_hedged(fn)
+
+    async def _run_on_session(
+        self, session: AsyncSession, fn: Callable[[Any], Any]
+    ) -> Any:
+        try:
+            return await session.run_sync(fn)
+        except Exception as e:
+            if is_connection_error(e) and isinstance(session.bind, AsyncEngine):
+                self.mark_unhealthy(session.bind)
+            raise
+
+    async def _run_on_engine(
+        self, engine: AsyncEngine, fn: Callable[[Any], Any]
+    ) -> Any:
+        async with self.session(engine) as session:
+            return await self._run_on_session(session, fn)
+
+    async def _run_hedged(self, fn: Callable[[Any], Any]) -> Any:
+        """一定時間内に完了しない場合は別のレプリカにも問い合わせ、先に完了した結果を返す"""
+        first_engine = self.choose()
+        first = asyncio.create_task(self._run_on_engine(first_engine, fn))
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_after_seconds)
+        if first in done:
+            error = first.exception()
+            if error is None:
+                return first.result()
+            if not is_connection_error(error):
+                raise error
+
+        # 遅延または接続エラーの場合は別のレプリカで実行する
+        second = asyncio.create_task(
+            self._run_on_engine(self.choose(exclude=[first_engine]), fn)
+        )
+        pending = {first, second} if first not in done else {second}
+        last_error: Optional[BaseException] = (
+            first.exception() if first in done else None
+        )
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    # 採用されなかったクエリは完了まで実行させ、セッションを正常に閉じる
+                    for other in pending:
+                        self._background_tasks.add(other)
+                        other.add_done_callback(self._discard_background_task)
+                    return task.result()
+                last_error = task.exception()
+        raise last_error
+
+    def _discard_background_task(self, task: asyncio.Task) -> None:
+        self._background_tasks.discard(task)
+        if not task.cancelled():
+            # 例外を取得済みにして未取得の警告を抑止する
+            task.exception()
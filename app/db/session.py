@@ -1,13 +1,17 @@
 import os
-import sys
-from typing import Optional
+from functools import lru_cache
+from typing import List, Optional
 
-import pymysql
 from pydantic import ConfigDict, computed_field
 from pydantic_settings import BaseSettings
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
+from app.db.profiler import QueryProfiler
+from app.db.replicas import ReplicaRouter
+
 
 class Settings(BaseSettings):
     """アプリケーション設定クラス"""
@@ -19,10 +23,94 @@ class Settings(BaseSettings):
     db_pass: str = "root"
     db_name: str = "hakopita_database_dev"
 
+    # 読み取り用レプリカ（カンマ区切りの"host"または"host:port"。未設定の場合はプライマリから読み取る）
+    # ユーザー・パスワード・DB名はプライマリと共通
+    db_replica_hosts: str = ""
+
+    # 接続プール設定（プライマリ）
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+
+    # 接続プール設定（読み取り用。レプリカごとに作成される）
+    db_replica_pool_size: int = 5
+    db_replica_max_overflow: int = 10
+    db_replica_pool_timeout: float = 5.0
+
+    # 接続タイムアウト（秒）
+    db_connect_timeout: int = 10
+
+    # 接続エラーが発生したレプリカを振り分け対象から外す時間（秒）
+    db_replica_retry_seconds: float = 30.0
+
+    # 読み取りクエリがこの時間（ミリ秒）を超えた場合に別のレプリカにも問い合わせる（0の場合は無効）
+    db_hedge_after_ms: float = 0.0
+
     # アプリケーション設定
     app_name: str = "HakoPita FastAPI"
     debug: bool = True
     log_level: str = "DEBUG"
+
+    # ログをキュー経由で別スレッドから出力する
+    log_queue_enabled: bool = True
+    # リクエストごとに1行のアクセスログ（経路・パラメータ・件数・処理時間）を出力する
+    access_log_enabled: bool = True
+    # Lambdaのイベント・レスポンス全体をログに出力する割合（0.0〜1.0。エラー時は常に出力）
+    log_payload_sample_rate: float = 0.0
+
+    # 発行したSQLをログに出力する（SQLAlchemyのecho。大量に出力されるため開発時のみ使用する）
+    db_echo: bool = False
+
+    # SQLプロファイラ設定（全てのSQLの実行時間をフィンガープリントごとに集計する）
+    sql_profiler_enabled: bool = True
+    # この時間（ミリ秒）を超えたSQLをスロークエリとしてログに出力し、EXPLAINを取得する
+    sql_slow_query_ms: float = 100.0
+    sql_explain_slow_queries: bool = True
+    # Lambda環境でSQLの統計をログに出力する間隔（秒、0は出力しない）
+    sql_profile_log_interval_seconds: float = 300.0
+    # GET /debug/sql_profileでSQLの統計・実行計画を公開する（SQL文が含まれるため開発時のみ有効にする）
+    sql_profile_endpoint_enabled: bool = False
+
+    # メトリクス設定
+    metrics_enabled: bool = True
+    # Lambda環境でメトリクスをログに出力する間隔（秒、0は出力しない）
+    metrics_log_interval_seconds: float = 60.0
+
+    # 起動時にテーブルを作成する（本番環境ではマイグレーションを使用するためfalseにする）
+    create_tables_on_startup: bool = False
+
+    # 検索用インメモリ寸法インデックス設定
+    search_index_enabled: bool = False
+    search_index_ttl_seconds: float = 60.0
+    # 寸法の近い順の検索（/search_storage/nearest）で使うグリッドのセルの大きさ（cm）
+    nearest_grid_cell_cm: float = 5.0
+    # NDJSONでの検索結果のストリーミング（format=ndjson）で一度に読み込む件数
+    search_stream_chunk_size: int = 500
+    # 件数・分布の集計キューブ（/search_storage/facets）の寸法の区間の幅・上限（cm）と再構築の間隔（秒）
+    facet_bucket_cm: float = 5.0
+    facet_max_cm: float = 200.0
+    facet_cube_ttl_seconds: float = 3600.0
+
+    # 検索結果キャッシュ設定
+    search_cache_enabled: bool = True
+    search_cache_max_entries: int = 1024
+    search_cache_ttl_seconds: float = 300.0
+
+    # fetch_storageのデータ単位のキャッシュ設定
+    item_cache_enabled: bool = True
+    item_cache_max_entries: int = 10000
+    item_cache_ttl_seconds: float = 300.0
+
+    # データ更新確認（MAX(updated_at)）のポーリング間隔
+    data_watermark_poll_seconds: float = 10.0
+
+    # レスポンスのETag（If-None-Matchでの304）・Cache-Control・gzip圧縮の設定
+    http_etag_enabled: bool = True
+    http_cache_max_age_seconds: int = 10
+    gzip_enabled: bool = True
+    # この大きさ（バイト）未満のレスポンスは圧縮しない
+    gzip_min_bytes: int = 1024
+    gzip_compress_level: int = 6
     
     # 環境変数ファイル(.env.*)から読み込む（デフォルトは.env.dev）
     model_config = ConfigDict(
@@ -37,43 +125,183 @@ class Settings(BaseSettings):
         """データベースURLを動的に生成"""
         return f"mysql+pymysql://{self.db_user}:{self.db_pass}@{self.db_host}:{self.db_port}/{self.db_name}"
 
+    @computed_field
+    @property
+    def async_database_url(self) -> str:
+        """非同期ドライバ（aiomysql）用のデータベースURLを動的に生成"""
+        return f"mysql+aiomysql://{self.db_user}:{self.db_pass}@{self.db_host}:{self.db_port}/{self.db_name}"
 
-# テスト環境かどうかを判定
-def is_testing() -> bool:
-    """テスト環境かどうかを判定"""
-    return (
-        'pytest' in sys.modules or
-        os.getenv('PYTEST_CURRENT_TEST') is not None or
-        'test' in sys.argv[0] if sys.argv else False
-    )
+    @computed_field
+    @property
+    def replica_async_database_urls(self) -> List[str]:
+        """読み取り用レプリカの非同期ドライバ用データベースURLを生成（未設定の場合はプライマリ）"""
+        urls = []
+        for replica in self.db_replica_hosts.split(","):
+            replica = replica.strip()
+            if not replica:
+                continue
+            host, _, port = replica.partition(":")
+            urls.append(
+                f"mysql+aiomysql://{self.db_user}:{self.db_pass}@{host}:{port or self.db_port}/{self.db_name}"
+            )
+        return urls or [self.async_database_url]
 
 
 # 設定インスタンスを作成
 settings = Settings()
 
-# テスト環境でない場合のみDB情報を出力
-if not is_testing():
-    print(settings.database_url)
-
-# SQLAlchemy設定
-engine = create_engine(
-    settings.database_url, pool_pre_ping=True, pool_recycle=300, echo=settings.debug
+# SQLプロファイラ（エンジンの作成時に登録する）
+sql_profiler = QueryProfiler(
+    slow_query_seconds=settings.sql_slow_query_ms / 1000,
+    explain_slow_queries=settings.sql_explain_slow_queries,
 )
 
-# セッションを作成
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def attach_sql_profiler(engine: Engine) -> None:
+    """SQL_PROFILER_ENABLEDが有効な場合、エンジンにSQLプロファイラを登録する"""
+    if settings.sql_profiler_enabled:
+        sql_profiler.attach(engine)
+
+
+def _set_session_read_only(dbapi_connection, connection_record):
+    """接続の確立時に、その接続のトランザクションを読み取り専用に設定する"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("SET SESSION TRANSACTION READ ONLY")
+    finally:
+        cursor.close()
+
+
+def set_read_only_on_connect(engine: Engine) -> None:
+    """
+    プールする接続ごとに一度だけ読み取り専用の設定を行う（MySQLのみ）
+
+    リクエストごとにSET TRANSACTION READ ONLYを実行する往復が不要になり、
+    DBにアクセスしないリクエスト（キャッシュのヒットなど）は接続自体を取得しない。
+    """
+    if engine.dialect.name == "mysql":
+        event.listen(engine, "connect", _set_session_read_only)
+
+
+@lru_cache(maxsize=None)
+def get_engine() -> Engine:
+    """プライマリのエンジンを取得（書き込み・マイグレーション・スクリプト用。初回呼び出し時に作成）"""
+    primary_engine = create_engine(
+        settings.database_url,
+        pool_pre_ping=True,
+        pool_recycle=300,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        connect_args={"connect_timeout": settings.db_connect_timeout},
+        echo=settings.db_echo,
+    )
+    attach_sql_profiler(primary_engine)
+    return primary_engine
+
+
+@lru_cache(maxsize=None)
+def get_session_factory() -> sessionmaker:
+    """プライマリのセッションファクトリを取得"""
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
+
+@lru_cache(maxsize=None)
+def get_async_engine() -> AsyncEngine:
+    """プライマリの非同期エンジンを取得（書き込み用。初回呼び出し時に作成）"""
+    primary_async_engine = create_async_engine(
+        settings.async_database_url,
+        pool_pre_ping=True,
+        pool_recycle=300,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        connect_args={"connect_timeout": settings.db_connect_timeout},
+        echo=settings.db_echo,
+    )
+    attach_sql_profiler(primary_async_engine.sync_engine)
+    return primary_async_engine
+
+
+@lru_cache(maxsize=None)
+def get_async_session_factory() -> async_sessionmaker:
+    """プライマリの非同期セッションファクトリを取得"""
+    return async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
+
+
+def create_read_engine(url: str) -> AsyncEngine:
+    """読み取り専用の非同期エンジンを作成（レプリカごとに別の接続プールを持つ）"""
+    read_engine = create_async_engine(
+        url,
+        pool_pre_ping=True,
+        pool_recycle=300,
+        pool_size=settings.db_replica_pool_size,
+        max_overflow=settings.db_replica_max_overflow,
+        pool_timeout=settings.db_replica_pool_timeout,
+        connect_args={"connect_timeout": settings.db_connect_timeout},
+        echo=settings.db_echo,
+    )
+    set_read_only_on_connect(read_engine.sync_engine)
+    attach_sql_profiler(read_engine.sync_engine)
+    return read_engine
+
+
+@lru_cache(maxsize=None)
+def get_read_router() -> ReplicaRouter:
+    """
+    読み取り用のレプリカ振り分けを取得（初回呼び出し時にエンジンを作成）
+
+    APIのルーターから使用し、DBの待ち時間中にイベントループを止めない。
+    """
+    return ReplicaRouter(
+        [create_read_engine(url) for url in settings.replica_async_database_urls],
+        retry_seconds=settings.db_replica_retry_seconds,
+        hedge_after_seconds=settings.db_hedge_after_ms / 1000 if settings.db_hedge_after_ms > 0 else None,
+    )
+
+
+# エンジン・セッションファクトリは起動時間短縮のため初回アクセス時に作成する
+# （from app.db.session import engineなどの従来の参照方法も利用できる）
+_LAZY_ATTRIBUTES = {
+    "engine": get_engine,
+    "SessionLocal": get_session_factory,
+    "async_engine": get_async_engine,
+    "AsyncSessionLocal": get_async_session_factory,
+    "read_router": get_read_router,
+}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # ベースクラスを作成
 Base = declarative_base()
 
 
 def get_db():
-    """データベースセッションを取得する関数"""
-    db = SessionLocal()
+    """データベースセッション（プライマリ）を取得する関数"""
+    db = get_session_factory()()
     try:
-       # 読み取り専用モードでセッションを開始
-        db.execute(text("SET TRANSACTION READ ONLY"))        
         yield db
     finally:
         db.close()
 
+
+async def get_async_db():
+    """
+    読み取り用の非同期データベースセッションを取得する関数
+
+    レプリカ（未設定の場合はプライマリ）の読み取り専用の接続を使用する。
+    接続は最初のクエリの実行時に取得される。
+    """
+    async with get_read_router().session() as db:
+        yield db
+
+
+async def get_async_write_db():
+    """書き込み用の非同期データベースセッション（プライマリ）を取得する関数"""
+    async with get_async_session_factory()() as db:
+        yield db
@@ -2,12 +2,15 @@ import logging
 import os
 import sys
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.core.cache import search_response_cache
 from app.core.logging import setup_logging
-from app.db.session import engine, settings
-from app.models.storage_model import Base
+from app.core.metrics import metrics_registry
+from app.core.request_log import RequestStatsMiddleware
+from app.crud.storage_item_cache import storage_item_cache
+from app.db.session import settings, sql_profiler
 from app.routers.storage_router import router as storage_router
 
 # ログ設定をセットアップ
@@ -26,10 +29,14 @@ def is_testing() -> bool:
     )
 
 
-# データベーステーブルを作成（テスト環境以外で実行）
-if not is_testing():
+# データベーステーブルを作成（CREATE_TABLES_ON_STARTUP=trueの場合のみ。テスト環境以外で実行）
+# 本番環境ではマイグレーション（alembic）でテーブルを管理し、コールドスタート時のDBアクセスを行わない
+if settings.create_tables_on_startup and not is_testing():
     try:
-        Base.metadata.create_all(bind=engine)
+        from app.db.session import get_engine
+        from app.models.storage_model import Base
+
+        Base.metadata.create_all(bind=get_engine())
         logger.info("データベーステーブルを作成しました。")
     except Exception as e:
         logger.error(f"データベーステーブル作成中にエラーが発生しました: {e}")
@@ -52,6 +59,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# アクセスログ（1リクエスト1行の構造化ログ）とメトリクスの集計を行うミドルウェアを追加
+if settings.access_log_enabled or settings.metrics_enabled:
+    app.add_middleware(
+        RequestStatsMiddleware,
+        access_log=settings.access_log_enabled,
+        metrics=metrics_registry if settings.metrics_enabled else None,
+    )
+
+# キャッシュのヒット率をメトリクスに含める
+metrics_registry.register_cache("search_storage", search_response_cache.stats)
+metrics_registry.register_cache("fetch_storage", storage_item_cache.stats)
+
 # ルーターを追加（prefixなし）
 app.include_router(storage_router)
 
@@ -72,6 +91,35 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/cache_stats")
+async def cache_stats():
+    """キャッシュの統計情報（ヒット・ミス・追い出し回数など）"""
+    return {
+        "search_storage": search_response_cache.stats(),
+        "fetch_storage": storage_item_cache.stats(),
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """ルートごとのレイテンシ・件数・DB/シリアライズ時間・キャッシュのメトリクス（Prometheusのテキスト形式）"""
+    return Response(
+        content=metrics_registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@app.get("/debug/sql_profile")
+async def sql_profile(limit: int = 50):
+    """SQLのフィンガープリントごとの実行統計とスロークエリの実行計画（SQL_PROFILE_ENDPOINT_ENABLED=trueの場合のみ）"""
+    if not settings.sql_profile_endpoint_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return {
+        "slow_query_ms": sql_profiler.slow_query_seconds * 1000,
+        "queries": sql_profiler.report(limit),
+    }
+
+
 @app.get("/test")
 async def test_endpoint():
     """テスト用エンドポイント（データベース接続なし）"""
@@ -1,27 +1,49 @@
-import json
 from datetime import datetime, timezone
 from typing import List, Optional
 
-from sqlalchemy import Boolean, Column, DateTime, Float, Integer, String, Text
+from sqlalchemy import Boolean, Column, Computed, DateTime, Float, Index, Integer, String, Text
 from sqlalchemy.types import Text as _Text
 from sqlalchemy.types import TypeDecorator
 
+from app.core import json_codec
+from app.core.json_codec import RawJSON
 from app.db.session import Base
 
 
+# 幅・奥行きの短い方と長い方を求める式（MySQL・SQLiteの両方で使える形式）
+DIM_SHORT_EXPRESSION = "CASE WHEN width <= depth THEN width ELSE depth END"
+DIM_LONG_EXPRESSION = "CASE WHEN width <= depth THEN depth ELSE width END"
+
+
 class JSONEncodedDict(TypeDecorator):
-    """JSONエンコードされた辞書を扱うためのカスタム型"""
+    """
+    JSONエンコードされた辞書を扱うためのカスタム型
+
+    モデルの属性としては取得時にデコードした値（リスト・辞書）を返す。
+    lazy=Trueの型は、レスポンス用の列のみの読み取り（storage_crudのSEARCH_RESPONSE_COLUMNSなど）で
+    type_coerceして使用し、デコードせずRawJSONとして保持してスキーマへの変換時にデコードする。
+    """
 
     impl = _Text
 
+    # 状態を持たないため、SQLAlchemyのコンパイル済みステートメントキャッシュを利用できる
+    cache_ok = True
+
+    def __init__(self, *args, lazy: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy = lazy
+
     def process_bind_param(self, value, dialect):
+        # RawJSONはエンコード済みのためそのまま保存する
+        if isinstance(value, RawJSON):
+            return value.text
         if value is not None:
-            value = json.dumps(value)
+            value = json_codec.dumps(value)
         return value
 
     def process_result_value(self, value, dialect):
         if value is not None:
-            value = json.loads(value)
+            value = RawJSON(value) if self.lazy else json_codec.loads(value)
         return value
 
 
@@ -30,6 +52,28 @@ class StorageData(Base):
 
     __tablename__ = "storage_table"
 
+    # 検索条件（国コード・カテゴリ・アクティブフラグの等価条件＋寸法の範囲条件）に合わせた複合インデックス
+    # 変更時はmigrations/versionsにマイグレーションを追加すること
+    __table_args__ = (
+        Index(
+            "ix_storage_search_width",
+            "country_code", "storage_category", "active", "width", "depth", "height",
+        ),
+        Index(
+            "ix_storage_search_depth",
+            "country_code", "storage_category", "active", "depth", "width", "height",
+        ),
+        Index(
+            "ix_storage_search_height",
+            "country_code", "storage_category", "active", "height",
+        ),
+        # 反転検索（幅と奥行きの入れ替えを許容する検索）用
+        Index(
+            "ix_storage_search_canonical",
+            "country_code", "storage_category", "active", "dim_short", "dim_long", "height",
+        ),
+    )
+
     # プライマリキー
     storage_data_id = Column(String(255), primary_key=True, index=True)
 
@@ -40,7 +84,7 @@ class StorageData(Base):
     item_title = Column(Text, nullable=False)
     item_url = Column(Text, nullable=False)
     primary_image_url = Column(Text, nullable=False)
-    image_url_list = Column(JSONEncodedDict, nullable=False)
+    image_url_list = Column(JSONEncodedDict(), nullable=False)
     price = Column(Float, nullable=False)
     ean = Column(String(256), nullable=True)
     country_code = Column(String(256), nullable=False, index=True)
@@ -51,20 +95,32 @@ class StorageData(Base):
     width = Column(Float, nullable=False, index=True)
     depth = Column(Float, nullable=False, index=True)
 
+    # 向きに依存しないサイズ情報（幅・奥行きの短い方と長い方）
+    # DB側の生成列として書き込み時に自動で計算される
+    dim_short = Column(Float, Computed(DIM_SHORT_EXPRESSION, persisted=True))
+    dim_long = Column(Float, Computed(DIM_LONG_EXPRESSION, persisted=True))
+
     # 属性情報
-    colors = Column(JSONEncodedDict, nullable=False)
-    materials = Column(JSONEncodedDict, nullable=False)
+    colors = Column(JSONEncodedDict(), nullable=False)
+    materials = Column(JSONEncodedDict(), nullable=False)
 
     # メタデータ
-    updated_at = Column(DateTime, nullable=False, default=datetime.now(timezone.utc))
+    # 書き込みごとに現在時刻を設定する（データ更新の検知にMAX(updated_at)を使用するためインデックスを付与）
+    updated_at = Column(
+        DateTime,
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+        index=True,
+    )
     seller_name = Column(String(256), nullable=True)
 
     # AI分析結果
     box_likelihood = Column(Float, nullable=True)
-    box_features = Column(JSONEncodedDict, nullable=True)
+    box_features = Column(JSONEncodedDict(), nullable=True)
     shelf_likelihood = Column(Float, nullable=True)
-    shelf_features = Column(JSONEncodedDict, nullable=True)
-    shelf_genres = Column(JSONEncodedDict, nullable=True)
+    shelf_features = Column(JSONEncodedDict(), nullable=True)
+    shelf_genres = Column(JSONEncodedDict(), nullable=True)
 
     def __repr__(self):
         return f"<StorageData(storage_data_id='{self.storage_data_id}', item_title='{self.item_title}')>"
@@ -1,20 +1,43 @@
-from typing import List, Tuple, Optional
+import json
+from typing import Any, AsyncIterator, List, Tuple, Optional, Union
 import logging
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.crud.storage_crud import StorageDataCRUD
-from app.db.session import get_db, settings
-from app.models.storage_model import StorageData
+from app.crud.storage_crud import FETCH_RESPONSE_COLUMNS, SEARCH_RESPONSE_COLUMNS, AsyncStorageDataCRUD
+from app.crud.storage_item_cache import storage_item_cache
+from app.db.session import get_async_db, get_read_router, settings
 from app.schemas.storage_schemas import (
+    BatchSearchStorageRequest,
+    BatchSearchStorageResponse,
     ErrorResponse,
+    FacetsStorageRequest,
+    FitsStorageItem,
+    FitsStorageRequest,
+    FitsStorageResponse,
+    NearestStorageItem,
+    NearestStorageRequest,
+    NearestStorageResponse,
+    SearchCursor,
     SearchStorageRequest,
     SearchStorageResponse,
     StorageDataListResponse,
+    StorageFacetsResponse,
     StorageDataResponse,
     StorageDataSearchResponse,
 )
+from app.core.cache import data_watermark, search_response_cache
+from app.core.http_cache import (
+    CachedResponse,
+    etag_matches,
+    make_etag,
+    negotiated_response,
+    not_modified_response,
+)
 from app.core.logging import get_logger
+from app.core.request_log import increment_request_stats, track_time, update_request_stats
 
 # ロガーを取得
 logger = get_logger("hakopita_fast_api.storage")
@@ -23,12 +46,58 @@ logger = get_logger("hakopita_fast_api.storage")
 router = APIRouter(tags=["storage"])
 
 
-def convert_storage_data_safely(storage_data_list: List[StorageData], use_search_response: bool = False) -> Tuple[List, List[str]]:
+# 検索結果を1行に1件のJSONで返す形式（format=ndjsonまたはAccept: application/x-ndjson）
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# スキーマごとの一括変換用TypeAdapter
+LIST_ADAPTERS = {
+    StorageDataSearchResponse: TypeAdapter(List[StorageDataSearchResponse]),
+    StorageDataResponse: TypeAdapter(List[StorageDataResponse]),
+}
+
+
+def json_bytes_response(
+    content: Union[bytes, CachedResponse],
+    request: Optional[Request] = None,
+    etag: Optional[str] = None,
+) -> Response:
+    """
+    シリアライズ済みのJSONをそのまま返す
+
+    Responseを直接返すため、FastAPIによるresponse_modelでの再検証・再シリアライズは行われない。
+    requestを指定した場合はAccept-Encodingに応じてgzip圧縮し（キャッシュの値は圧縮済みのものを再利用）、
+    etagを指定した場合はETag・Cache-Controlを付ける。
+    """
+    if isinstance(content, bytes):
+        content = CachedResponse(content)
+    if request is None:
+        return Response(content=content.body, media_type="application/json")
+    return negotiated_response(content, request.headers, etag=etag)
+
+
+def check_not_modified(request: Request, key: str) -> Tuple[Optional[str], Optional[Response]]:
+    """
+    キャッシュのキー（正規化した検索条件とデータの透かし値）からETagを生成し、
+    If-None-Matchと一致する場合は304レスポンスを返す
+
+    Returns:
+        Tuple[Optional[str], Optional[Response]]: (ETag（無効な場合はNone）, 304レスポンス（一致しない場合はNone）)
+    """
+    if not settings.http_etag_enabled:
+        return None, None
+    etag = make_etag(key)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        update_request_stats(cache="not_modified")
+        return etag, not_modified_response(etag)
+    return etag, None
+
+
+def convert_storage_data_safely(storage_data_list: List[Any], use_search_response: bool = False) -> Tuple[List, List[str]]:
     """
     ストレージデータを安全にスキーマに変換する
     
     Args:
-        storage_data_list: 変換対象のストレージデータリスト
+        storage_data_list: 変換対象のストレージデータリスト（StorageDataまたは必要な列のみのRow）
         use_search_response: Trueの場合はStorageDataSearchResponseを使用、Falseの場合はStorageDataResponseを使用
     
     Returns:
@@ -36,9 +105,17 @@ def convert_storage_data_safely(storage_data_list: List[StorageData], use_search
     """
     successful_data = []
     error_messages = []
+    increment_request_stats(rows_fetched=len(storage_data_list))
     
     # 使用するスキーマクラスを決定
     schema_class = StorageDataSearchResponse if use_search_response else StorageDataResponse
+
+    try:
+        # 全件をまとめて変換（1件ずつmodel_validateを呼ぶよりも高速）
+        return LIST_ADAPTERS[schema_class].validate_python(storage_data_list, from_attributes=True), error_messages
+    except ValidationError:
+        # 変換できないデータが含まれる場合は、1件ずつ変換して該当データのみスキップする
+        pass
     
     for i, storage_data in enumerate(storage_data_list):
         try:
@@ -52,17 +129,318 @@ def convert_storage_data_safely(storage_data_list: List[StorageData], use_search
             # loggerを使ってwarningで出力
             logger.warning(error_msg)
     
+    increment_request_stats(conversion_errors=len(error_messages))
     return successful_data, error_messages
 
 
+def build_search_cache_key(
+    search_params: SearchStorageRequest, after_id: Optional[str], watermark: Any
+) -> str:
+    """
+    検索結果キャッシュのキーを生成する
+
+    正規化した検索条件を使うため、width=30とwidth=30.0や、
+    範囲指定が無効な上下限の有無といった違いは同じキーになる。
+    """
+    return json.dumps(
+        {
+            "query": search_params.normalized_query(),
+            "page": search_params.page,
+            "page_size": search_params.page_size,
+            "after_id": after_id,
+            "watermark": watermark,
+        },
+        sort_keys=True,
+        default=str,
+    )
+
+
+async def execute_search(
+    db: AsyncSession,
+    search_params: SearchStorageRequest,
+    after_id: Optional[str] = None,
+    watermark: Any = None,
+) -> SearchStorageResponse:
+    """
+    検索を実行し、1ページ分のレスポンスを生成する
+
+    Args:
+        db: 非同期データベースセッション
+        search_params: 検索パラメータ
+        after_id: カーソルで指定された前のページの最後のID
+        watermark: データ更新の透かし値（インメモリインデックスの再構築判定に使用）
+    """
+    page = search_params.page
+    page_size = search_params.page_size
+
+    # CRUD操作を実行
+    crud = AsyncStorageDataCRUD(db, router=get_read_router())
+    offset = page * page_size
+
+    if settings.search_index_enabled:
+        # NumPyの読み込みはコールドスタートを遅くするため、インデックス使用時のみ読み込む
+        from app.crud.storage_index import storage_index
+
+        # インメモリインデックスで一致するIDを絞り込み、返却するページ分のみDBから取得
+        # （パーティション構築時のDBアクセスも非同期セッション上で行い、構築はワーカースレッドで行う）
+        with track_time("db"):
+            await storage_index.prepare_partition(
+                db, search_params.country_code, search_params.storage_category, watermark
+            )
+            page_ids, matched_items = await db.run_sync(
+                storage_index.search,
+                search_params,
+                offset=offset,
+                limit=page_size,
+                after_id=after_id,
+                watermark=watermark,
+            )
+        page_results = await crud.get_by_ids_in_order(page_ids, columns=SEARCH_RESPONSE_COLUMNS)
+        last_id = page_ids[-1] if page_ids else None
+    else:
+        # ページネーションと件数取得はDB側で行い、返却するページ分のみ読み込む
+        page_results, matched_items = await crud.search_by_params(
+            search_params, page=page, page_size=page_size, after_id=after_id
+        )
+        last_id = page_results[-1].storage_data_id if page_results else None
+
+    return build_search_response(
+        search_params, page_results, matched_items, last_id, after_id=after_id
+    )
+
+
+def build_search_response(
+    search_params: SearchStorageRequest,
+    page_results: List[Any],
+    matched_items: int,
+    last_id: Optional[str],
+    after_id: Optional[str] = None,
+) -> SearchStorageResponse:
+    """
+    検索結果の1ページ分の行からレスポンスを生成する
+
+    Args:
+        search_params: 検索パラメータ
+        page_results: ページ内の行（storage_data_id順）
+        matched_items: 一致した件数（after_id指定時はafter_idより後の件数）
+        last_id: ページ内の最後のID（次のページのカーソルに使用）
+        after_id: カーソルで指定された前のページの最後のID
+    """
+    page = search_params.page
+    page_size = search_params.page_size
+    offset = page * page_size
+
+    # カーソル指定時の件数はカーソル以降の件数のため、前のページまでの件数を加える
+    total_items = matched_items if after_id is None else offset + matched_items
+
+    # 安全にスキーマに変換（search_storageではStorageDataSearchResponseを使用）
+    with track_time("serialize"):
+        paginated_results, error_messages = convert_storage_data_safely(page_results, use_search_response=True)
+    
+    # エラーメッセージがある場合はログに記録
+    if error_messages:
+        logger.debug(f"{len(error_messages)}件のデータ変換エラーが発生しました")
+
+    total_pages = (total_items + page_size - 1) // page_size if page_size > 0 else 1
+    has_more = offset + page_size < total_items
+
+    # 次のページのURLを生成（正規化した検索条件と最後のIDをカーソルとして渡す）
+    next_page_url = None
+    if has_more and last_id is not None:
+        next_cursor = SearchCursor(
+            query=search_params.normalized_query(),
+            page=page + 1,
+            page_size=page_size,
+            last_id=last_id,
+        )
+        next_page_url = f"search_storage?cursor={next_cursor.encode()}"
+
+    # レスポンスを生成
+    return SearchStorageResponse(
+        total_items=total_items,
+        total_pages=total_pages,
+        page=page,
+        page_size=page_size,
+        has_more=has_more,
+        next_page_url=next_page_url,
+        data=paginated_results,
+    )
+
+
+async def execute_batch_search(
+    db: AsyncSession,
+    params_list: List[SearchStorageRequest],
+    watermark: Any = None,
+) -> List[SearchStorageResponse]:
+    """
+    複数の検索条件をまとめて実行し、検索条件ごとの1ページ分のレスポンスを生成する
+
+    インメモリインデックスが有効な場合は全条件の絞り込みを1回のrun_syncで行い、
+    ページ内のデータはIDをまとめて1回で取得する。無効な場合はUNION ALLの1クエリで検索する。
+    """
+    crud = AsyncStorageDataCRUD(db, router=get_read_router())
+
+    if settings.search_index_enabled:
+        from app.crud.storage_index import storage_index
+
+        def search_all(session):
+            return [
+                storage_index.search(
+                    session,
+                    params,
+                    offset=params.page * params.page_size,
+                    limit=params.page_size,
+                    watermark=watermark,
+                )
+                for params in params_list
+            ]
+
+        with track_time("db"):
+            for key in dict.fromkeys(
+                (params.country_code, params.storage_category) for params in params_list
+            ):
+                await storage_index.prepare_partition(db, *key, watermark)
+            index_results = await db.run_sync(search_all)
+        all_ids = list(dict.fromkeys(i for page_ids, _ in index_results for i in page_ids))
+        rows = await crud.get_by_ids_in_order(all_ids, columns=SEARCH_RESPONSE_COLUMNS)
+        rows_by_id = {row.storage_data_id: row for row in rows}
+        pages = [
+            ([rows_by_id[i] for i in page_ids if i in rows_by_id], matched_items, page_ids)
+            for page_ids, matched_items in index_results
+        ]
+        return [
+            build_search_response(params, page_rows, matched_items, page_ids[-1] if page_ids else None)
+            for params, (page_rows, matched_items, page_ids) in zip(params_list, pages)
+        ]
+
+    results = await crud.search_many_by_params(params_list)
+    return [
+        build_search_response(
+            params, page_rows, matched_items, page_rows[-1].storage_data_id if page_rows else None
+        )
+        for params, (page_rows, matched_items) in zip(params_list, results)
+    ]
+
+
+def wants_ndjson(response_format: Optional[str], accept: Optional[str]) -> bool:
+    """
+    NDJSONで返すか判定する（formatの指定をAcceptヘッダーより優先する）
+
+    Raises:
+        HTTPException: formatがjson・ndjson以外の場合
+    """
+    if response_format is not None:
+        if response_format not in ("json", "ndjson"):
+            raise HTTPException(status_code=422, detail="'format' must be 'json' or 'ndjson'")
+        return response_format == "ndjson"
+    return accept is not None and NDJSON_MEDIA_TYPE in accept
+
+
+async def stream_search_ndjson(
+    db: AsyncSession,
+    search_params: SearchStorageRequest,
+    after_id: Optional[str] = None,
+    watermark: Any = None,
+) -> AsyncIterator[bytes]:
+    """
+    検索結果の1ページ分をNDJSONとして読み込んだ分から順に返す
+
+    1行に1件のデータ（StorageDataSearchResponse）を出力し、最後の行に
+    {"meta": {...}}としてdata以外のSearchStorageResponseの項目（件数・next_page_urlなど）を出力する。
+    DBからはsearch_stream_chunk_size件ずつ読み込むため、ページサイズによらずメモリ使用量は一定となる。
+    """
+    page = search_params.page
+    page_size = search_params.page_size
+    chunk_size = settings.search_stream_chunk_size
+    crud = AsyncStorageDataCRUD(db)
+
+    if settings.search_index_enabled:
+        from app.crud.storage_index import storage_index
+
+        with track_time("db"):
+            await storage_index.prepare_partition(
+                db, search_params.country_code, search_params.storage_category, watermark
+            )
+            page_ids, matched_items = await db.run_sync(
+                storage_index.search,
+                search_params,
+                offset=page * page_size,
+                limit=page_size,
+                after_id=after_id,
+                watermark=watermark,
+            )
+        last_id = page_ids[-1] if page_ids else None
+
+        async def read_chunks():
+            # get_by_ids_in_order（AsyncStorageDataCRUD._run）でDBの時間は計測済み
+            for start in range(0, len(page_ids), chunk_size):
+                yield await crud.get_by_ids_in_order(
+                    page_ids[start:start + chunk_size], columns=SEARCH_RESPONSE_COLUMNS
+                )
+    else:
+        matched_items, last_id = 0, None
+
+        async def read_chunks():
+            streamed = crud.stream_search_by_params(
+                search_params, page=page, page_size=page_size, after_id=after_id, chunk_size=chunk_size
+            )
+            while True:
+                with track_time("db"):
+                    try:
+                        rows = await streamed.__anext__()
+                    except StopAsyncIteration:
+                        return
+                yield rows
+
+    row_count = 0
+    async for rows in read_chunks():
+        if not settings.search_index_enabled and rows:
+            matched_items = rows[0].total_count
+            last_id = rows[-1].storage_data_id
+        with track_time("serialize"):
+            converted, error_messages = convert_storage_data_safely(rows, use_search_response=True)
+            lines = b"".join(item.model_dump_json().encode() + b"\n" for item in converted)
+        if error_messages:
+            logger.debug(f"{len(error_messages)}件のデータ変換エラーが発生しました")
+        row_count += len(converted)
+        yield lines
+
+    if not settings.search_index_enabled and row_count == 0 and after_id is None and page > 0:
+        # ページが範囲外の場合は件数のみを別途取得
+        _, matched_items = await crud.search_by_params(search_params, page=page, page_size=page_size)
+
+    meta = build_search_response(search_params, [], matched_items, last_id, after_id=after_id)
+    if meta.next_page_url is not None:
+        meta.next_page_url += "&format=ndjson"
+    update_request_stats(row_count=row_count)
+    yield b'{"meta":' + meta.model_dump_json(exclude={"data"}).encode() + b"}\n"
+
+
+def has_size_condition(search_params: SearchStorageRequest) -> bool:
+    """幅・奥行き・高さのいずれかの条件（単一値または範囲）が指定されているか"""
+    return any(
+        [
+            search_params.width,
+            search_params.depth,
+            search_params.height,
+            (search_params.use_width_range and search_params.width_lower_limit and search_params.width_upper_limit),
+            (search_params.use_depth_range and search_params.depth_lower_limit and search_params.depth_upper_limit),
+            (search_params.use_height_range and search_params.height_lower_limit and search_params.height_upper_limit),
+        ]
+    )
+
+
 @router.get("/fetch_storage", response_model=StorageDataListResponse)
 async def fetch_storage(
+    request: Request,
     id_list: str = Query(..., description="カンマ区切りのストレージデータIDリスト"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     指定されたIDリストに基づいてストレージデータを取得します。
 
+    結果は指定されたIDの順序で返します（存在しないIDは含まれません）。
+
     - **id_list**: カンマ区切りのストレージデータIDリスト
     """
     try:
@@ -76,19 +454,66 @@ async def fetch_storage(
             # 有効なIDが1つもない場合も空リストを返す
             return StorageDataListResponse(data=[])
 
+        # 重複したIDは最初の位置のみを残す
+        storage_data_ids = list(dict.fromkeys(storage_data_ids))
+
         # CRUD操作を実行
-        crud = StorageDataCRUD(db)
-        storage_data_list = crud.get_by_ids(storage_data_ids)
+        crud = AsyncStorageDataCRUD(db, router=get_read_router())
+
+        watermark = None
+        if settings.item_cache_enabled or settings.http_etag_enabled:
+            watermark = await data_watermark.current_async(crud.get_data_watermark)
+
+        # IDリスト（順序を含む）とデータの透かし値が同じであれば内容は変わらない
+        etag, not_modified = check_not_modified(
+            request,
+            json.dumps({"fetch": storage_data_ids, "watermark": watermark}, default=str),
+        )
+        if not_modified is not None:
+            update_request_stats(params={"ids": len(storage_data_ids)})
+            return not_modified
+
+        # キャッシュ済みのデータを取得し、ミスしたIDのみをまとめてDBから取得
+        cached_items = {}
+        if settings.item_cache_enabled:
+            cached_items, stale_items = storage_item_cache.lookup(storage_data_ids, watermark)
+            if stale_items:
+                # データ更新後はupdated_atのみを取得し、変わっていないデータは引き続き使用する
+                current_updated_at = await crud.get_updated_at_by_ids(list(stale_items))
+                cached_items.update(
+                    storage_item_cache.revalidate(stale_items, current_updated_at, watermark)
+                )
+
+        missing_ids = [i for i in storage_data_ids if i not in cached_items]
+        storage_data_list = (
+            await crud.get_by_ids(missing_ids, columns=FETCH_RESPONSE_COLUMNS) if missing_ids else []
+        )
         
         # 安全にスキーマに変換（fetch_storageでは従来通りStorageDataResponseを使用）
-        successful_data, error_messages = convert_storage_data_safely(storage_data_list, use_search_response=False)
+        with track_time("serialize"):
+            successful_data, error_messages = convert_storage_data_safely(storage_data_list, use_search_response=False)
         
         # エラーメッセージがある場合はログに記録
         if error_messages:
             logger.warning(f"{len(error_messages)}件のデータ変換エラーが発生しました")
-        
-        # 成功したデータのみを返却
-        return StorageDataListResponse(data=successful_data)
+
+        if settings.item_cache_enabled:
+            storage_item_cache.set_many(successful_data, watermark)
+
+        # 成功したデータのみを、指定されたIDの順序で返却
+        items_by_id = {**cached_items, **{item.storage_data_id: item for item in successful_data}}
+        response = StorageDataListResponse(
+            data=[items_by_id[i] for i in storage_data_ids if i in items_by_id]
+        )
+        update_request_stats(
+            params={"ids": len(storage_data_ids)},
+            row_count=len(response.data),
+            cache=f"hit:{len(cached_items)},miss:{len(missing_ids)}",
+        )
+        # 変換済みのデータのため、response_modelによる再検証を行わずにシリアライズして返す
+        with track_time("serialize"):
+            body = response.model_dump_json().encode()
+        return json_bytes_response(body, request, etag)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -96,6 +521,7 @@ async def fetch_storage(
 
 @router.get("/search_storage", response_model=SearchStorageResponse)
 async def search_storage(
+    request: Request,
     # サイズパラメータ
     width: Optional[float] = Query(None, description="幅"),
     width_lower_limit: Optional[float] = Query(None, description="幅の下限"),
@@ -110,17 +536,23 @@ async def search_storage(
     height_upper_limit: Optional[float] = Query(None, description="高さの上限"),
     use_height_range: Optional[bool] = Query(False, description="高さの範囲指定を使用"),
     # その他のパラメータ
-    storage_category: int = Query(..., description="ストレージカテゴリ（0: Box, 1: Shelf）"),
-    country_code: str = Query(..., description="国コード（jp/us）"),
+    storage_category: Optional[int] = Query(None, description="ストレージカテゴリ（0: Box, 1: Shelf）。cursor指定時以外は必須"),
+    country_code: Optional[str] = Query(None, description="国コード（jp/us）。cursor指定時以外は必須"),
     enable_inverted_search: Optional[bool] = Query(False, description="反転検索を有効にする"),
     # ページネーション
     page: Optional[int] = Query(0, description="ページ番号"),
     page_size: Optional[int] = Query(2000, description="ページサイズ"),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="次のページを取得するためのカーソル（next_page_urlに含まれる）"),
+    # レスポンス形式
+    response_format: Optional[str] = Query(None, alias="format", description="レスポンス形式（json/ndjson）"),
+    accept: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     サイズ条件に基づいてストレージデータを検索します。
 
+    結果はstorage_data_id順に並びます。次のページはnext_page_urlのcursorで取得します。
+
     - **width**: 幅
     - **depth**: 奥行き
     - **height**: 高さ
@@ -128,99 +560,472 @@ async def search_storage(
     - **country_code**: 国コード（jp/us）
     - **page**: ページ番号
     - **page_size**: ページサイズ
+    - **cursor**: 次のページ用のカーソル（指定時は他の検索パラメータは無視されます）
+    - **format**: ndjsonの場合（またはAccept: application/x-ndjson）、1行に1件のNDJSONで
+      読み込んだ分から順に返し、最後の行に{"meta": {...}}として件数・next_page_urlを返します
     """
     try:
+        ndjson = wants_ndjson(response_format, accept)
+
         # 検索パラメータを構築
-        search_params = SearchStorageRequest(
-            width=width,
-            width_lower_limit=width_lower_limit,
-            width_upper_limit=width_upper_limit,
-            use_width_range=use_width_range,
-            depth=depth,
-            depth_lower_limit=depth_lower_limit,
-            depth_upper_limit=depth_upper_limit,
-            use_depth_range=use_depth_range,
-            height=height,
-            height_lower_limit=height_lower_limit,
-            height_upper_limit=height_upper_limit,
-            use_height_range=use_height_range,
-            storage_category=storage_category,
-            country_code=country_code,
-            enable_inverted_search=enable_inverted_search,
-            page=page,
-            page_size=page_size,
-        )
+        if cursor is not None:
+            # カーソルには正規化した検索条件が含まれるため、他のパラメータは使用しない
+            try:
+                search_cursor = SearchCursor.decode(cursor)
+                # 復元した検索条件が不正な場合もValueError（ValidationError）となる
+                search_params = search_cursor.to_request()
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            after_id = search_cursor.last_id
+        else:
+            if storage_category is None or country_code is None:
+                raise HTTPException(
+                    status_code=422,
+                    detail="'storage_category' and 'country_code' are required",
+                )
+            search_params = SearchStorageRequest(
+                width=width,
+                width_lower_limit=width_lower_limit,
+                width_upper_limit=width_upper_limit,
+                use_width_range=use_width_range,
+                depth=depth,
+                depth_lower_limit=depth_lower_limit,
+                depth_upper_limit=depth_upper_limit,
+                use_depth_range=use_depth_range,
+                height=height,
+                height_lower_limit=height_lower_limit,
+                height_upper_limit=height_upper_limit,
+                use_height_range=use_height_range,
+                storage_category=storage_category,
+                country_code=country_code,
+                enable_inverted_search=enable_inverted_search,
+                page=page,
+                page_size=page_size,
+            )
+            after_id = None
+
+        page = search_params.page
+        page_size = search_params.page_size
 
         # 少なくとも1つのサイズパラメータが必要
-        if not any(
-            [
-                width,
-                depth,
-                height,
-                (use_width_range and width_lower_limit and width_upper_limit),
-                (use_depth_range and depth_lower_limit and depth_upper_limit),
-                (use_height_range and height_lower_limit and height_upper_limit),
-            ]
-        ):
+        if not has_size_condition(search_params):
             raise HTTPException(
                 status_code=400,
                 detail="At least one of 'width', 'depth', or 'height' must be specified",
             )
 
-        # CRUD操作を実行
-        crud = StorageDataCRUD(db)
-        all_results = crud.search_by_params(search_params)
-        
-        # 安全にスキーマに変換（search_storageではStorageDataSearchResponseを使用）
-        successful_data, error_messages = convert_storage_data_safely(all_results, use_search_response=True)
-        
-        # エラーメッセージがある場合はログに記録
+        crud = AsyncStorageDataCRUD(db, router=get_read_router())
+
+        # データ更新の透かし値（キャッシュのキーとインデックスの再構築判定に使用）
+        watermark = None
+        if settings.search_cache_enabled or settings.search_index_enabled or settings.http_etag_enabled:
+            watermark = await data_watermark.current_async(crud.get_data_watermark)
+
+        update_request_stats(
+            params={
+                **search_params.normalized_query(),
+                "page": search_params.page,
+                "page_size": search_params.page_size,
+                "cursor": after_id is not None,
+            }
+        )
+
+        if ndjson:
+            # 読み込んだ分から返すため、検索結果キャッシュは使用しない
+            # （dbはレスポンスの送信中も使用する。pyproject.tomlのFastAPIのバージョンの制約を参照）
+            return StreamingResponse(
+                stream_search_ndjson(db, search_params, after_id=after_id, watermark=watermark),
+                media_type=NDJSON_MEDIA_TYPE,
+            )
+
+        # 正規化した検索条件とデータの透かし値が同じであれば、ETag・キャッシュのエントリも同じ
+        search_key = build_search_cache_key(search_params, after_id, watermark)
+        etag, not_modified = check_not_modified(request, search_key)
+        if not_modified is not None:
+            return not_modified
+
+        # キャッシュを確認（シリアライズ済みのJSONと件数、gzip圧縮したものを保持）
+        cache_key = search_key if settings.search_cache_enabled else None
+        if cache_key is not None:
+            cached = search_response_cache.get(cache_key)
+            if cached is not None:
+                update_request_stats(row_count=cached.row_count, cache="hit")
+                return json_bytes_response(cached, request, etag)
+
+        response = await execute_search(db, search_params, after_id=after_id, watermark=watermark)
+
+        # 変換済みのデータのため、response_modelによる再検証を行わずにシリアライズして返す
+        with track_time("serialize"):
+            cached = CachedResponse(response.model_dump_json().encode(), row_count=len(response.data))
+        if cache_key is not None:
+            search_response_cache.set(cache_key, cached)
+        update_request_stats(row_count=cached.row_count, cache="miss" if cache_key is not None else None)
+        return json_bytes_response(cached, request, etag)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@router.post("/search_storage/batch", response_model=BatchSearchStorageResponse)
+async def search_storage_batch(
+    request: BatchSearchStorageRequest,
+    http_request: Request,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    複数のサイズ条件の検索を1リクエストでまとめて実行します。
+
+    結果はqueriesと同じ順序で、それぞれsearch_storageと同じ形式の1ページ分を返します。
+    キャッシュにない検索条件は1つのセッションでまとめて検索します（UNION ALLの1クエリ、
+    またはインメモリインデックスの1回の走査）。
+
+    - **queries**: 検索条件のリスト（各要素はsearch_storageのパラメータと同じ）
+    """
+    try:
+        for index, search_params in enumerate(request.queries):
+            if not has_size_condition(search_params):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"queries[{index}]: At least one of 'width', 'depth', or 'height' must be specified",
+                )
+
+        crud = AsyncStorageDataCRUD(db, router=get_read_router())
+        watermark = None
+        if settings.search_cache_enabled or settings.search_index_enabled:
+            watermark = await data_watermark.current_async(crud.get_data_watermark)
+
+        # 検索条件ごとにキャッシュを確認し、ミスした条件のみをまとめて検索する
+        bodies: List[Optional[bytes]] = [None] * len(request.queries)
+        row_counts = [0] * len(request.queries)
+        cache_keys: List[Optional[str]] = [None] * len(request.queries)
+        if settings.search_cache_enabled:
+            for index, search_params in enumerate(request.queries):
+                cache_keys[index] = build_search_cache_key(search_params, None, watermark)
+                cached = search_response_cache.get(cache_keys[index])
+                if cached is not None:
+                    bodies[index], row_counts[index] = cached.body, cached.row_count
+
+        missing = [index for index, body in enumerate(bodies) if body is None]
+        if missing:
+            responses = await execute_batch_search(
+                db, [request.queries[index] for index in missing], watermark=watermark
+            )
+            with track_time("serialize"):
+                for index, response in zip(missing, responses):
+                    bodies[index] = response.model_dump_json().encode()
+                    row_counts[index] = len(response.data)
+                    if cache_keys[index] is not None:
+                        search_response_cache.set(
+                            cache_keys[index], CachedResponse(bodies[index], row_count=row_counts[index])
+                        )
+
+        update_request_stats(
+            params={"queries": len(request.queries)},
+            row_count=sum(row_counts),
+            cache=f"hit:{len(request.queries) - len(missing)},miss:{len(missing)}",
+        )
+        # 検索条件ごとのシリアライズ済みJSONを連結してレスポンスとする
+        return json_bytes_response(b'{"results":[' + b",".join(bodies) + b"]}", http_request)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@router.get("/search_storage/nearest", response_model=NearestStorageResponse)
+async def search_storage_nearest(
+    request: Request,
+    width: float = Query(..., description="幅"),
+    depth: float = Query(..., description="奥行き"),
+    height: float = Query(..., description="高さ"),
+    storage_category: int = Query(..., description="ストレージカテゴリ（0: Box, 1: Shelf）"),
+    country_code: str = Query(..., description="国コード（jp/us）"),
+    k: int = Query(20, description="返却する件数（1〜500）"),
+    orientation_invariant: bool = Query(False, description="幅と奥行きを入れ替えた向きも考慮する"),
+    width_weight: float = Query(1.0, description="幅の差の重み"),
+    depth_weight: float = Query(1.0, description="奥行きの差の重み"),
+    height_weight: float = Query(1.0, description="高さの差の重み"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    指定した寸法に近い順にストレージデータを返します。
+
+    許容範囲で絞り込むsearch_storageと異なり、一致するデータがなくても最も近いk件を返します。
+    距離は軸ごとの差に重みを掛けたユークリッド距離（cm）で、国コード・カテゴリごとの
+    アクティブなデータに対するインメモリのグリッドインデックスで検索します。
+
+    - **width** / **depth** / **height**: 寸法
+    - **k**: 返却する件数
+    - **orientation_invariant**: 幅と奥行きを入れ替えた向きも考慮する
+    - **width_weight** / **depth_weight** / **height_weight**: 軸ごとの重み
+    """
+    try:
+        try:
+            params = NearestStorageRequest(
+                width=width,
+                depth=depth,
+                height=height,
+                storage_category=storage_category,
+                country_code=country_code,
+                k=k,
+                orientation_invariant=orientation_invariant,
+                width_weight=width_weight,
+                depth_weight=depth_weight,
+                height_weight=height_weight,
+            )
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False, include_input=False))
+
+        # NumPyの読み込みはコールドスタートを遅くするため、使用時のみ読み込む
+        from app.crud.storage_index import storage_index
+
+        crud = AsyncStorageDataCRUD(db, router=get_read_router())
+        watermark = await data_watermark.current_async(crud.get_data_watermark)
+        update_request_stats(params=params.model_dump())
+
+        search_key = json.dumps(
+            {"nearest": params.model_dump(), "watermark": watermark}, sort_keys=True, default=str
+        )
+        etag, not_modified = check_not_modified(request, search_key)
+        if not_modified is not None:
+            return not_modified
+
+        cache_key = search_key if settings.search_cache_enabled else None
+        if cache_key is not None:
+            cached = search_response_cache.get(cache_key)
+            if cached is not None:
+                update_request_stats(row_count=cached.row_count, cache="hit")
+                return json_bytes_response(cached, request, etag)
+
+        with track_time("db"):
+            await storage_index.prepare_partition(
+                db, params.country_code, params.storage_category, watermark
+            )
+            ranked = await db.run_sync(storage_index.nearest, params, watermark=watermark)
+        rows = await crud.get_by_ids_in_order(
+            [storage_data_id for storage_data_id, _, _ in ranked], columns=SEARCH_RESPONSE_COLUMNS
+        )
+        with track_time("serialize"):
+            converted, error_messages = convert_storage_data_safely(rows, use_search_response=True)
+            items_by_id = {item.storage_data_id: item for item in converted}
+            response = NearestStorageResponse(
+                data=[
+                    NearestStorageItem(
+                        **items_by_id[storage_data_id].model_dump(),
+                        distance=round(distance, 4),
+                        rotated=rotated,
+                    )
+                    for storage_data_id, distance, rotated in ranked
+                    if storage_data_id in items_by_id
+                ]
+            )
+            cached = CachedResponse(response.model_dump_json().encode(), row_count=len(response.data))
         if error_messages:
             logger.debug(f"{len(error_messages)}件のデータ変換エラーが発生しました")
 
-        # ページネーション処理（成功したデータに対して）
-        total_items = len(successful_data)
-        total_pages = (total_items + page_size - 1) // page_size if page_size > 0 else 1
-        offset = page * page_size
-        paginated_results = successful_data[offset : offset + page_size]
-        has_more = offset + page_size < total_items
-
-        # 次のページのURLを生成
-        next_page_url = None
-        if has_more:
-            # 現在のURLパラメータを構築
-            params = []
-            if width is not None:
-                params.append(f"width={width}")
-            if depth is not None:
-                params.append(f"depth={depth}")
-            if height is not None:
-                params.append(f"height={height}")
-            if storage_category is not None:
-                params.append(f"storage_category={storage_category}")
-            if country_code is not None:
-                params.append(f"country_code={country_code}")
-            if enable_inverted_search is not None:
-                params.append(f"enable_inverted_search={enable_inverted_search}")
-
-            # ページネーションパラメータを追加
-            params.append(f"page={page + 1}")
-            params.append(f"page_size={page_size}")
-
-            next_page_url = f"search_storage?{'&'.join(params)}"
-
-        # レスポンスを生成
-        return SearchStorageResponse(
-            total_items=total_items,
-            total_pages=total_pages,
-            page=page,
-            page_size=page_size,
-            has_more=has_more,
-            next_page_url=next_page_url,
-            data=paginated_results,
+        if cache_key is not None:
+            search_response_cache.set(cache_key, cached)
+        update_request_stats(row_count=cached.row_count, cache="miss" if cache_key is not None else None)
+        return json_bytes_response(cached, request, etag)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@router.get("/search_storage/fits", response_model=FitsStorageResponse)
+async def search_storage_fits(
+    request: Request,
+    width: float = Query(..., description="空間の幅"),
+    depth: float = Query(..., description="空間の奥行き"),
+    height: float = Query(..., description="空間の高さ"),
+    storage_category: int = Query(..., description="ストレージカテゴリ（0: Box, 1: Shelf）"),
+    country_code: str = Query(..., description="国コード（jp/us）"),
+    clearance: float = Query(0.0, description="確保するすき間（各辺から差し引く長さ、cm）"),
+    rotation: str = Query("horizontal", description="許容する向き（none/horizontal/any）"),
+    page: int = Query(0, description="ページ番号（0から開始）"),
+    page_size: int = Query(100, description="ページサイズ（1〜2000）"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    指定した空間に収まるストレージデータを充填率の高い順に返します。
+
+    各辺からclearanceを差し引いた空間に収まるデータを対象とし、
+    充填率（データの体積 / 空間の体積）の高い順（同じ場合はID順）に並べます。
+
+    - **width** / **depth** / **height**: 空間の寸法
+    - **clearance**: 各辺から差し引くすき間
+    - **rotation**: none（向きを変えない）、horizontal（幅と奥行きの入れ替えを許容）、
+      any（全ての向きを許容）
+    - **page** / **page_size**: ページング
+    """
+    try:
+        try:
+            params = FitsStorageRequest(
+                width=width,
+                depth=depth,
+                height=height,
+                storage_category=storage_category,
+                country_code=country_code,
+                clearance=clearance,
+                rotation=rotation,
+                page=page,
+                page_size=page_size,
+            )
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False, include_input=False))
+
+        # NumPyの読み込みはコールドスタートを遅くするため、使用時のみ読み込む
+        from app.crud.storage_index import storage_index
+
+        crud = AsyncStorageDataCRUD(db, router=get_read_router())
+        watermark = await data_watermark.current_async(crud.get_data_watermark)
+        update_request_stats(params=params.model_dump())
+
+        search_key = json.dumps(
+            {"fits": params.model_dump(), "watermark": watermark}, sort_keys=True, default=str
+        )
+        etag, not_modified = check_not_modified(request, search_key)
+        if not_modified is not None:
+            return not_modified
+
+        cache_key = search_key if settings.search_cache_enabled else None
+        if cache_key is not None:
+            cached = search_response_cache.get(cache_key)
+            if cached is not None:
+                update_request_stats(row_count=cached.row_count, cache="hit")
+                return json_bytes_response(cached, request, etag)
+
+        with track_time("db"):
+            await storage_index.prepare_partition(
+                db, params.country_code, params.storage_category, watermark
+            )
+            ranked, total_items = await db.run_sync(storage_index.fits, params, watermark=watermark)
+        rows = await crud.get_by_ids_in_order(
+            [storage_data_id for storage_data_id, _ in ranked], columns=SEARCH_RESPONSE_COLUMNS
+        )
+        with track_time("serialize"):
+            converted, error_messages = convert_storage_data_safely(rows, use_search_response=True)
+            items_by_id = {item.storage_data_id: item for item in converted}
+            response = FitsStorageResponse(
+                total_items=total_items,
+                page=params.page,
+                page_size=params.page_size,
+                has_more=(params.page + 1) * params.page_size < total_items,
+                data=[
+                    FitsStorageItem(
+                        **items_by_id[storage_data_id].model_dump(),
+                        fill_ratio=round(fill_ratio, 4),
+                    )
+                    for storage_data_id, fill_ratio in ranked
+                    if storage_data_id in items_by_id
+                ],
+            )
+            cached = CachedResponse(response.model_dump_json().encode(), row_count=len(response.data))
+        if error_messages:
+            logger.debug(f"{len(error_messages)}件のデータ変換エラーが発生しました")
+
+        if cache_key is not None:
+            search_response_cache.set(cache_key, cached)
+        update_request_stats(row_count=cached.row_count, cache="miss" if cache_key is not None else None)
+        return json_bytes_response(cached, request, etag)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@router.get("/search_storage/facets", response_model=StorageFacetsResponse)
+async def search_storage_facets(
+    request: Request,
+    width: Optional[float] = Query(None, description="幅"),
+    width_lower_limit: Optional[float] = Query(None, description="幅の下限"),
+    width_upper_limit: Optional[float] = Query(None, description="幅の上限"),
+    use_width_range: Optional[bool] = Query(False, description="幅の範囲指定を使用"),
+    depth: Optional[float] = Query(None, description="奥行き"),
+    depth_lower_limit: Optional[float] = Query(None, description="奥行きの下限"),
+    depth_upper_limit: Optional[float] = Query(None, description="奥行きの上限"),
+    use_depth_range: Optional[bool] = Query(False, description="奥行きの範囲指定を使用"),
+    height: Optional[float] = Query(None, description="高さ"),
+    height_lower_limit: Optional[float] = Query(None, description="高さの下限"),
+    height_upper_limit: Optional[float] = Query(None, description="高さの上限"),
+    use_height_range: Optional[bool] = Query(False, description="高さの範囲指定を使用"),
+    storage_category: int = Query(..., description="ストレージカテゴリ（0: Box, 1: Shelf）"),
+    country_code: str = Query(..., description="国コード（jp/us）"),
+    enable_inverted_search: Optional[bool] = Query(False, description="反転検索を有効にする"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    search_storageと同じ検索条件に一致する件数と、寸法・価格・色・素材の分布を返します。
+
+    一致件数と価格・色・素材の件数はsearch_storageと同じ条件で求めます。
+    寸法の分布はその寸法以外の条件に一致するデータの分布で、国コード・カテゴリごとに事前に集計したキューブ
+    （寸法の区間ごとの件数の累積和）から求めます。寸法の条件は区間（bucket_size cm）の境界まで広げて評価し、
+    使用した範囲をapplied_bounds、概数であることをapproximate_histogramsで返します。
+
+    サイズパラメータはsearch_storageと同じです（指定しない場合は全データの集計）。
+    """
+    try:
+        try:
+            search_params = FacetsStorageRequest(
+                width=width,
+                width_lower_limit=width_lower_limit,
+                width_upper_limit=width_upper_limit,
+                use_width_range=use_width_range,
+                depth=depth,
+                depth_lower_limit=depth_lower_limit,
+                depth_upper_limit=depth_upper_limit,
+                use_depth_range=use_depth_range,
+                height=height,
+                height_lower_limit=height_lower_limit,
+                height_upper_limit=height_upper_limit,
+                use_height_range=use_height_range,
+                storage_category=storage_category,
+                country_code=country_code,
+                enable_inverted_search=enable_inverted_search,
+            )
+        except ValidationError as e:
+            raise HTTPException(
+                status_code=422,
+                detail=e.errors(include_url=False, include_context=False, include_input=False),
+            )
+
+        # NumPyの読み込みはコールドスタートを遅くするため、使用時のみ読み込む
+        from app.crud.storage_facets import storage_facet_index
+        from app.crud.storage_index import storage_index
+
+        crud = AsyncStorageDataCRUD(db, router=get_read_router())
+        watermark = await data_watermark.current_async(crud.get_data_watermark)
+        update_request_stats(params=search_params.normalized_query())
+
+        etag, not_modified = check_not_modified(
+            request,
+            json.dumps({"facets": search_params.normalized_query(), "watermark": watermark}, sort_keys=True, default=str),
         )
+        if not_modified is not None:
+            return not_modified
+
+        with track_time("db"):
+            # キューブと寸法インデックスの構築はワーカースレッドで行い、集計のみrun_sync内で行う
+            await storage_facet_index.prepare_cube(
+                db, search_params.country_code, search_params.storage_category, watermark
+            )
+            await storage_index.prepare_partition(
+                db, search_params.country_code, search_params.storage_category, watermark
+            )
+            facets = await db.run_sync(storage_facet_index.facets, search_params, watermark=watermark)
+        with track_time("serialize"):
+            response = StorageFacetsResponse(**facets)
+            body = response.model_dump_json().encode()
+        update_request_stats(row_count=response.total_items)
+        return json_bytes_response(body, request, etag)
 
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
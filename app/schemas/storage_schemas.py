@@ -1,7 +1,14 @@
+import base64
 from datetime import datetime
-from typing import List, Optional, Union
+from typing import Annotated, Any, Dict, List, Literal, Optional, Union
 
-from pydantic import BaseModel, ConfigDict, Field, field_validator, ValidationError
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, field_validator, ValidationError
+
+from app.core.json_codec import decode_raw_json
+
+# DBのJSON列（デコード前のRawJSONの場合は変換時にデコードする）
+JSONIntList = Annotated[List[int], BeforeValidator(decode_raw_json)]
+JSONStrList = Annotated[List[str], BeforeValidator(decode_raw_json)]
 
 
 class StorageDataSearchResponse(BaseModel):
@@ -19,13 +26,13 @@ class StorageDataSearchResponse(BaseModel):
     height: float = Field(..., description="高さ")
     width: float = Field(..., description="幅")
     depth: float = Field(..., description="奥行き")
-    colors: List[int] = Field(..., description="色のリスト")
-    materials: List[int] = Field(..., description="素材のリスト")
+    colors: JSONIntList = Field(..., description="色のリスト")
+    materials: JSONIntList = Field(..., description="素材のリスト")
     updated_at: datetime = Field(..., description="更新日時")
     seller_name: Optional[str] = Field(None, description="販売者名")
-    box_features: Optional[List[int]] = Field(None, description="ボックス特徴")
-    shelf_features: Optional[List[int]] = Field(None, description="棚特徴")
-    shelf_genres: Optional[List[int]] = Field(None, description="棚ジャンル")
+    box_features: Optional[JSONIntList] = Field(None, description="ボックス特徴")
+    shelf_features: Optional[JSONIntList] = Field(None, description="棚特徴")
+    shelf_genres: Optional[JSONIntList] = Field(None, description="棚ジャンル")
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -33,7 +40,7 @@ class StorageDataSearchResponse(BaseModel):
 class StorageDataResponse(StorageDataSearchResponse):
     """ストレージデータレスポンススキーマ（image_url_listを含む）"""
 
-    image_url_list: List[str] = Field(..., description="画像URLリスト")
+    image_url_list: JSONStrList = Field(..., description="画像URLリスト")
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -44,6 +51,24 @@ class StorageDataListResponse(BaseModel):
     data: List[StorageDataResponse] = Field(..., description="ストレージデータリスト")
 
 
+def check_country_code(v):
+    """国コードの妥当性をチェック"""
+    if not v:
+        raise ValueError("country_code is required")
+    if v not in ['jp', 'us']:
+        raise ValueError("Invalid country_code")
+    return v
+
+
+def check_storage_category(v):
+    """ストレージカテゴリの妥当性をチェック"""
+    if v is None:
+        raise ValueError("storage_category is required")
+    if v not in [0, 1]:
+        raise ValueError("Invalid storage_category")
+    return v
+
+
 class SearchStorageRequest(BaseModel):
     """ストレージ検索リクエストスキーマ"""
 
@@ -78,21 +103,67 @@ class SearchStorageRequest(BaseModel):
     @classmethod
     def validate_country_code(cls, v):
         """国コードの妥当性をチェック"""
-        if not v:
-            raise ValueError("country_code is required")
-        if v not in ['jp', 'us']:
-            raise ValueError("Invalid country_code")
-        return v
+        return check_country_code(v)
 
     @field_validator('storage_category')
     @classmethod
     def validate_storage_category(cls, v):
         """ストレージカテゴリの妥当性をチェック"""
-        if v is None:
-            raise ValueError("storage_category is required")
-        if v not in [0, 1]:
-            raise ValueError("Invalid storage_category")
-        return v
+        return check_storage_category(v)
+
+    def normalized_query(self) -> Dict[str, Any]:
+        """
+        ページネーションを除いた検索条件を正規化した辞書を返す
+
+        検索に使われないパラメータ（範囲指定が無効な寸法の上下限など）は除外し、
+        数値はfloatに揃える。同じ検索結果になる条件は同じ辞書になる。
+        """
+        query: Dict[str, Any] = {
+            "country_code": self.country_code,
+            "storage_category": self.storage_category,
+            "enable_inverted_search": bool(self.enable_inverted_search),
+        }
+        for dim in ("width", "depth", "height"):
+            lower_limit = getattr(self, f"{dim}_lower_limit")
+            upper_limit = getattr(self, f"{dim}_upper_limit")
+            value = getattr(self, dim)
+            if (
+                getattr(self, f"use_{dim}_range")
+                and lower_limit is not None
+                and upper_limit is not None
+            ):
+                query[f"use_{dim}_range"] = True
+                query[f"{dim}_lower_limit"] = float(lower_limit)
+                query[f"{dim}_upper_limit"] = float(upper_limit)
+            elif value is not None:
+                query[dim] = float(value)
+        return query
+
+
+class SearchCursor(BaseModel):
+    """search_storageのページ送り用カーソル（正規化した検索条件と最後に返したIDを保持）"""
+
+    query: Dict[str, Any] = Field(..., description="正規化した検索条件")
+    page: int = Field(..., description="カーソルが指すページ番号")
+    page_size: int = Field(..., description="ページサイズ")
+    last_id: str = Field(..., description="前のページで最後に返したストレージデータID")
+
+    def encode(self) -> str:
+        """URLに埋め込める不透明な文字列にエンコードする"""
+        return base64.urlsafe_b64encode(self.model_dump_json().encode()).rstrip(b"=").decode()
+
+    @classmethod
+    def decode(cls, cursor: str) -> "SearchCursor":
+        """エンコードされたカーソルを復元する（不正な場合はValueError）"""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            return cls.model_validate_json(base64.urlsafe_b64decode(padded.encode()))
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+
+    def to_request(self) -> SearchStorageRequest:
+        """カーソルの検索条件から検索リクエストを復元する"""
+        return SearchStorageRequest(**self.query, page=self.page, page_size=self.page_size)
 
 
 class SearchStorageResponse(BaseModel):
@@ -107,6 +178,122 @@ class SearchStorageResponse(BaseModel):
     data: List[StorageDataSearchResponse] = Field(..., description="ストレージデータリスト")
 
 
+# 一括検索で1リクエストに指定できる検索条件の上限
+BATCH_SEARCH_MAX_QUERIES = 50
+
+
+class BatchSearchQuery(SearchStorageRequest):
+    """一括検索の検索条件（ページ番号・ページサイズはnullを許可せず範囲を検証する）"""
+
+    page: int = Field(0, ge=0, description="ページ番号")
+    page_size: int = Field(2000, ge=1, le=2000, description="ページサイズ（1〜2000）")
+
+
+class BatchSearchStorageRequest(BaseModel):
+    """ストレージ一括検索リクエストスキーマ"""
+
+    queries: List[BatchSearchQuery] = Field(
+        ..., min_length=1, max_length=BATCH_SEARCH_MAX_QUERIES, description="検索条件のリスト"
+    )
+
+
+class BatchSearchStorageResponse(BaseModel):
+    """ストレージ一括検索レスポンススキーマ"""
+
+    results: List[SearchStorageResponse] = Field(..., description="検索条件ごとの検索結果（queriesと同じ順序）")
+
+
+class NearestStorageRequest(BaseModel):
+    """寸法の近い順の検索リクエストスキーマ"""
+
+    # NaN・無限大は距離を計算できないため受け付けない
+    model_config = ConfigDict(allow_inf_nan=False)
+
+    country_code: str = Field(..., description="国コード（jp/us）")
+    storage_category: int = Field(..., description="ストレージカテゴリ（0: Box, 1: Shelf）")
+    width: float = Field(..., gt=0, description="幅")
+    depth: float = Field(..., gt=0, description="奥行き")
+    height: float = Field(..., gt=0, description="高さ")
+    k: int = Field(20, ge=1, le=500, description="返却する件数")
+    orientation_invariant: bool = Field(False, description="幅と奥行きを入れ替えた向きも考慮する")
+    width_weight: float = Field(1.0, gt=0, description="幅の差の重み")
+    depth_weight: float = Field(1.0, gt=0, description="奥行きの差の重み")
+    height_weight: float = Field(1.0, gt=0, description="高さの差の重み")
+
+    @field_validator('country_code')
+    @classmethod
+    def validate_country_code(cls, v):
+        """国コードの妥当性をチェック"""
+        return check_country_code(v)
+
+    @field_validator('storage_category')
+    @classmethod
+    def validate_storage_category(cls, v):
+        """ストレージカテゴリの妥当性をチェック"""
+        return check_storage_category(v)
+
+
+class NearestStorageItem(StorageDataSearchResponse):
+    """寸法の近い順の検索結果のデータ"""
+
+    distance: float = Field(..., description="指定寸法との重み付き距離（cm）")
+    rotated: bool = Field(..., description="幅と奥行きを入れ替えた向きで一致したか")
+
+
+class NearestStorageResponse(BaseModel):
+    """寸法の近い順の検索レスポンススキーマ"""
+
+    data: List[NearestStorageItem] = Field(..., description="距離の近い順のストレージデータリスト")
+
+
+class FitsStorageRequest(BaseModel):
+    """指定した空間に収まるデータの検索リクエストスキーマ"""
+
+    # NaN・無限大は寸法の比較・充填率の計算ができないため受け付けない
+    model_config = ConfigDict(allow_inf_nan=False)
+
+    country_code: str = Field(..., description="国コード（jp/us）")
+    storage_category: int = Field(..., description="ストレージカテゴリ（0: Box, 1: Shelf）")
+    width: float = Field(..., gt=0, description="空間の幅")
+    depth: float = Field(..., gt=0, description="空間の奥行き")
+    height: float = Field(..., gt=0, description="空間の高さ")
+    clearance: float = Field(0.0, ge=0, description="各軸で確保するすき間（cm）")
+    rotation: Literal["none", "horizontal", "any"] = Field(
+        "horizontal",
+        description="許容する向き（none: そのまま、horizontal: 幅と奥行きの入れ替え、any: 全ての向き）",
+    )
+    page: int = Field(0, ge=0, description="ページ番号")
+    page_size: int = Field(100, ge=1, le=2000, description="ページサイズ")
+
+    @field_validator('country_code')
+    @classmethod
+    def validate_country_code(cls, v):
+        """国コードの妥当性をチェック"""
+        return check_country_code(v)
+
+    @field_validator('storage_category')
+    @classmethod
+    def validate_storage_category(cls, v):
+        """ストレージカテゴリの妥当性をチェック"""
+        return check_storage_category(v)
+
+
+class FitsStorageItem(StorageDataSearchResponse):
+    """指定した空間に収まるデータ"""
+
+    fill_ratio: float = Field(..., description="空間の体積に対するデータの体積の割合")
+
+
+class FitsStorageResponse(BaseModel):
+    """指定した空間に収まるデータの検索レスポンススキーマ"""
+
+    total_items: int = Field(..., description="総アイテム数")
+    page: int = Field(..., description="現在のページ番号")
+    page_size: int = Field(..., description="ページサイズ")
+    has_more: bool = Field(..., description="次のページがあるか")
+    data: List[FitsStorageItem] = Field(..., description="充填率の高い順のストレージデータリスト")
+
+
 class FetchStorageRequest(BaseModel):
     """ストレージ取得リクエストスキーマ"""
 
@@ -117,4 +304,47 @@ class ErrorResponse(BaseModel):
     """エラーレスポンススキーマ"""
 
     error: str = Field(..., description="エラーメッセージ")
-    detail: Optional[str] = Field(None, description="詳細エラー情報") 
\ No newline at end of file
+    detail: Optional[str] = Field(None, description="詳細エラー情報") 
+
+
+class FacetsStorageRequest(SearchStorageRequest):
+    """件数と分布の集計リクエストスキーマ（検索条件はSearchStorageRequestと同じ）"""
+
+    # NaN・無限大は寸法の区間を求められないため受け付けない
+    model_config = ConfigDict(allow_inf_nan=False)
+
+
+class FacetBucket(BaseModel):
+    """範囲ごとの件数"""
+
+    lower: float = Field(..., description="下限（含む）")
+    upper: Optional[float] = Field(None, description="上限（含まない。Noneは上限なし）")
+    count: int = Field(..., description="件数")
+
+
+class FacetValueCount(BaseModel):
+    """値ごとの件数"""
+
+    value: int = Field(..., description="値")
+    count: int = Field(..., description="件数")
+
+
+class StorageFacetsResponse(BaseModel):
+    """検索条件に一致する件数と分布のレスポンススキーマ"""
+
+    total_items: int = Field(..., description="一致した件数（search_storageと同じ）")
+    bucket_size: float = Field(..., description="寸法の区間の幅（cm）")
+    applied_bounds: Dict[str, Optional[List[Optional[float]]]] = Field(
+        ...,
+        description="寸法の分布の集計に使用した、区間の境界に広げた寸法ごとの範囲[下限, 上限]"
+        "（上限は含まない。指定がない寸法はNone）",
+    )
+    approximate_histograms: bool = Field(
+        ..., description="寸法の分布がapplied_boundsまで広げた条件で集計された概数の場合はTrue"
+    )
+    width: List[FacetBucket] = Field(..., description="幅の分布（幅以外の条件に一致するデータ）")
+    depth: List[FacetBucket] = Field(..., description="奥行きの分布（奥行き以外の条件に一致するデータ）")
+    height: List[FacetBucket] = Field(..., description="高さの分布（高さ以外の条件に一致するデータ）")
+    price: List[FacetBucket] = Field(..., description="一致したデータの価格の分布")
+    colors: List[FacetValueCount] = Field(..., description="一致したデータの色ごとの件数（件数の多い順）")
+    materials: List[FacetValueCount] = Field(..., description="一致したデータの素材ごとの件数（件数の多い順）")
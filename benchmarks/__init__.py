@@ -0,0 +1 @@
+"""検索・取得のホットパスと負荷試験のベンチマーク"""
@@ -0,0 +1,142 @@
+"""
+ベンチマーク用の合成カタログ（storage_table）をSQLiteに生成する
+
+寸法は実際の収納用品に近い対数正規分布（0.5cm刻み）、国コード・カテゴリは偏りを持たせ、
+JSON列（colors・materials・image_url_list・特徴量）の長さもデータごとにばらつかせる。
+同じ件数・シードからは同じデータが生成される。
+"""
+import math
+import random
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.engine import Engine
+
+from app.models.storage_model import Base, StorageData
+
+# 生成したカタログの保存先
+DATA_DIR = Path(__file__).resolve().parent / ".data"
+
+# 国コードとカテゴリの出現比率
+COUNTRY_WEIGHTS = {"jp": 0.8, "us": 0.2}
+CATEGORY_WEIGHTS = {0: 0.65, 1: 0.35}
+
+# カテゴリごとの寸法の中央値（cm）と対数正規分布のσ
+DIMENSION_MEDIANS = {
+    0: {"width": 30.0, "depth": 38.0, "height": 24.0},  # Box
+    1: {"width": 60.0, "depth": 30.0, "height": 90.0},  # Shelf
+}
+DIMENSION_SIGMA = 0.35
+
+# 非アクティブなデータの割合
+INACTIVE_RATIO = 0.1
+
+# 一度にINSERTする件数
+INSERT_CHUNK_SIZE = 5000
+
+
+def catalog_path(rows: int, seed: int) -> Path:
+    """件数とシードに対応するカタログのファイルパス"""
+    return DATA_DIR / f"catalog_{rows}_{seed}.db"
+
+
+def storage_data_id(index: int) -> str:
+    """合成データのストレージデータID"""
+    return f"bench_{index:07d}"
+
+
+def _weighted_choice(rng: random.Random, weights: Dict[Any, float]) -> Any:
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _dimension(rng: random.Random, median: float) -> float:
+    value = rng.lognormvariate(math.log(median), DIMENSION_SIGMA)
+    return min(max(round(value * 2) / 2, 5.0), 200.0)
+
+
+def generate_rows(rows: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """合成データの行を生成する"""
+    rng = random.Random(seed)
+    base_time = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for index in range(rows):
+        category = _weighted_choice(rng, CATEGORY_WEIGHTS)
+        medians = DIMENSION_MEDIANS[category]
+        item_id = f"item_{index}"
+        image_count = rng.randint(1, 10)
+        yield {
+            "storage_data_id": storage_data_id(index),
+            "storage_category": category,
+            "shop_id": rng.randint(1, 50),
+            "item_id": item_id,
+            "item_title": f"{item_id} " + "収納ボックス " * rng.randint(1, 6),
+            "item_url": f"https://example.com/items/{item_id}",
+            "primary_image_url": f"https://example.com/images/{item_id}/0.jpg",
+            "image_url_list": [
+                f"https://example.com/images/{item_id}/{i}.jpg"
+                for i in range(image_count)
+            ],
+            "price": float(rng.randint(300, 30000)),
+            "ean": f"{rng.randrange(10**12, 10**13)}",
+            "country_code": _weighted_choice(rng, COUNTRY_WEIGHTS),
+            "active": rng.random() >= INACTIVE_RATIO,
+            "width": _dimension(rng, medians["width"]),
+            "depth": _dimension(rng, medians["depth"]),
+            "height": _dimension(rng, medians["height"]),
+            "colors": rng.sample(range(20), rng.randint(0, 5)),
+            "materials": rng.sample(range(12), rng.randint(0, 3)),
+            "updated_at": base_time + timedelta(seconds=index),
+            "seller_name": f"seller_{rng.randint(1, 200)}",
+            "box_likelihood": rng.random() if category == 0 else None,
+            "box_features": rng.sample(range(30), rng.randint(1, 8))
+            if category == 0
+            else None,
+            "shelf_likelihood": rng.random() if category == 1 else None,
+            "shelf_features": rng.sample(range(30), rng.randint(1, 8))
+            if category == 1
+            else None,
+            "shelf_genres": rng.sample(range(10), rng.randint(1, 3))
+            if category == 1
+            else None,
+        }
+
+
+def populate(engine: Engine, rows: int, seed: int = 0) -> None:
+    """テーブルを作成し、合成データを投入する"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    table = StorageData.__table__
+    chunk: List[Dict[str, Any]] = []
+    with engine.begin() as conn:
+        for row in generate_rows(rows, seed):
+            chunk.append(row)
+            if len(chunk) >= INSERT_CHUNK_SIZE:
+                conn.execute(insert(table), chunk)
+                chunk = []
+        if chunk:
+            conn.execute(insert(table), chunk)
+
+
+def open_catalog(rows: int, seed: int = 0, path: Optional[Path] = None) -> Engine:
+    """
+    合成カタログのエンジンを取得する（未生成または件数が異なる場合は生成する）
+
+    Args:
+        rows: 件数
+        seed: 乱数のシード
+        path: SQLiteファイルのパス（省略時はbenchmarks/.data以下）
+    """
+    path = path or catalog_path(rows, seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        with engine.connect() as conn:
+            existing = conn.execute(
+                select(func.count()).select_from(StorageData.__table__)
+            ).scalar()
+    except Exception:
+        existing = None
+    if existing != rows:
+        populate(engine, rows, seed)
+    return engine
@@ -0,0 +1,320 @@
+"""
+検索・取得のホットパスのベンチマーク
+
+- SQLでの検索・取得（search_by_params・get_by_ids）とレスポンスへの変換（convert_storage_data_safely）
+- インメモリインデックスでの検索（storage_index.search・nearest・fits、storage_facet_index.facets）
+- 非同期セッション（AsyncSession.run_sync）経由での検索（エンドポイントと同じ経路）
+
+使用方法:
+    poetry run python -m benchmarks.hot_paths --rows 100000
+    poetry run python -m benchmarks.hot_paths --rows 100000 --update-baselines
+
+合成カタログ（benchmarks/catalog.py）に対して各ケースを繰り返し実行し、p50/p95/p99と
+スループットを出力する。baselines.jsonに同じ件数の基準値がある場合はp95を比較し、
+許容範囲を超えて遅くなったケースがあれば終了コード1で終了する。
+比較はマシンの速度の差を除くため、CPUのみを使う基準処理（calibration）のp95との比で行う。
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.crud.storage_crud import (
+    FETCH_RESPONSE_COLUMNS,
+    AsyncStorageDataCRUD,
+    StorageDataCRUD,
+)
+from app.crud.storage_facets import storage_facet_index
+from app.crud.storage_index import storage_index
+from app.routers.storage_router import convert_storage_data_safely
+from app.schemas.storage_schemas import (
+    FitsStorageRequest,
+    NearestStorageRequest,
+    SearchStorageRequest,
+)
+from benchmarks.catalog import open_catalog, storage_data_id
+from benchmarks.report import (
+    CALIBRATION_CASE,
+    DEFAULT_TOLERANCE,
+    find_regressions,
+    format_table,
+    load_baselines,
+    save_baselines,
+    summarize,
+)
+
+# 検索のケース（寸法は実行ごとに±JITTER_CMの範囲でずらし、同じ条件の繰り返しにならないようにする）
+SEARCH_CASES: Dict[str, Dict[str, Any]] = {
+    "search_width": dict(width=30),
+    "search_width_depth_height": dict(width=30, depth=38, height=24),
+    "search_inverted": dict(width=38, depth=30, enable_inverted_search=True),
+    "search_range": dict(
+        use_width_range=True,
+        width_lower_limit=25,
+        width_upper_limit=40,
+        use_depth_range=True,
+        depth_lower_limit=30,
+        depth_upper_limit=45,
+    ),
+    "search_height_only": dict(height=24),
+}
+JITTER_CM = 5.0
+
+# IDリスト取得のケース（件数）。一部は存在しないIDとする
+FETCH_CASES = {"fetch_ids_100": 100, "fetch_ids_1000": 1000}
+MISSING_ID_RATIO = 0.05
+
+# 変換のみを計測する件数
+CONVERT_SEARCH_ROWS = 2000
+CONVERT_FETCH_ROWS = 1000
+
+# インメモリインデックスで実行する検索のケース（SEARCH_CASESの一部）
+INDEX_SEARCH_CASES = ("search_width", "search_inverted", "search_range")
+# 寸法の近い順・収まるデータの検索のケース（寸法のみ。寸法以外の条件は固定）
+NEAREST_CASE = dict(width=30, depth=38, height=24)
+FITS_CASE = dict(width=40, depth=45, height=30)
+
+# 基準処理の入力（CPUのみを使う処理。結果をマシンの速度の差で補正するために計測する）
+CALIBRATION_VALUES = [random.Random(0).random() for _ in range(20000)]
+
+
+def baseline_key(rows: int) -> str:
+    return f"rows={rows}"
+
+
+def jittered(params: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+    """寸法の値を0.5cm刻みでずらした検索条件"""
+    shift = round(rng.uniform(-JITTER_CM, JITTER_CM) * 2) / 2
+    result = dict(params)
+    for name, value in params.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            result[name] = value + shift
+    return result
+
+
+def measure(fn: Callable[[], Any], iterations: int, warmup: int) -> Dict[str, Any]:
+    """fnをwarmup回実行した後、iterations回実行してレイテンシを集計する"""
+    for _ in range(warmup):
+        fn()
+    latencies: List[float] = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - call_started)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def calibrate() -> Any:
+    """基準処理（ソートとJSONのエンコード・デコード）"""
+    return json.loads(json.dumps(sorted(CALIBRATION_VALUES)))
+
+
+def build_cases(
+    db: Session,
+    rows: int,
+    seed: int,
+    async_db: Optional[AsyncSession] = None,
+    loop: Optional[asyncio.AbstractEventLoop] = None,
+) -> Dict[str, Callable[[], Any]]:
+    """
+    ケース名と1回分の処理の辞書を作成
+
+    async_dbとloopを指定した場合は、非同期セッション経由のケースも作成する。
+    """
+    crud = StorageDataCRUD(db)
+    rng = random.Random(seed)
+    cases: Dict[str, Callable[[], Any]] = {CALIBRATION_CASE: calibrate}
+
+    for name, params in SEARCH_CASES.items():
+
+        def run_search(params=params):
+            request = SearchStorageRequest(
+                country_code="jp", storage_category=0, **jittered(params, rng)
+            )
+            return crud.search_by_params(request, page=0, page_size=request.page_size)
+
+        cases[name] = run_search
+
+    for name, count in FETCH_CASES.items():
+
+        def run_fetch(count=count):
+            ids = [storage_data_id(rng.randrange(rows)) for _ in range(count)]
+            for i in range(int(count * MISSING_ID_RATIO)):
+                ids[i] = f"missing_{i}"
+            return crud.get_by_ids(ids, columns=FETCH_RESPONSE_COLUMNS)
+
+        cases[name] = run_fetch
+
+    # インメモリインデックス（パーティション・キューブは計測前の実行で構築され、以降は再利用される）
+    for name in INDEX_SEARCH_CASES:
+
+        def run_index_search(params=SEARCH_CASES[name]):
+            request = SearchStorageRequest(
+                country_code="jp", storage_category=0, **jittered(params, rng)
+            )
+            return storage_index.search(db, request, limit=request.page_size)
+
+        cases[f"index_{name}"] = run_index_search
+
+    def run_nearest():
+        request = NearestStorageRequest(
+            country_code="jp",
+            storage_category=0,
+            k=20,
+            orientation_invariant=True,
+            **jittered(NEAREST_CASE, rng),
+        )
+        return storage_index.nearest(db, request)
+
+    def run_fits():
+        request = FitsStorageRequest(
+            country_code="jp",
+            storage_category=0,
+            clearance=0.5,
+            rotation="any",
+            **jittered(FITS_CASE, rng),
+        )
+        return storage_index.fits(db, request)
+
+    def run_facets():
+        request = SearchStorageRequest(
+            country_code="jp",
+            storage_category=0,
+            **jittered(SEARCH_CASES["search_range"], rng),
+        )
+        return storage_facet_index.facets(db, request)
+
+    cases["index_nearest"] = run_nearest
+    cases["index_fits"] = run_fits
+    cases["facets_range"] = run_facets
+
+    # 非同期セッション経由（AsyncSession.run_syncでの実行とイベントループの往復を含む）
+    if async_db is not None and loop is not None:
+        async_crud = AsyncStorageDataCRUD(async_db)
+
+        def run_async_search(params=SEARCH_CASES["search_width"]):
+            request = SearchStorageRequest(
+                country_code="jp", storage_category=0, **jittered(params, rng)
+            )
+            return loop.run_until_complete(
+                async_crud.search_by_params(
+                    request, page=0, page_size=request.page_size
+                )
+            )
+
+        def run_async_index_search(params=SEARCH_CASES["search_width"]):
+            request = SearchStorageRequest(
+                country_code="jp", storage_category=0, **jittered(params, rng)
+            )
+
+            async def search():
+                page_ids, _ = await async_db.run_sync(
+                    storage_index.search, request, limit=request.page_size
+                )
+                return await async_crud.get_by_ids_in_order(page_ids)
+
+            return loop.run_until_complete(search())
+
+        cases["async_search_width"] = run_async_search
+        cases["async_index_search_width"] = run_async_index_search
+
+    # 変換は同じ行に対して計測する（DBアクセスを含めない）
+    wide_search = SearchStorageRequest(
+        country_code="jp",
+        storage_category=0,
+        use_width_range=True,
+        width_lower_limit=5,
+        width_upper_limit=200,
+    )
+    search_rows, _ = crud.search_by_params(
+        wide_search, page=0, page_size=CONVERT_SEARCH_ROWS
+    )
+    fetch_rows = crud.get_by_ids(
+        [storage_data_id(i) for i in range(min(rows, CONVERT_FETCH_ROWS))]
+    )
+    cases[f"convert_search_{len(search_rows)}"] = lambda: convert_storage_data_safely(
+        search_rows, use_search_response=True
+    )
+    cases[f"convert_fetch_{len(fetch_rows)}"] = lambda: convert_storage_data_safely(
+        fetch_rows, use_search_response=False
+    )
+    return cases
+
+
+def run_benchmarks(
+    engine: Engine, rows: int, iterations: int = 30, warmup: int = 3, seed: int = 0
+) -> Dict[str, Dict[str, Any]]:
+    """全ケースを実行して結果を返す"""
+    db = sessionmaker(bind=engine)()
+    loop = asyncio.new_event_loop()
+    async_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{engine.url.database}", poolclass=NullPool
+    )
+    async_db = AsyncSession(async_engine)
+    try:
+        return {
+            name: measure(fn, iterations, warmup)
+            for name, fn in build_cases(db, rows, seed, async_db, loop).items()
+        }
+    finally:
+        db.close()
+        loop.run_until_complete(async_db.close())
+        loop.run_until_complete(async_engine.dispose())
+        loop.close()
+        # 合成カタログで構築したパーティション・キューブを破棄する
+        storage_index.clear()
+        storage_facet_index.clear()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, default=100_000, help="合成カタログの件数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+    parser.add_argument("--iterations", type=int, default=30, help="ケースごとの計測回数")
+    parser.add_argument("--warmup", type=int, default=3, help="ケースごとの計測前の実行回数")
+    parser.add_argument(
+        "--tolerance", type=float, default=DEFAULT_TOLERANCE, help="p95の悪化の許容割合"
+    )
+    parser.add_argument("--update-baselines", action="store_true", help="結果を基準値として保存する")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    engine = open_catalog(args.rows, args.seed)
+    print(f"catalog: {args.rows} rows ({time.perf_counter() - started:.1f} s)")
+    try:
+        results = run_benchmarks(
+            engine, args.rows, args.iterations, args.warmup, args.seed
+        )
+    finally:
+        engine.dispose()
+    print(format_table(results))
+
+    key = baseline_key(args.rows)
+    if args.update_baselines:
+        save_baselines(key, results)
+        print(f"baselines updated: {key}")
+        return 0
+
+    baseline = load_baselines().get(key)
+    if baseline is None:
+        print(f"no baselines for {key} (run with --update-baselines to record)")
+        return 0
+    regressions = find_regressions(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"[REGRESSION] {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""
+FastAPIアプリケーション全体の同時実行の負荷試験（イベントループの遅延も計測する）
+
+使用方法:
+    poetry run python -m benchmarks.load \\
+        --rows 100000 --concurrency 1,8,32 --duration 10
+    poetry run python -m benchmarks.load \\
+        --concurrency 16 --no-cache --output load_report.json
+
+app.main:appをASGI経由（httpx.ASGITransport）で同一プロセス内から呼び出すため、サーバーは不要。
+DBは合成カタログ（benchmarks/catalog.py）のSQLiteを非同期ドライバ（aiosqlite）で使用する。
+同時実行数ごとにスループット・レイテンシのパーセンタイルと、イベントループの遅延
+（一定間隔のsleepが予定より遅れた時間）を出力する。ハンドラ内で同期的な処理が
+イベントループを止めている場合は、遅延のp99・最大値が大きくなる。
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+
+from app.db.session import get_async_db, settings
+from app.main import app
+from benchmarks.catalog import catalog_path, open_catalog, storage_data_id
+from benchmarks.report import summarize
+
+# リクエストの種類と比率
+QUERY_MIX = {
+    "search_width": 0.3,
+    "search_inverted": 0.2,
+    "search_range": 0.15,
+    "search_height_only": 0.15,
+    "fetch_ids_100": 0.2,
+}
+
+# イベントループの遅延を計測する間隔（秒）
+LOOP_LAG_INTERVAL_SECONDS = 0.005
+
+
+def build_url(kind: str, rng: random.Random, rows: int) -> str:
+    """リクエストの種類に応じたURLを作成（寸法は0.5cm刻みでばらつかせる）"""
+
+    def dim(center: float) -> float:
+        return center + round(rng.uniform(-5, 5) * 2) / 2
+
+    common = "country_code=jp&storage_category=0"
+    if kind == "search_width":
+        return f"/search_storage?{common}&width={dim(30)}"
+    if kind == "search_inverted":
+        return (
+            f"/search_storage?{common}&width={dim(38)}&depth={dim(30)}"
+            "&enable_inverted_search=true"
+        )
+    if kind == "search_range":
+        lower = dim(25)
+        return (
+            f"/search_storage?{common}&use_width_range=true"
+            f"&width_lower_limit={lower}&width_upper_limit={lower + 15}"
+        )
+    if kind == "search_height_only":
+        return f"/search_storage?{common}&height={dim(24)}"
+    if kind == "fetch_ids_100":
+        ids = ",".join(storage_data_id(rng.randrange(rows)) for _ in range(100))
+        return f"/fetch_storage?id_list={ids}"
+    raise ValueError(f"Unknown request kind: {kind}")
+
+
+class LoopLagMonitor:
+    """一定間隔でsleepし、予定時刻からの遅れをイベントループの遅延として記録する"""
+
+    def __init__(self, interval_seconds: float = LOOP_LAG_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval_seconds
+            await asyncio.sleep(self.interval_seconds)
+            self.samples.append(max(time.perf_counter() - expected, 0.0))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> Dict[str, Any]:
+        """計測を停止して遅延の集計を返す"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        lag = summarize(self.samples, elapsed_seconds=0.0)
+        return {
+            key: lag[key] for key in ("count", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+        }
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    rows: int,
+    concurrency: int,
+    duration_seconds: float,
+    seed: int = 0,
+    query_mix: Optional[Dict[str, float]] = None,
+) -> Dict[str, Any]:
+    """
+    concurrency個のワーカーでduration_seconds秒間リクエストを送り続け、結果を集計する
+    """
+    query_mix = query_mix or QUERY_MIX
+    kinds = list(query_mix)
+    weights = list(query_mix.values())
+    latencies: List[float] = []
+    by_kind: Dict[str, List[float]] = {kind: [] for kind in kinds}
+    statuses: Dict[int, int] = {}
+    deadline = time.perf_counter() + duration_seconds
+
+    async def worker(worker_id: int) -> None:
+        rng = random.Random(seed * 1000 + worker_id)
+        while time.perf_counter() < deadline:
+            kind = rng.choices(kinds, weights=weights)[0]
+            started = time.perf_counter()
+            response = await client.get(build_url(kind, rng, rows))
+            elapsed = time.perf_counter() - started
+            latencies.append(elapsed)
+            by_kind[kind].append(elapsed)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    loop_lag = await monitor.stop()
+
+    return {
+        "concurrency": concurrency,
+        "requests": summarize(latencies, elapsed),
+        "by_kind": {
+            kind: summarize(values, elapsed)
+            for kind, values in by_kind.items()
+            if values
+        },
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "loop_lag": loop_lag,
+    }
+
+
+def use_catalog(engine: AsyncEngine) -> Optional[Callable]:
+    """アプリケーションの読み取り用セッションを合成カタログに切り替える（元の設定を返す）"""
+    session_factory = async_sessionmaker(
+        engine, autoflush=False, expire_on_commit=False
+    )
+
+    async def override_get_async_db():
+        async with session_factory() as db:
+            yield db
+
+    previous = app.dependency_overrides.get(get_async_db)
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    return previous
+
+
+async def run_sweep(
+    path: Path,
+    rows: int,
+    concurrency_levels: Sequence[int],
+    duration_seconds: float,
+    seed: int,
+) -> List[Dict[str, Any]]:
+    """同時実行数ごとに負荷試験を実行する"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    previous_override = use_catalog(engine)
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark"
+        ) as client:
+            # 接続・インデックス・キャッシュの初回構築を計測から除く
+            await client.get(build_url("search_width", random.Random(seed), rows))
+            return [
+                await run_load(client, rows, concurrency, duration_seconds, seed)
+                for concurrency in concurrency_levels
+            ]
+    finally:
+        if previous_override is None:
+            app.dependency_overrides.pop(get_async_db, None)
+        else:
+            app.dependency_overrides[get_async_db] = previous_override
+        await engine.dispose()
+
+
+def format_report(results: List[Dict[str, Any]]) -> str:
+    """同時実行数ごとの結果を表形式の文字列に変換"""
+    header = (
+        f"{'concurrency':>11}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        f"{'lag p99 ms':>12}{'lag max ms':>12}  statuses"
+    )
+    lines = [header, "-" * len(header)]
+    for result in results:
+        r, lag = result["requests"], result["loop_lag"]
+        lines.append(
+            f"{result['concurrency']:>11}{r['throughput_per_sec']:>10.1f}"
+            f"{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}"
+            f"{lag['p99_ms']:>12.3f}{lag['max_ms']:>12.3f}"
+            f"  {result['statuses']}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, default=100_000, help="合成カタログの件数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+    parser.add_argument("--concurrency", default="1,8,32", help="同時実行数（カンマ区切りで複数指定）")
+    parser.add_argument("--duration", type=float, default=10.0, help="同時実行数ごとの実行時間（秒）")
+    parser.add_argument("--no-cache", action="store_true", help="検索結果・データのキャッシュを無効にする")
+    parser.add_argument("--output", type=Path, help="結果をJSONで保存するファイル")
+    args = parser.parse_args(argv)
+
+    if args.no_cache:
+        settings.search_cache_enabled = False
+        settings.item_cache_enabled = False
+    # リクエストごとのログは計測の妨げになるため出力しない
+    logging.getLogger("hakopita_fast_api").setLevel(logging.WARNING)
+
+    concurrency_levels = [
+        int(level) for level in args.concurrency.split(",") if level.strip()
+    ]
+    open_catalog(args.rows, args.seed).dispose()
+    results = asyncio.run(
+        run_sweep(
+            catalog_path(args.rows, args.seed),
+            args.rows,
+            concurrency_levels,
+            args.duration,
+            args.seed,
+        )
+    )
+    print(format_report(results))
+
+    if args.output:
+        report = {
+            "config": {
+                "rows": args.rows,
+                "seed": args.seed,
+                "duration_seconds": args.duration,
+                "cache": not args.no_cache,
+                "query_mix": QUERY_MIX,
+            },
+            "results": results,
+        }
+        args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n")
+        print(f"report written: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
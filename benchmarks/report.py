@@ -0,0 +1,111 @@
+"""
+ベンチマーク結果の集計（パーセンタイル・スループット）と基準値との比較
+"""
+import json
+import math
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+# 基準値の保存先
+BASELINES_PATH = Path(__file__).resolve().parent / "baselines.json"
+
+# 基準値からの悪化をリグレッションとみなす割合（p95がこの割合を超えて遅くなった場合）
+DEFAULT_TOLERANCE = 0.25
+
+# マシンの速度の差を補正するための基準処理のケース名
+CALIBRATION_CASE = "calibration"
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """ソート済みの値のパーセンタイル（nearest-rank法）"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(q / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: Sequence[float], elapsed_seconds: float) -> Dict[str, Any]:
+    """
+    計測したレイテンシ（秒）を集計する
+
+    Returns:
+        件数・p50/p95/p99/最大（ミリ秒）・スループット（1秒あたりの処理数）
+    """
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round((values[-1] if values else 0.0) * 1000, 3),
+        "throughput_per_sec": round(len(values) / elapsed_seconds, 1)
+        if elapsed_seconds > 0
+        else 0.0,
+    }
+
+
+def load_baselines(path: Path = BASELINES_PATH) -> Dict[str, Any]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_baselines(
+    key: str, results: Dict[str, Dict[str, Any]], path: Path = BASELINES_PATH
+) -> None:
+    """結果をkey（カタログの件数など）の基準値として保存する"""
+    baselines = load_baselines(path)
+    baselines[key] = {
+        name: {"p50_ms": r["p50_ms"], "p95_ms": r["p95_ms"]}
+        for name, r in results.items()
+    }
+    path.write_text(
+        json.dumps(baselines, indent=2, ensure_ascii=False, sort_keys=True) + "\n"
+    )
+
+
+def find_regressions(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> List[str]:
+    """
+    基準値よりp95がtoleranceの割合を超えて遅くなったケースの説明のリスト
+
+    結果と基準値の両方にCALIBRATION_CASEがある場合は、基準値をそのp95の比（マシンの速度の比）で
+    補正してから比較する（基準値を記録したマシン以外でも比較できるようにする）。
+    """
+    speed_ratio = 1.0
+    if CALIBRATION_CASE in results and CALIBRATION_CASE in baseline:
+        speed_ratio = results[CALIBRATION_CASE]["p95_ms"] / max(
+            baseline[CALIBRATION_CASE]["p95_ms"], 1e-9
+        )
+
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None or name == CALIBRATION_CASE:
+            continue
+        limit = expected["p95_ms"] * speed_ratio * (1 + tolerance)
+        if result["p95_ms"] > limit:
+            regressions.append(
+                f"{name}: p95 {result['p95_ms']:.3f} ms > {limit:.3f} ms "
+                f"(baseline {expected['p95_ms']:.3f} ms x speed ratio {speed_ratio:.2f}"
+                f" + {tolerance:.0%})"
+            )
+    return regressions
+
+
+def format_table(results: Dict[str, Dict[str, Any]]) -> str:
+    """結果を表形式の文字列に変換"""
+    header = (
+        f"{'case':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        f"{'max ms':>10}{'ops/s':>10}"
+    )
+    lines = [header, "-" * len(header)]
+    for name, r in results.items():
+        lines.append(
+            f"{name:<28}{r['count']:>7}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}"
+            f"{r['p99_ms']:>10.3f}{r['max_ms']:>10.3f}{r['throughput_per_sec']:>10.1f}"
+        )
+    return "\n".join(lines)
@@ -1,6 +1,10 @@
 import os
 import logging
+import random
 from mangum import Mangum
+from app.core.logging import flush_logs
+from app.core.metrics import metrics_registry
+from app.db.session import settings, sql_profiler
 from app.main import app
 
 # ログ設定
@@ -10,9 +14,21 @@ logger.setLevel(logging.INFO)
 # Mangumハンドラーを作成
 handler = Mangum(app, lifespan="off")
 
+
+def should_log_payload() -> bool:
+    """イベント・レスポンス全体をログに出力するか（LOG_PAYLOAD_SAMPLE_RATEの割合でサンプリング）"""
+    rate = settings.log_payload_sample_rate
+    return rate > 0 and random.random() < rate
+
+
 def lambda_handler(event, context):
     """
     AWS Lambda用のハンドラー関数
+
+    リクエストごとのアクセスログはRequestStatsMiddlewareが1行で出力する。
+    イベント・レスポンス全体はサンプリングされた場合とエラー時のみ出力する。
+    /metricsを収集できないため、メトリクスはMETRICS_LOG_INTERVAL_SECONDSごとに、
+    SQLの統計はSQL_PROFILE_LOG_INTERVAL_SECONDSごとにログに出力する。
     
     Args:
         event: API Gatewayからのイベント
@@ -21,23 +37,27 @@ def lambda_handler(event, context):
     Returns:
         API Gatewayレスポンス形式の辞書
     """
-    logger.info(f"Lambda handler called with event: {event}")
-    
+    log_payload = should_log_payload()
+    if log_payload:
+        logger.info(f"Lambda handler called with event: {event}")
+
     # デバッグ情報を追加
-    if 'pathParameters' in event and event['pathParameters']:
-        logger.info(f"Path parameters: {event['pathParameters']}")
-    if 'path' in event:
-        logger.info(f"Request path: {event['path']}")
-    if 'rawPath' in event:
-        logger.info(f"Raw path: {event['rawPath']}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            f"Request path: {event.get('path') or event.get('rawPath')}, "
+            f"path parameters: {event.get('pathParameters')}"
+        )
     
     try:
         # Mangumを使用してFastAPIアプリケーションを実行
         response = handler(event, context)
-        logger.info(f"Lambda handler response: {response}")
+        if response.get("statusCode", 200) >= 500:
+            logger.error(f"Lambda handler error response for event: {event}, response: {response}")
+        elif log_payload:
+            logger.info(f"Lambda handler response: {response}")
         return response
     except Exception as e:
-        logger.error(f"Lambda handler error: {e}")
+        logger.error(f"Lambda handler error: {e}, event: {event}")
         return {
             "statusCode": 500,
             "headers": {
@@ -47,4 +67,11 @@ def lambda_handler(event, context):
                 "Access-Control-Allow-Methods": "GET,POST,PUT,DELETE,OPTIONS"
             },
             "body": '{"error": "Internal server error"}'
-        } 
\ No newline at end of file
+        }
+    finally:
+        if settings.metrics_enabled:
+            metrics_registry.log_snapshot_if_due(settings.metrics_log_interval_seconds)
+        if settings.sql_profiler_enabled:
+            sql_profiler.log_report_if_due(settings.sql_profile_log_interval_seconds)
+        # 実行環境が停止する前に、キューに残っているログを出力する
+        flush_logs() 
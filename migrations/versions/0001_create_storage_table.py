@@ -0,0 +1,72 @@
+"""storage_tableを作成
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00.000000
+
+既存のDBに対しては`alembic stamp 0001`で適用済みとして記録する。
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 単一列インデックスを持つ列
+INDEXED_COLUMNS = (
+    "storage_data_id",
+    "storage_category",
+    "shop_id",
+    "item_id",
+    "country_code",
+    "active",
+    "height",
+    "width",
+    "depth",
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "storage_table",
+        sa.Column("storage_data_id", sa.String(length=255), nullable=False),
+        sa.Column("storage_category", sa.Integer(), nullable=False),
+        sa.Column("shop_id", sa.Integer(), nullable=False),
+        sa.Column("item_id", sa.String(length=255), nullable=False),
+        sa.Column("item_title", sa.Text(), nullable=False),
+        sa.Column("item_url", sa.Text(), nullable=False),
+        sa.Column("primary_image_url", sa.Text(), nullable=False),
+        sa.Column("image_url_list", sa.Text(), nullable=False),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("ean", sa.String(length=256), nullable=True),
+        sa.Column("country_code", sa.String(length=256), nullable=False),
+        sa.Column("active", sa.Boolean(), nullable=False),
+        sa.Column("height", sa.Float(), nullable=False),
+        sa.Column("width", sa.Float(), nullable=False),
+        sa.Column("depth", sa.Float(), nullable=False),
+        sa.Column("colors", sa.Text(), nullable=False),
+        sa.Column("materials", sa.Text(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.Column("seller_name", sa.String(length=256), nullable=True),
+        sa.Column("box_likelihood", sa.Float(), nullable=True),
+        sa.Column("box_features", sa.Text(), nullable=True),
+        sa.Column("shelf_likelihood", sa.Float(), nullable=True),
+        sa.Column("shelf_features", sa.Text(), nullable=True),
+        sa.Column("shelf_genres", sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint("storage_data_id"),
+    )
+    for column in INDEXED_COLUMNS:
+        op.create_index(f"ix_storage_table_{column}", "storage_table", [column])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for column in INDEXED_COLUMNS:
+        op.drop_index(f"ix_storage_table_{column}", table_name="storage_table")
+    op.drop_table("storage_table")
@@ -0,0 +1,56 @@
+"""検索条件に合わせた複合インデックスを追加
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00.000000
+
+search_by_paramsの等価条件（country_code, storage_category, active）を先頭に、
+範囲条件となる寸法を続けた複合インデックス。
+幅・奥行き・高さのどれが指定されても1つのインデックスの範囲スキャンで絞り込める。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_INDEXES = {
+    "ix_storage_search_width": [
+        "country_code",
+        "storage_category",
+        "active",
+        "width",
+        "depth",
+        "height",
+    ],
+    "ix_storage_search_depth": [
+        "country_code",
+        "storage_category",
+        "active",
+        "depth",
+        "width",
+        "height",
+    ],
+    "ix_storage_search_height": [
+        "country_code",
+        "storage_category",
+        "active",
+        "height",
+    ],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, columns in SEARCH_INDEXES.items():
+        op.create_index(name, "storage_table", columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in SEARCH_INDEXES:
+        op.drop_index(name, table_name="storage_table")
@@ -0,0 +1,61 @@
+"""向きに依存しない寸法列（dim_short, dim_long）とインデックスを追加
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00.000000
+
+dim_short = min(width, depth)、dim_long = max(width, depth)をDB側の生成列として持たせ、
+反転検索を単一の複合インデックスの範囲スキャンで処理できるようにする。
+生成列のため、既存データも含めてDBが値を計算・維持する。
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DIM_SHORT_EXPRESSION = "CASE WHEN width <= depth THEN width ELSE depth END"
+DIM_LONG_EXPRESSION = "CASE WHEN width <= depth THEN depth ELSE width END"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # SQLiteはSTORED生成列をALTER TABLEで追加できないため、batchモード（テーブル再作成）で追加する
+    with op.batch_alter_table("storage_table") as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                "dim_short",
+                sa.Float(),
+                sa.Computed(DIM_SHORT_EXPRESSION, persisted=True),
+            )
+        )
+        batch_op.add_column(
+            sa.Column(
+                "dim_long", sa.Float(), sa.Computed(DIM_LONG_EXPRESSION, persisted=True)
+            )
+        )
+    op.create_index(
+        "ix_storage_search_canonical",
+        "storage_table",
+        [
+            "country_code",
+            "storage_category",
+            "active",
+            "dim_short",
+            "dim_long",
+            "height",
+        ],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_storage_search_canonical", table_name="storage_table")
+    with op.batch_alter_table("storage_table") as batch_op:
+        batch_op.drop_column("dim_long")
+        batch_op.drop_column("dim_short")
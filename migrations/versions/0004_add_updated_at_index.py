@@ -0,0 +1,28 @@
+"""updated_atにインデックスを追加
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:00.000000
+
+検索結果キャッシュの無効化判定で定期的に実行するMAX(updated_at)を、
+テーブル走査ではなくインデックスの参照で取得できるようにする。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_storage_table_updated_at", "storage_table", ["updated_at"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_storage_table_updated_at", table_name="storage_table")
@@ -0,0 +1,66 @@
+"""
+検索条件の各パターンが複合インデックス（ix_storage_search_*）を使用しているかをEXPLAINで確認する
+
+使用方法:
+    ENV=dev poetry run python -m scripts.explain_search_indexes
+
+いずれかのパターンで複合インデックスが使われていない場合は終了コード1で終了する。
+"""
+import sys
+
+from sqlalchemy import text
+
+from app.crud.storage_crud import StorageDataCRUD
+from app.db.session import SessionLocal
+from app.schemas.storage_schemas import SearchStorageRequest
+
+# 確認する検索条件のパターン
+SEARCH_VARIANTS = {
+    "width": dict(width=30),
+    "depth": dict(depth=30),
+    "height": dict(height=30),
+    "width_depth_height": dict(width=30, depth=40, height=20),
+    "width_range": dict(
+        use_width_range=True, width_lower_limit=20, width_upper_limit=40
+    ),
+    "inverted_width": dict(width=30, enable_inverted_search=True),
+    "inverted_width_depth": dict(width=30, depth=40, enable_inverted_search=True),
+}
+
+SEARCH_INDEX_PREFIX = "ix_storage_search_"
+
+
+def explain(db, params: SearchStorageRequest) -> str:
+    """検索クエリのEXPLAIN結果から使用されるインデックス名を取得する"""
+    query = StorageDataCRUD(db).build_search_query(params)
+    sql = str(
+        query.statement.compile(
+            dialect=db.bind.dialect, compile_kwargs={"literal_binds": True}
+        )
+    )
+    if db.bind.dialect.name == "sqlite":
+        rows = db.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+        return " / ".join(row[-1] for row in rows)
+    rows = db.execute(text(f"EXPLAIN {sql}")).mappings().all()
+    return " / ".join(str(row["key"]) for row in rows)
+
+
+def main() -> int:
+    db = SessionLocal()
+    failed = False
+    try:
+        for name, variant in SEARCH_VARIANTS.items():
+            params = SearchStorageRequest(
+                country_code="jp", storage_category=0, **variant
+            )
+            plan = explain(db, params)
+            uses_index = SEARCH_INDEX_PREFIX in plan
+            failed = failed or not uses_index
+            print(f"[{'OK' if uses_index else 'NG'}] {name}: {plan}")
+    finally:
+        db.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
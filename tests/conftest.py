@@ -1,28 +1,35 @@
 import os
 import pytest
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from app.models.storage_model import Base, StorageData
 import logging
 from app.core.logging import setup_logging
 from fastapi.testclient import TestClient
-from app.db.session import get_db
+from app.db.session import get_async_db, get_db
+from app.core.cache import data_watermark, search_response_cache
+from app.core.metrics import metrics_registry
+from app.crud.storage_facets import storage_facet_index
+from app.crud.storage_index import storage_index
+from app.crud.storage_item_cache import storage_item_cache
 from app.main import app
 
 # ログ設定をセットアップ
 setup_logging("DEBUG")
 logger = logging.getLogger(__name__)
 
+# テスト用データベースファイルのパス
+TEST_DB_PATH = "./test.db"
+
 
 @pytest.fixture(scope="session")
 def test_engine():
     """テスト用SQLiteエンジンを作成"""
-    # テスト用データベースファイルのパス
-    test_db_path = "./test.db"
-    
     # SQLite用のエンジンを作成
     engine = create_engine(
-        f"sqlite:///{test_db_path}",
+        f"sqlite:///{TEST_DB_PATH}",
         connect_args={"check_same_thread": False}
     )
     
@@ -34,8 +41,8 @@ def test_engine():
     engine.dispose() 
        
     # SQLiteファイル自体を削除
-    if os.path.exists(test_db_path):
-        os.remove(test_db_path)
+    if os.path.exists(TEST_DB_PATH):
+        os.remove(TEST_DB_PATH)
 
 
 @pytest.fixture(scope="session")
@@ -45,7 +52,16 @@ def test_session_factory(test_engine):
 
 
 @pytest.fixture(scope="session")
-def test_client(test_engine):
+def test_async_engine(test_engine):
+    """テスト用の非同期SQLiteエンジン（aiosqlite）を作成（同期エンジンと同じDBファイルを使用）"""
+    # TestClientはリクエストごとにイベントループが異なるため、接続をプールしない
+    engine = create_async_engine(f"sqlite+aiosqlite:///{TEST_DB_PATH}", poolclass=NullPool)
+    yield engine
+    engine.sync_engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def test_client(test_engine, test_async_engine):
     """テスト用クライアントを作成"""
 
     # テスト用セッションファクトリを作成
@@ -63,8 +79,18 @@ def test_client(test_engine):
         finally:
             db.close()
     
+    TestingAsyncSessionLocal = async_sessionmaker(
+        test_async_engine, autoflush=False, expire_on_commit=False
+    )
+
+    async def override_get_async_db():
+        """テスト用の非同期データベースセッションを取得"""
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+    
     # データベースの依存関係をオーバーライド
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
     
     # テストクライアントを作成
     client = TestClient(app)
@@ -75,6 +101,37 @@ def test_client(test_engine):
     app.dependency_overrides.clear()
 
 
+@pytest.fixture
+def app_caplog(caplog):
+    """
+    アプリケーションのロガー（hakopita_fast_api）のログをcaplogで取得する
+
+    キュー経由の出力ではルートロガーへ伝播させないため、caplogのハンドラーを直接追加する。
+    """
+    app_logger = logging.getLogger("hakopita_fast_api")
+    app_logger.addHandler(caplog.handler)
+    yield caplog
+    app_logger.removeHandler(caplog.handler)
+
+
+@pytest.fixture(autouse=True)
+def reset_in_memory_state():
+    """テストごとにインメモリのインデックス・キャッシュ・メトリクスを破棄する"""
+    storage_index.clear()
+    storage_facet_index.clear()
+    search_response_cache.clear()
+    storage_item_cache.clear()
+    data_watermark.reset()
+    metrics_registry.reset()
+    yield
+    storage_index.clear()
+    storage_facet_index.clear()
+    search_response_cache.clear()
+    storage_item_cache.clear()
+    data_watermark.reset()
+    metrics_registry.reset()
+
+
 @pytest.fixture(scope="function")
 def setup_database(test_engine):
     """テスト用データベースをセットアップ"""
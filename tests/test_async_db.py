@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+
+import httpx
+import pytest
+
+from app.core.logging import setup_logging
+from app.main import app
+
+# ログ設定をセットアップ
+setup_logging("DEBUG")
+logger = logging.getLogger(__name__)
+
+# DBをロックしておく時間（秒）
+LOCK_SECONDS = 0.5
+
+
+def hold_exclusive_lock(db_path: str, locked: threading.Event, seconds: float):
+    """別スレッドからDBを排他ロックし、その間の読み取りを待たせる"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("BEGIN EXCLUSIVE")
+        locked.set()
+        time.sleep(seconds)
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """イベントループが止まっていた最大時間（秒）を計測"""
+    max_lag = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        max_lag = max(max_lag, time.perf_counter() - started - interval)
+    return max_lag
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "url",
+    [
+        "/search_storage?width=20&storage_category=0&country_code=jp",
+        "/fetch_storage?id_list=test_1,test_2",
+    ],
+)
+async def test_slow_query_does_not_block_event_loop(
+    setup_database, test_client, test_engine, url
+):
+    """DBの応答待ちの間もイベントループが止まらないことを確認"""
+    locked = threading.Event()
+    locker = threading.Thread(
+        target=hold_exclusive_lock,
+        args=(test_engine.url.database, locked, LOCK_SECONDS),
+    )
+    locker.start()
+    assert locked.wait(timeout=5)
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
+            started = time.perf_counter()
+            response = await client.get(url)
+            elapsed = time.perf_counter() - started
+    finally:
+        stop.set()
+        max_lag = await lag_task
+        locker.join()
+
+    logger.info(f"elapsed={elapsed:.3f}s, max event loop lag={max_lag:.3f}s")
+    assert response.status_code == 200
+    # リクエストはロックの解放を待っていた
+    assert elapsed >= LOCK_SECONDS * 0.8
+    # その間もイベントループは他の処理を実行できた
+    assert max_lag < LOCK_SECONDS / 2
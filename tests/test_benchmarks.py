@@ -0,0 +1,75 @@
+import logging
+
+from app.core.logging import setup_logging
+from benchmarks.catalog import COUNTRY_WEIGHTS, generate_rows, open_catalog
+from benchmarks.hot_paths import run_benchmarks
+from benchmarks.report import CALIBRATION_CASE, find_regressions, percentile, summarize
+
+# ログ設定をセットアップ
+setup_logging("DEBUG")
+logger = logging.getLogger(__name__)
+
+
+def test_generate_rows_is_reproducible():
+    """同じシードからは同じ合成データが生成されることを確認"""
+    first = list(generate_rows(50, seed=1))
+    second = list(generate_rows(50, seed=1))
+
+    assert first == second
+    assert {row["country_code"] for row in first} <= set(COUNTRY_WEIGHTS)
+    assert all(5.0 <= row["width"] <= 200.0 for row in first)
+
+
+def test_summarize_percentiles():
+    """p50/p95/p99とスループットの集計を確認"""
+    latencies = [i / 1000 for i in range(1, 101)]
+
+    summary = summarize(latencies, elapsed_seconds=2.0)
+
+    assert percentile(sorted(latencies), 50) == 0.05
+    assert (summary["p50_ms"], summary["p95_ms"], summary["p99_ms"]) == (
+        50.0,
+        95.0,
+        99.0,
+    )
+    assert summary["throughput_per_sec"] == 50.0
+
+
+def test_run_benchmarks_on_small_catalog(tmp_path):
+    """小さな合成カタログで全ケースが実行でき、基準値との比較でリグレッションを検出できることを確認"""
+    engine = open_catalog(300, seed=0, path=tmp_path / "catalog.db")
+    try:
+        results = run_benchmarks(engine, rows=300, iterations=2, warmup=0)
+    finally:
+        engine.dispose()
+    logger.info(f"Benchmark results: {results}")
+
+    assert {"search_inverted", "search_height_only", "fetch_ids_1000"} <= set(results)
+    assert {"index_search_width", "index_nearest", "index_fits", "facets_range"} <= set(
+        results
+    )
+    assert {"async_search_width", "async_index_search_width", CALIBRATION_CASE} <= set(
+        results
+    )
+    assert all(result["count"] == 2 for result in results.values())
+
+    baseline = {
+        name: {"p95_ms": result["p95_ms"] / 10}
+        for name, result in results.items()
+        if name != CALIBRATION_CASE
+    }
+    assert len(find_regressions(results, baseline)) == len(results) - 1
+    assert find_regressions(results, {}) == []
+
+
+def test_find_regressions_normalizes_by_calibration():
+    """基準処理の速度の比で補正して比較することを確認"""
+    baseline = {CALIBRATION_CASE: {"p95_ms": 10.0}, "search": {"p95_ms": 5.0}}
+
+    # マシン全体が2倍遅い場合はリグレッションとしない
+    slower_host = {CALIBRATION_CASE: {"p95_ms": 20.0}, "search": {"p95_ms": 10.0}}
+    assert find_regressions(slower_host, baseline) == []
+
+    # 基準処理の速度が同じでケースのみ遅くなった場合はリグレッション
+    regressed = {CALIBRATION_CASE: {"p95_ms": 10.0}, "search": {"p95_ms": 10.0}}
+    assert len(find_regressions(regressed, baseline)) == 1
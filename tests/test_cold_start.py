@@ -0,0 +1,84 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from app.core.logging import setup_logging
+
+# ログ設定をセットアップ
+setup_logging("DEBUG")
+logger = logging.getLogger(__name__)
+
+# Lambdaのコールドスタートの予算（秒）
+IMPORT_BUDGET_SECONDS = 2.0
+FIRST_REQUEST_BUDGET_SECONDS = 0.5
+
+# コールドスタート時に読み込まれてはいけないモジュール（初回使用時まで遅延させる）
+DEFERRED_MODULES = ["numpy", "pymysql", "aiomysql", "alembic"]
+
+# 新しいプロセスでlambda_handlerを読み込み、DBを使わないリクエストを1回処理する
+COLD_START_SCRIPT = """
+import json
+import sys
+import time
+
+started = time.perf_counter()
+import lambda_handler
+imported = time.perf_counter()
+
+event = {
+    "resource": "/health",
+    "path": "/health",
+    "httpMethod": "GET",
+    "headers": {"Host": "example.com"},
+    "multiValueHeaders": {"Host": ["example.com"]},
+    "queryStringParameters": None,
+    "multiValueQueryStringParameters": None,
+    "requestContext": {
+        "resourcePath": "/health",
+        "httpMethod": "GET",
+        "path": "/health",
+    },
+    "body": None,
+    "isBase64Encoded": False,
+}
+response = lambda_handler.lambda_handler(event, None)
+finished = time.perf_counter()
+
+from app.db import session
+print(json.dumps({
+    "import_seconds": imported - started,
+    "first_request_seconds": finished - imported,
+    "status_code": response["statusCode"],
+    "loaded_modules": [name for name in %r if name in sys.modules],
+    "engine_created": session.get_engine.cache_info().currsize > 0,
+    "read_router_created": session.get_read_router.cache_info().currsize > 0,
+}))
+"""
+
+
+def test_cold_start_budget():
+    """コールドスタート（lambda_handlerの読み込みと最初のリクエスト）が予算内であることを確認"""
+    env = {k: v for k, v in os.environ.items() if k != "PYTEST_CURRENT_TEST"}
+    env["ENV"] = "cold_start_test"  # .envファイルを読み込まない
+    result = subprocess.run(
+        [sys.executable, "-c", COLD_START_SCRIPT % (DEFERRED_MODULES,)],
+        cwd=Path(__file__).resolve().parents[1],
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+    logger.info(f"Cold start: {measured}")
+
+    assert measured["status_code"] == 200
+    # DBを使わないリクエストではエンジンを作成せず、重いモジュールも読み込まない
+    assert measured["loaded_modules"] == []
+    assert not measured["engine_created"]
+    assert not measured["read_router_created"]
+    assert measured["import_seconds"] < IMPORT_BUDGET_SECONDS
+    assert measured["first_request_seconds"] < FIRST_REQUEST_BUDGET_SECONDS
@@ -1,5 +1,8 @@
 import logging
+from sqlalchemy import event
+from app.core.cache import data_watermark
 from app.core.logging import setup_logging
+from app.models.storage_model import StorageData
 
 # ログ設定をセットアップ（DEBUGレベルで）
 setup_logging("DEBUG")
@@ -194,3 +197,68 @@ def test_fetch_storage_active_false_only(setup_database_with_active_data, test_c
     
     logger.info(f"Active=False only response: {data}")
     logger.info("=== Fetch_storage active=False only test completed ===")
+
+
+def test_fetch_storage_keeps_requested_order(setup_database, test_client):
+    """指定したIDの順序で返され、重複したIDは1件にまとめられることを確認"""
+    test_ids = ["test_3", "test_1", "invalid_id", "test_2", "test_1"]
+
+    # 一部をキャッシュに載せた状態でも順序が保たれることを確認
+    test_client.get("/fetch_storage?id_list=test_2")
+    response = test_client.get(f"/fetch_storage?id_list={','.join(test_ids)}")
+
+    assert response.status_code == 200
+    returned_ids = [item["storage_data_id"] for item in response.json()["data"]]
+    assert returned_ids == ["test_3", "test_1", "test_2"]
+
+
+def test_fetch_storage_queries_only_cache_misses(setup_database, test_client, test_async_engine):
+    """キャッシュ済みのIDはDBから再取得せず、ミスしたIDのみを1回のクエリで取得することを確認"""
+    test_client.get("/fetch_storage?id_list=test_1,test_2")
+
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(test_async_engine.sync_engine, "before_cursor_execute", record_statement)
+    try:
+        response = test_client.get("/fetch_storage?id_list=test_1,test_2,test_3,test_4")
+    finally:
+        event.remove(test_async_engine.sync_engine, "before_cursor_execute", record_statement)
+
+    assert response.status_code == 200
+    assert len(response.json()["data"]) == 4
+
+    # 全列を取得するクエリはミスした2件分の1回のみ
+    row_queries = [(s, p) for s, p in statements if "image_url_list" in s]
+    assert len(row_queries) == 1
+    assert set(row_queries[0][1]) == {"test_3", "test_4"}
+
+    stats = test_client.get("/cache_stats").json()["fetch_storage"]
+    assert stats["hits"] == 2
+    assert stats["entries"] == 4
+
+
+def test_fetch_storage_cache_revalidates_updated_items(
+    setup_database, test_client, test_session_factory, monkeypatch
+):
+    """データ更新後は更新されたデータのみ再取得され、削除されたデータは返されないことを確認"""
+    monkeypatch.setattr(data_watermark, "poll_interval_seconds", 0.0)
+    test_client.get("/fetch_storage?id_list=test_1,test_2,test_3")
+
+    db = test_session_factory()
+    try:
+        item = db.get(StorageData, "test_1")
+        item.item_title = "updated_title"
+        db.delete(db.get(StorageData, "test_2"))
+        db.commit()
+    finally:
+        db.close()
+
+    response = test_client.get("/fetch_storage?id_list=test_1,test_2,test_3")
+
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert [item["storage_data_id"] for item in data] == ["test_1", "test_3"]
+    assert data[0]["item_title"] == "updated_title"
@@ -0,0 +1,174 @@
+import base64
+import gzip
+import json
+import logging
+
+from sqlalchemy.orm import sessionmaker
+
+import lambda_handler
+from app.core import http_cache
+from app.core.cache import data_watermark
+from app.core.http_cache import accepts_gzip, etag_matches
+from app.core.logging import setup_logging
+from app.db.session import settings
+from app.models.storage_model import StorageData
+
+# ログ設定をセットアップ
+setup_logging("DEBUG")
+logger = logging.getLogger(__name__)
+
+SEARCH_URL = "/search_storage?width=20&storage_category=0&country_code=jp"
+FETCH_URL = (
+    "/fetch_storage?id_list=width_20_depth_30_height_25,width_30_depth_20_height_25"
+)
+
+
+def test_accept_encoding_and_if_none_match_parsing():
+    """Accept-Encodingのq値とIf-None-Matchの複数指定・弱いETagの解釈を確認"""
+    assert accepts_gzip("gzip, deflate, br")
+    assert accepts_gzip("br;q=1.0, *;q=0.5")
+    assert not accepts_gzip("gzip;q=0, *")
+    assert not accepts_gzip("identity")
+    assert not accepts_gzip(None)
+
+    assert etag_matches('"a", W/"b"', '"b"')
+    assert etag_matches('"b-gzip"', '"b"')
+    assert etag_matches("*", '"b"')
+    assert not etag_matches('"a"', '"b"')
+
+
+def test_search_etag_not_modified(setup_inverted_search_database, test_client):
+    """ETag・Cache-Controlが付き、If-None-Matchが一致すれば本文なしの304になることを確認"""
+    first = test_client.get(SEARCH_URL, headers={"Accept-Encoding": "identity"})
+    etag = first.headers["etag"]
+    logger.info(f"Search response headers: {dict(first.headers)}")
+
+    assert first.status_code == 200
+    assert (
+        first.headers["cache-control"]
+        == f"public, max-age={settings.http_cache_max_age_seconds}"
+    )
+    # 同じ検索条件（正規化後）は同じETagになる
+    assert (
+        test_client.get(SEARCH_URL.replace("width=20", "width=20.0"))
+        .headers["etag"]
+        .startswith(etag[:-1])
+    )
+
+    not_modified = test_client.get(SEARCH_URL, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+
+
+def test_search_etag_changes_with_data(
+    setup_inverted_search_database, test_client, test_engine, monkeypatch
+):
+    """データが更新されると透かし値が変わり、以前のETagでは304にならないことを確認"""
+    monkeypatch.setattr(data_watermark, "poll_interval_seconds", 0.0)
+    etag = test_client.get(SEARCH_URL).headers["etag"]
+
+    db = sessionmaker(bind=test_engine)()
+    try:
+        db.query(StorageData).filter(
+            StorageData.storage_data_id == "width_20_depth_30_height_30"
+        ).delete()
+        db.commit()
+    finally:
+        db.close()
+
+    response = test_client.get(SEARCH_URL, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_search_gzip_reuses_cached_bytes(
+    setup_inverted_search_database, test_client, monkeypatch
+):
+    """gzipを許可した場合は圧縮して返し、キャッシュのヒット時は圧縮済みのバイト列を再利用することを確認"""
+    monkeypatch.setattr(settings, "gzip_min_bytes", 0)
+    compress_calls = []
+    original_compress = http_cache.gzip.compress
+    monkeypatch.setattr(
+        http_cache.gzip,
+        "compress",
+        lambda *args, **kwargs: compress_calls.append(1)
+        or original_compress(*args, **kwargs),
+    )
+
+    identity = test_client.get(SEARCH_URL, headers={"Accept-Encoding": "identity"})
+    first = test_client.get(SEARCH_URL, headers={"Accept-Encoding": "gzip"})
+    second = test_client.get(SEARCH_URL, headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in identity.headers
+    assert first.headers["content-encoding"] == "gzip"
+    assert first.headers["vary"] == "Accept-Encoding"
+    assert first.headers["etag"] == identity.headers["etag"][:-1] + '-gzip"'
+    assert first.json() == second.json() == identity.json()
+    assert len(compress_calls) == 1
+
+
+def test_fetch_etag_not_modified(setup_inverted_search_database, test_client):
+    """fetch_storageでもIDリストと透かし値によるETagで304になることを確認"""
+    first = test_client.get(FETCH_URL)
+    reordered = test_client.get(
+        "/fetch_storage?id_list=width_30_depth_20_height_25,width_20_depth_30_height_25"
+    )
+
+    assert first.status_code == 200
+    assert reordered.headers["etag"] != first.headers["etag"]
+    assert (
+        test_client.get(
+            FETCH_URL, headers={"If-None-Match": first.headers["etag"]}
+        ).status_code
+        == 304
+    )
+
+
+def search_event(headers):
+    """API Gatewayからの/search_storageのイベント"""
+    query = {"width": "20", "storage_category": "0", "country_code": "jp"}
+    return {
+        "resource": "/search_storage",
+        "path": "/search_storage",
+        "httpMethod": "GET",
+        "headers": {"Host": "example.com", **headers},
+        "multiValueHeaders": {
+            "Host": ["example.com"],
+            **{k: [v] for k, v in headers.items()},
+        },
+        "queryStringParameters": query,
+        "multiValueQueryStringParameters": {k: [v] for k, v in query.items()},
+        "requestContext": {
+            "resourcePath": "/search_storage",
+            "httpMethod": "GET",
+            "path": "/search_storage",
+        },
+        "body": None,
+        "isBase64Encoded": False,
+    }
+
+
+def test_lambda_gzip_and_not_modified(
+    setup_inverted_search_database, test_client, monkeypatch
+):
+    """Mangum経由でもgzipの本文がbase64で返され、If-None-Matchで304になることを確認"""
+    monkeypatch.setattr(settings, "gzip_min_bytes", 0)
+
+    response = lambda_handler.lambda_handler(
+        search_event({"Accept-Encoding": "gzip"}), None
+    )
+    headers = response["headers"]
+    logger.info(f"Lambda response headers: {headers}")
+
+    assert response["statusCode"] == 200
+    assert response["isBase64Encoded"] is True
+    assert headers["content-encoding"] == "gzip"
+    body = json.loads(gzip.decompress(base64.b64decode(response["body"])))
+    assert body["total_items"] == 2
+
+    not_modified = lambda_handler.lambda_handler(
+        search_event({"If-None-Match": headers["etag"]}), None
+    )
+    assert not_modified["statusCode"] == 304
+    assert not_modified["body"] == ""
@@ -0,0 +1,84 @@
+import logging
+
+import pytest
+
+from app.core import json_codec
+from app.core.json_codec import RawJSON
+from app.core.logging import setup_logging
+from app.crud.storage_crud import FETCH_RESPONSE_COLUMNS, StorageDataCRUD
+from app.models.storage_model import StorageData
+from app.schemas.storage_schemas import StorageDataResponse
+
+# ログ設定をセットアップ
+setup_logging("DEBUG")
+logger = logging.getLogger(__name__)
+
+
+def test_model_json_columns_are_decoded(setup_database, test_session_factory):
+    """モデルの属性としてのJSON列は取得時にデコードされることを確認"""
+    db = test_session_factory()
+    try:
+        item = db.get(StorageData, "test_1")
+
+        assert item.colors == [0, 1, 2]
+        assert item.image_url_list == ["https://example.com/item_1.jpg"]
+        assert item.to_dict()["materials"] == [0, 1, 2]
+    finally:
+        db.close()
+
+
+def test_response_columns_are_decoded_lazily(setup_database, test_session_factory):
+    """レスポンス用の列の読み取りではJSON列はデコードされず、スキーマへの変換時にデコードされることを確認"""
+    db = test_session_factory()
+    try:
+        row = StorageDataCRUD(db).get_by_ids(
+            ["test_1"], columns=FETCH_RESPONSE_COLUMNS
+        )[0]
+
+        assert isinstance(row.colors, RawJSON)
+        assert isinstance(row.image_url_list, RawJSON)
+
+        converted = StorageDataResponse.model_validate(row)
+        assert converted.colors == [0, 1, 2]
+        assert converted.image_url_list == ["https://example.com/item_1.jpg"]
+    finally:
+        db.close()
+
+
+def test_raw_json_is_saved_without_reencoding(setup_database, test_session_factory):
+    """RawJSONを保存した場合は再エンコードせずにそのまま保存されることを確認"""
+    db = test_session_factory()
+    try:
+        source = db.get(StorageData, "test_1")
+        copied = StorageData(
+            **{
+                column.name: getattr(source, column.name)
+                for column in StorageData.__table__.columns
+                if column.computed is None
+            }
+        )
+        copied.storage_data_id = "test_1_copy"
+        copied.colors = RawJSON("[0, 1, 2]")
+        db.add(copied)
+        db.commit()
+        db.expire_all()
+
+        reloaded = db.get(StorageData, "test_1_copy")
+        assert reloaded.colors == [0, 1, 2]
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_json_codec_round_trip(use_orjson, monkeypatch):
+    """orjsonの有無にかかわらず同じ値にエンコード・デコードできることを確認"""
+    if not use_orjson:
+        monkeypatch.setattr(json_codec, "orjson", None)
+    elif json_codec.orjson is None:
+        pytest.skip("orjson is not installed")
+
+    value = [1, 2, 3]
+    encoded = json_codec.dumps(value)
+
+    assert encoded == "[1,2,3]"
+    assert json_codec.decode_raw_json(RawJSON(encoded)) == value
@@ -0,0 +1,44 @@
+import asyncio
+import logging
+import time
+
+import pytest
+
+from app.core.logging import setup_logging
+from benchmarks.catalog import open_catalog
+from benchmarks.load import LoopLagMonitor, format_report, run_sweep
+
+# ログ設定をセットアップ
+setup_logging("DEBUG")
+logger = logging.getLogger(__name__)
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor_detects_blocking_call():
+    """イベントループを同期的に止める処理があると、ループの遅延として記録されることを確認"""
+    monitor = LoopLagMonitor(interval_seconds=0.005)
+    monitor.start()
+    await asyncio.sleep(0.02)
+    time.sleep(0.1)  # イベントループを止める
+    await asyncio.sleep(0.02)
+    lag = await monitor.stop()
+
+    assert lag["max_ms"] >= 80
+
+
+@pytest.mark.asyncio
+async def test_run_sweep_on_small_catalog(tmp_path):
+    """小さな合成カタログに対して同時実行数ごとの負荷試験が実行できることを確認"""
+    path = tmp_path / "catalog.db"
+    open_catalog(200, seed=0, path=path).dispose()
+
+    results = await run_sweep(
+        path, rows=200, concurrency_levels=[1, 4], duration_seconds=0.2, seed=0
+    )
+    logger.info("\n" + format_report(results))
+
+    assert [result["concurrency"] for result in results] == [1, 4]
+    for result in results:
+        assert result["requests"]["count"] > 0
+        assert set(result["statuses"]) == {"200"}
+        assert result["loop_lag"]["count"] > 0
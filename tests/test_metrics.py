@@ -0,0 +1,113 @@
+import json
+import logging
+
+from app.core.logging import setup_logging
+from app.core.metrics import Histogram, MetricsRegistry
+from app.core.request_log import RequestStats
+from app.models.storage_model import StorageData
+
+# ログ設定をセットアップ
+setup_logging("DEBUG")
+logger = logging.getLogger(__name__)
+
+
+def parse_metrics(text: str) -> dict:
+    """Prometheusのテキスト形式を{メトリクス名とラベル: 値}の辞書に変換"""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_histogram_buckets_are_cumulative():
+    """ヒストグラムのバケットが上限以下の件数の累積になることを確認"""
+    histogram = Histogram([0.1, 1.0])
+    for value in [0.05, 0.1, 0.5, 2.0]:
+        histogram.observe(value)
+
+    assert histogram.cumulative_counts() == [("0.1", 2), ("1", 3), ("+Inf", 4)]
+    assert histogram.count == 4
+    assert histogram.sum == 2.65
+
+
+def test_metrics_endpoint(setup_inverted_search_database, test_client):
+    """検索・取得後の/metricsにルートごとのリクエスト数・件数・処理時間・キャッシュヒット率が含まれることを確認"""
+    url = "/search_storage?width=20&storage_category=0&country_code=jp"
+    first = test_client.get(url)
+    test_client.get(url)
+    test_client.get("/fetch_storage?id_list=width_20_depth_30_height_25")
+    test_client.get("/no_such_route")
+
+    response = test_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    samples = parse_metrics(response.text)
+    logger.info(f"Metrics: {samples}")
+
+    rows = len(first.json()["data"])
+    assert (
+        samples[
+            'hakopita_requests_total{route="/search_storage",method="GET",status="200"}'
+        ]
+        == 2
+    )
+    assert (
+        samples['hakopita_requests_total{route="unmatched",method="GET",status="404"}']
+        == 1
+    )
+    # 2回目はキャッシュから返すため、DBから取得した件数は1回分のみ
+    assert samples['hakopita_rows_fetched_total{route="/search_storage"}'] == rows
+    assert samples['hakopita_conversion_errors_total{route="/search_storage"}'] == 0
+    assert (
+        samples['hakopita_request_duration_seconds_count{route="/search_storage"}'] == 2
+    )
+    route = 'route="/search_storage"'
+    assert (
+        samples[f'hakopita_request_duration_seconds_bucket{{{route},le="+Inf"}}'] == 2
+    )
+    assert samples['hakopita_db_duration_seconds_sum{route="/search_storage"}'] > 0
+    assert samples['hakopita_rows_returned_sum{route="/search_storage"}'] == rows * 2
+    assert samples['hakopita_rows_fetched_total{route="/fetch_storage"}'] == 1
+    assert samples['hakopita_cache_hit_rate{cache="search_storage"}'] == 0.5
+
+
+def test_metrics_count_conversion_errors(
+    setup_inverted_search_database, test_client, test_session_factory
+):
+    """スキーマに変換できずスキップしたデータの件数が記録されることを確認"""
+    db = test_session_factory()
+    try:
+        item = db.get(StorageData, "width_20_depth_30_height_25")
+        item.colors = ["red"]  # List[int]に変換できない
+        db.commit()
+    finally:
+        db.close()
+
+    test_client.get("/search_storage?width=20&storage_category=0&country_code=jp")
+
+    samples = parse_metrics(test_client.get("/metrics").text)
+    assert samples['hakopita_conversion_errors_total{route="/search_storage"}'] == 1
+
+
+def test_metrics_snapshot_logged_at_interval(app_caplog):
+    """Lambda向けのメトリクスのログ出力が一定間隔でのみ行われることを確認"""
+    registry = MetricsRegistry()
+    registry.record_request(
+        "/search_storage",
+        RequestStats(route="/search_storage", status=200, row_count=3),
+    )
+
+    with app_caplog.at_level(logging.INFO, logger="hakopita_fast_api.metrics"):
+        assert not registry.log_snapshot_if_due(60.0)
+        assert registry.log_snapshot_if_due(60.0, now=registry._last_logged_at + 61.0)
+
+    lines = [
+        r.getMessage()
+        for r in app_caplog.records
+        if r.name == "hakopita_fast_api.metrics"
+    ]
+    assert len(lines) == 1
+    snapshot = json.loads(lines[0])
+    assert snapshot["routes"]["/search_storage"]["requests"] == 1
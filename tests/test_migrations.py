@@ -0,0 +1,105 @@
+import logging
+
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, text
+
+from app.core.logging import setup_logging
+from app.crud.storage_crud import StorageDataCRUD
+from app.models.storage_model import Base
+from app.schemas.storage_schemas import SearchStorageRequest
+
+# ログ設定をセットアップ
+setup_logging("DEBUG")
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def migration_config(tmp_path):
+    """一時的なSQLiteファイルを対象にしたAlembic設定を作成"""
+    config = Config("alembic.ini")
+    database_url = f"sqlite:///{tmp_path / 'migration.db'}"
+    config.set_main_option("sqlalchemy.url", database_url)
+    return config, database_url
+
+
+def test_migrations_match_models(migration_config):
+    """マイグレーション適用後のスキーマがモデル定義と一致することを確認"""
+    config, database_url = migration_config
+
+    command.upgrade(config, "head")
+
+    engine = create_engine(database_url)
+    try:
+        with engine.connect() as connection:
+            diff = compare_metadata(
+                MigrationContext.configure(connection), Base.metadata
+            )
+        assert diff == [], f"モデルとマイグレーションに差分があります: {diff}"
+
+        index_names = {
+            index["name"] for index in inspect(engine).get_indexes("storage_table")
+        }
+        assert {
+            "ix_storage_search_width",
+            "ix_storage_search_depth",
+            "ix_storage_search_height",
+            "ix_storage_search_canonical",
+        } <= index_names
+    finally:
+        engine.dispose()
+
+    # ダウングレードも適用できることを確認
+    command.downgrade(config, "base")
+
+
+@pytest.mark.parametrize(
+    "variant, expected_indexes",
+    [
+        (dict(width=30), ["ix_storage_search_width"]),
+        (dict(depth=30), ["ix_storage_search_depth"]),
+        (dict(height=30), ["ix_storage_search_height"]),
+        (dict(width=30, depth=40, height=20), ["ix_storage_search_"]),
+        (
+            dict(use_width_range=True, width_lower_limit=20, width_upper_limit=40),
+            ["ix_storage_search_width"],
+        ),
+        (dict(width=30, enable_inverted_search=True), ["ix_storage_search_canonical"]),
+        (
+            dict(width=30, depth=40, enable_inverted_search=True),
+            ["ix_storage_search_canonical"],
+        ),
+        (
+            dict(width=40, depth=30, height=20, enable_inverted_search=True),
+            ["ix_storage_search_"],
+        ),
+    ],
+)
+def test_search_predicates_use_composite_indexes(
+    test_engine, test_session_factory, variant, expected_indexes
+):
+    """検索条件の各パターンが複合インデックスを使用することをEXPLAIN QUERY PLANで確認"""
+    Base.metadata.create_all(bind=test_engine)
+    db = test_session_factory()
+    try:
+        params = SearchStorageRequest(country_code="jp", storage_category=0, **variant)
+        query = StorageDataCRUD(db).build_search_query(params)
+        sql = str(
+            query.statement.compile(
+                dialect=test_engine.dialect, compile_kwargs={"literal_binds": True}
+            )
+        )
+        plan = " / ".join(
+            row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {sql}"))
+        )
+        logger.info(f"{variant}: {plan}")
+
+        # テーブル全体のスキャンにならず、期待する複合インデックスを使用していること
+        assert "SCAN storage_table" not in plan
+        for index_name in expected_indexes:
+            assert index_name in plan
+    finally:
+        db.close()
@@ -0,0 +1,128 @@
+import json
+import logging
+
+import lambda_handler
+from app.core import logging as app_logging
+from app.core.logging import flush_logs, setup_logging
+from app.db.session import settings
+
+# ログ設定をセットアップ
+setup_logging("DEBUG")
+logger = logging.getLogger(__name__)
+
+ACCESS_LOGGER_NAME = "hakopita_fast_api.access"
+
+
+def access_log_lines(caplog):
+    """アクセスログの行をJSONとして取得"""
+    return [
+        json.loads(record.getMessage())
+        for record in caplog.records
+        if record.name == ACCESS_LOGGER_NAME
+    ]
+
+
+def health_event():
+    """API Gatewayからの/healthのイベント"""
+    return {
+        "resource": "/health",
+        "path": "/health",
+        "httpMethod": "GET",
+        "headers": {"Host": "example.com"},
+        "multiValueHeaders": {"Host": ["example.com"]},
+        "queryStringParameters": None,
+        "multiValueQueryStringParameters": None,
+        "requestContext": {
+            "resourcePath": "/health",
+            "httpMethod": "GET",
+            "path": "/health",
+        },
+        "body": None,
+        "isBase64Encoded": False,
+    }
+
+
+def test_search_access_log_line(
+    setup_inverted_search_database, test_client, app_caplog
+):
+    """検索1回につき、条件・件数・キャッシュ・処理時間を含む1行のアクセスログが出力されることを確認"""
+    url = "/search_storage?width=20&storage_category=0&country_code=jp"
+    with app_caplog.at_level(logging.INFO, logger=ACCESS_LOGGER_NAME):
+        first = test_client.get(url)
+        second = test_client.get(url)
+
+    lines = access_log_lines(app_caplog)
+    logger.info(f"Access log lines: {lines}")
+    assert len(lines) == 2
+    miss, hit = lines
+    assert miss["route"] == "/search_storage"
+    assert miss["status"] == 200
+    assert miss["params"]["width"] == 20.0
+    assert miss["rows"] == len(first.json()["data"])
+    assert miss["cache"] == "miss"
+    assert miss["db_ms"] > 0
+    # キャッシュヒット時もキャッシュした件数を出力し、DBアクセスは行わない
+    assert hit["rows"] == len(second.json()["data"])
+    assert hit["cache"] == "hit"
+    assert hit["db_ms"] == 0
+    # ペイロードは出力しない
+    assert all(
+        "storage_data_id" not in record.getMessage() for record in app_caplog.records
+    )
+
+
+def test_fetch_access_log_line(setup_inverted_search_database, test_client, app_caplog):
+    """fetch_storageのアクセスログにID数・件数・キャッシュのヒット数が出力されることを確認"""
+    url = "/fetch_storage?id_list=width_20_depth_30_height_25,missing_id"
+    with app_caplog.at_level(logging.INFO, logger=ACCESS_LOGGER_NAME):
+        test_client.get(url)
+        test_client.get(url)
+
+    first, second = access_log_lines(app_caplog)
+    assert first["params"] == {"ids": 2}
+    assert first["rows"] == 1
+    assert first["cache"] == "hit:0,miss:2"
+    assert second["cache"] == "hit:1,miss:1"
+
+
+def test_lambda_handler_does_not_log_payload_by_default(app_caplog, monkeypatch):
+    """サンプリングされない場合、Lambdaのイベント・レスポンス全体はログに出力されないことを確認"""
+    monkeypatch.setattr(settings, "log_payload_sample_rate", 0.0)
+    with app_caplog.at_level(logging.INFO):
+        response = lambda_handler.lambda_handler(health_event(), None)
+
+    assert response["statusCode"] == 200
+    assert not any(
+        "Lambda handler" in record.getMessage() for record in app_caplog.records
+    )
+    assert len(access_log_lines(app_caplog)) == 1
+
+
+def test_lambda_handler_logs_sampled_payload(app_caplog, monkeypatch):
+    """サンプリングされた場合はイベント・レスポンス全体がログに出力されることを確認"""
+    monkeypatch.setattr(settings, "log_payload_sample_rate", 1.0)
+    with app_caplog.at_level(logging.INFO):
+        lambda_handler.lambda_handler(health_event(), None)
+
+    messages = [record.getMessage() for record in app_caplog.records]
+    assert any(
+        message.startswith("Lambda handler called with event") for message in messages
+    )
+    assert any(message.startswith("Lambda handler response") for message in messages)
+
+
+def test_flush_logs_drains_queue_without_restarting_listener(monkeypatch):
+    """flush_logsはリスナーのスレッドを再起動せずにキューのログを出力し切ることを確認"""
+    monkeypatch.setattr(settings, "log_queue_enabled", True)
+    setup_logging("DEBUG")
+    listener = app_logging._queue_listener
+    thread = listener._thread
+
+    assert logging.getLogger("hakopita_fast_api").propagate is False
+    for i in range(100):
+        logging.getLogger("hakopita_fast_api.test").debug(f"message {i}")
+    flush_logs()
+
+    assert listener.queue.unfinished_tasks == 0
+    assert app_logging._queue_listener is listener
+    assert listener._thread is thread
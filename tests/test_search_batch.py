@@ -0,0 +1,133 @@
+import logging
+
+import pytest
+from sqlalchemy import event
+
+from app.core.logging import setup_logging
+from app.db.session import settings
+
+# ログ設定をセットアップ
+setup_logging("DEBUG")
+logger = logging.getLogger(__name__)
+
+BATCH_QUERIES = [
+    {"country_code": "jp", "storage_category": 0, "width": 20},
+    {
+        "country_code": "jp",
+        "storage_category": 0,
+        "width": 20,
+        "enable_inverted_search": True,
+    },
+    {
+        "country_code": "jp",
+        "storage_category": 0,
+        "use_width_range": True,
+        "width_lower_limit": 20,
+        "width_upper_limit": 30,
+    },
+    {"country_code": "jp", "storage_category": 0, "height": 999},
+]
+
+
+def query_string(query: dict) -> str:
+    return "&".join(
+        f"{key}={str(value).lower() if isinstance(value, bool) else value}"
+        for key, value in query.items()
+    )
+
+
+@pytest.mark.parametrize("index_enabled", [False, True])
+def test_batch_matches_individual_searches(
+    setup_inverted_search_database, test_client, monkeypatch, index_enabled
+):
+    """一括検索の結果が、検索条件ごとのsearch_storageの結果と同じ順序・内容であることを確認"""
+    monkeypatch.setattr(settings, "search_index_enabled", index_enabled)
+    monkeypatch.setattr(settings, "search_cache_enabled", False)
+
+    response = test_client.post(
+        "/search_storage/batch", json={"queries": BATCH_QUERIES}
+    )
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert len(results) == len(BATCH_QUERIES)
+    for query, result in zip(BATCH_QUERIES, results):
+        expected = test_client.get(f"/search_storage?{query_string(query)}").json()
+        assert result == expected
+    assert results[3]["total_items"] == 0
+
+
+def test_batch_runs_one_query_for_all_searches(
+    setup_inverted_search_database, test_client, test_async_engine, monkeypatch
+):
+    """キャッシュにない検索条件はUNION ALLの1クエリでまとめて検索されることを確認"""
+    monkeypatch.setattr(settings, "search_cache_enabled", False)
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "storage_table" in statement and "max(" not in statement:
+            statements.append(statement)
+
+    event.listen(test_async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        response = test_client.post(
+            "/search_storage/batch", json={"queries": BATCH_QUERIES[:3]}
+        )
+    finally:
+        event.remove(test_async_engine.sync_engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    assert len(statements) == 1
+    assert "UNION ALL" in statements[0]
+
+
+def test_batch_uses_search_cache(setup_inverted_search_database, test_client):
+    """個別の検索でキャッシュされた結果を一括検索でも使い、一括検索の結果もキャッシュされることを確認"""
+    test_client.get(f"/search_storage?{query_string(BATCH_QUERIES[0])}")
+
+    first = test_client.post(
+        "/search_storage/batch", json={"queries": BATCH_QUERIES[:2]}
+    )
+    second = test_client.get(f"/search_storage?{query_string(BATCH_QUERIES[1])}")
+
+    stats = test_client.get("/cache_stats").json()["search_storage"]
+    assert stats["hits"] == 2
+    assert second.json() == first.json()["results"][1]
+
+
+def test_batch_validation(setup_inverted_search_database, test_client):
+    """サイズ条件のない検索条件・空のリストはエラーになることを確認"""
+    response = test_client.post(
+        "/search_storage/batch",
+        json={
+            "queries": [BATCH_QUERIES[0], {"country_code": "jp", "storage_category": 0}]
+        },
+    )
+    assert response.status_code == 400
+    assert "queries[1]" in response.json()["detail"]
+
+    assert (
+        test_client.post("/search_storage/batch", json={"queries": []}).status_code
+        == 422
+    )
+
+
+@pytest.mark.parametrize(
+    "pagination",
+    [
+        {"page": None},
+        {"page": -1},
+        {"page_size": None},
+        {"page_size": 0},
+        {"page_size": 2001},
+    ],
+)
+def test_batch_invalid_pagination(
+    setup_inverted_search_database, test_client, pagination
+):
+    """検索条件ごとのページ番号・ページサイズがnullや範囲外の場合は422になることを確認"""
+    response = test_client.post(
+        "/search_storage/batch", json={"queries": [{**BATCH_QUERIES[0], **pagination}]}
+    )
+
+    assert response.status_code == 422
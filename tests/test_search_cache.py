@@ -0,0 +1,107 @@
+import logging
+
+from sqlalchemy.orm import sessionmaker
+
+from app.core.cache import TTLCache, data_watermark, search_response_cache
+from app.core.logging import setup_logging
+from app.models.storage_model import StorageData
+
+# ログ設定をセットアップ
+setup_logging("DEBUG")
+logger = logging.getLogger(__name__)
+
+
+def test_search_cache_hit_and_miss(setup_inverted_search_database, test_client):
+    """同じ検索条件の2回目のリクエストはキャッシュから返されることを確認"""
+    url = "/search_storage?width=20&storage_category=0&country_code=jp"
+
+    first = test_client.get(url)
+    second = test_client.get(url)
+
+    assert first.status_code == 200
+    assert second.json() == first.json()
+
+    stats = test_client.get("/cache_stats").json()["search_storage"]
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+    assert stats["entries"] == 1
+
+
+def test_search_cache_key_is_normalized(setup_inverted_search_database, test_client):
+    """数値表記の違いや無効な範囲パラメータは同じキャッシュエントリを使うことを確認"""
+    urls = [
+        "/search_storage?width=20&storage_category=0&country_code=jp",
+        "/search_storage?width=20.0&storage_category=0&country_code=jp",
+        # use_width_range=falseのため範囲パラメータは無視される
+        "/search_storage?width=20&width_lower_limit=10&width_upper_limit=40"
+        "&storage_category=0&country_code=jp",
+    ]
+    responses = [test_client.get(url) for url in urls]
+
+    assert all(response.status_code == 200 for response in responses)
+    assert len(search_response_cache) == 1
+    assert search_response_cache.stats()["hits"] == 2
+
+
+def test_search_cache_invalidated_by_data_update(
+    setup_inverted_search_database, test_client, test_engine, monkeypatch
+):
+    """データが追加されると透かし値が変わり、古いキャッシュが使われないことを確認"""
+    monkeypatch.setattr(data_watermark, "poll_interval_seconds", 0.0)
+    url = "/search_storage?width=20&storage_category=0&country_code=jp"
+
+    before = test_client.get(url).json()
+
+    db = sessionmaker(bind=test_engine)()
+    try:
+        db.add(
+            StorageData(
+                storage_data_id="width_20_depth_40_height_40",
+                storage_category=0,
+                shop_id=6,
+                item_id="item_6",
+                item_title="width_20_depth_40_height_40_title",
+                item_url="https://example.com/item_6",
+                primary_image_url="https://example.com/item_6.jpg",
+                image_url_list=[],
+                materials=[],
+                colors=[],
+                price=6000,
+                ean="ean_6",
+                height=40,
+                width=20,
+                depth=40,
+                country_code="jp",
+                active=True,
+            )
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    after = test_client.get(url).json()
+
+    assert after["total_items"] == before["total_items"] + 1
+    assert search_response_cache.stats()["hits"] == 0
+
+
+def test_ttl_cache_eviction_and_expiration():
+    """件数上限による追い出しと有効期限切れが統計情報に記録されることを確認"""
+    cache = TTLCache(max_entries=2, ttl_seconds=60.0)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    # 最も古く使われた"b"が追い出される
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+    cache.set("d", 4, ttl_seconds=-1.0)
+    assert cache.get("d") is None
+
+    stats = cache.stats()
+    assert stats["evictions"] == 2
+    assert stats["expirations"] == 1
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
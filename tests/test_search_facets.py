@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import threading
+
+import httpx
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.core.cache import data_watermark
+from app.core.logging import setup_logging
+from app.crud.storage_facets import storage_facet_index
+from app.main import app
+from app.models.storage_model import StorageData
+
+# ログ設定をセットアップ
+setup_logging("DEBUG")
+logger = logging.getLogger(__name__)
+
+FACETS_URL = "/search_storage/facets?country_code=jp&storage_category=0"
+
+
+def bucket_counts(buckets):
+    """件数が0でない区間の{下限: 件数}"""
+    return {bucket["lower"]: bucket["count"] for bucket in buckets if bucket["count"]}
+
+
+def update_row(test_engine, storage_data_id, **values):
+    db = sessionmaker(bind=test_engine)()
+    try:
+        db.query(StorageData).filter(
+            StorageData.storage_data_id == storage_data_id
+        ).update(values)
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_facets_counts_and_bounds(setup_inverted_search_database, test_client):
+    """件数と寸法の分布の範囲が返され、反転検索も反映されることを確認"""
+    response = test_client.get(f"{FACETS_URL}&width=20&depth=30")
+    inverted = test_client.get(
+        f"{FACETS_URL}&width=20&depth=30&enable_inverted_search=true"
+    ).json()
+
+    assert response.status_code == 200
+    body = response.json()
+    logger.info(f"Facets response: {body}")
+    assert body["bucket_size"] == 5.0
+    assert body["applied_bounds"] == {
+        "width": [15.0, 25.0],
+        "depth": [25.0, 35.0],
+        "height": None,
+    }
+    assert body["total_items"] == 2
+    assert inverted["total_items"] == 3
+    assert bucket_counts(body["price"]) == {1000: 1, 5000: 1}
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "&use_width_range=true&width_lower_limit=20&width_upper_limit=34",
+        "&width=22",
+        "&width=20&depth=31",
+        "&width=30&depth=20&enable_inverted_search=true",
+        "&use_height_range=true&height_lower_limit=26&height_upper_limit=30",
+    ],
+)
+def test_facets_total_matches_search(
+    setup_inverted_search_database, test_client, query
+):
+    """区間の境界に揃っていない範囲でも、件数と価格の件数がsearch_storageの一致件数と一致することを確認"""
+    facets = test_client.get(f"{FACETS_URL}{query}").json()
+    search = test_client.get(
+        f"/search_storage?country_code=jp&storage_category=0{query}"
+    ).json()
+
+    assert facets["total_items"] == search["total_items"]
+    assert sum(bucket["count"] for bucket in facets["price"]) == search["total_items"]
+    assert facets["approximate_histograms"] is True
+
+
+def test_facets_without_dimension_condition_are_exact(
+    setup_inverted_search_database, test_client
+):
+    """寸法の条件がない場合は寸法の分布も概数とならないことを確認"""
+    body = test_client.get(FACETS_URL).json()
+
+    assert body["approximate_histograms"] is False
+    assert sum(bucket["count"] for bucket in body["width"]) == body["total_items"] == 5
+
+
+def test_facets_concurrent_cold_cube(setup_inverted_search_database, test_client):
+    """未構築のキューブへの同時リクエストがデッドロックせずに完了することを確認"""
+    queries = ["&width=20", "&height=25", "&depth=20&enable_inverted_search=true", ""]
+    results = {}
+
+    async def get_concurrently():
+        async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
+            results["responses"] = await asyncio.gather(
+                *(client.get(f"{FACETS_URL}{query}") for query in queries)
+            )
+
+    # デッドロックした場合はイベントループごと止まるため、別スレッドで実行して待機時間を制限する
+    worker = threading.Thread(
+        target=asyncio.run, args=(get_concurrently(),), daemon=True
+    )
+    worker.start()
+    worker.join(timeout=10)
+
+    assert not worker.is_alive()
+    for query, response in zip(queries, results["responses"]):
+        assert response.status_code == 200
+        assert response.json() == test_client.get(f"{FACETS_URL}{query}").json()
+
+
+def test_facets_dimension_histogram_excludes_own_condition(
+    setup_inverted_search_database, test_client
+):
+    """寸法の分布はその寸法以外の条件に一致するデータで集計されることを確認"""
+    body = test_client.get(f"{FACETS_URL}&width=20&height=25").json()
+
+    assert body["total_items"] == 1
+    # 高さの分布は幅の条件のみを適用（高さ30cmのデータも含む）
+    assert bucket_counts(body["height"]) == {25.0: 1, 30.0: 1}
+    # 幅の分布は高さの条件のみを適用
+    assert bucket_counts(body["width"]) == {20.0: 1, 25.0: 1, 30.0: 1, 35.0: 1}
+    assert body["width"][-1]["upper"] is None
+
+
+def test_facets_cube_refreshed_incrementally(
+    setup_inverted_search_database, test_client, test_engine, monkeypatch
+):
+    """データ更新は差分で反映し、削除や新しい色がある場合は再構築することを確認"""
+    monkeypatch.setattr(data_watermark, "poll_interval_seconds", 0.0)
+    builds = []
+    original_build = storage_facet_index._build_cube
+    monkeypatch.setattr(
+        storage_facet_index,
+        "_build_cube",
+        lambda rows: builds.append(len(rows)) or original_build(rows),
+    )
+    url = f"{FACETS_URL}&width=20"
+    assert test_client.get(url).json()["total_items"] == 2
+
+    update_row(test_engine, "width_25_depth_35_height_25", width=20.0)
+    assert test_client.get(url).json()["total_items"] == 3
+    assert len(builds) == 1
+
+    update_row(test_engine, "width_20_depth_30_height_25", active=False)
+    assert test_client.get(url).json()["total_items"] == 2
+    assert len(builds) == 1
+
+    update_row(test_engine, "width_20_depth_30_height_30", colors=[3])
+    body = test_client.get(url).json()
+    assert body["colors"] == [{"value": 3, "count": 1}]
+    assert len(builds) == 2
+
+
+def test_facets_cube_built_off_event_loop(
+    setup_inverted_search_database, test_client, monkeypatch
+):
+    """キューブの構築がイベントループ外（ワーカースレッド）で行われることを確認"""
+    running_loops = []
+    original_build = storage_facet_index._build_cube
+
+    def build_cube(rows):
+        try:
+            running_loops.append(asyncio.get_running_loop())
+        except RuntimeError:
+            running_loops.append(None)
+        return original_build(rows)
+
+    monkeypatch.setattr(storage_facet_index, "_build_cube", build_cube)
+
+    assert test_client.get(f"{FACETS_URL}&width=20").json()["total_items"] == 2
+    assert running_loops == [None]
+
+
+def test_facets_validation(setup_inverted_search_database, test_client):
+    """不正な国コード・カテゴリは422になることを確認"""
+    url = "/search_storage/facets"
+    assert (
+        test_client.get(f"{url}?country_code=xx&storage_category=0").status_code == 422
+    )
+    assert test_client.get(f"{url}?country_code=jp").status_code == 422
+
+
+def test_facets_rejects_non_finite_values(setup_inverted_search_database, test_client):
+    """NaN・無限大の寸法は（入力値を含まない）422になることを確認"""
+    for query in [
+        "&width=nan",
+        "&depth=inf",
+        "&use_height_range=true&height_lower_limit=nan&height_upper_limit=30",
+    ]:
+        response = test_client.get(f"{FACETS_URL}{query}")
+        assert response.status_code == 422
+        assert all("input" not in error for error in response.json()["detail"])
+
+
+def test_facets_applied_bounds_are_ordered(setup_inverted_search_database, test_client):
+    """下限が上限より大きい範囲でもapplied_boundsは[下限, 上限]の順となることを確認"""
+    query = (
+        "&use_width_range=true&width_lower_limit=40&width_upper_limit=15"
+        "&enable_inverted_search=true"
+    )
+
+    body = test_client.get(f"{FACETS_URL}{query}").json()
+
+    assert body["applied_bounds"]["width"] == [15.0, 45.0]
+    assert body["total_items"] == 0
@@ -0,0 +1,87 @@
+import logging
+
+from app.core.logging import setup_logging
+
+# ログ設定をセットアップ
+setup_logging("DEBUG")
+logger = logging.getLogger(__name__)
+
+FITS_URL = "/search_storage/fits?country_code=jp&storage_category=0"
+
+
+def test_fits_ranked_by_fill_ratio(setup_inverted_search_database, test_client):
+    """空間に収まるデータが充填率の高い順（同じ場合はID順）に返されることを確認"""
+    response = test_client.get(f"{FITS_URL}&width=30&depth=20&height=30")
+
+    assert response.status_code == 200
+    body = response.json()
+    logger.info(f"Fits response: {body}")
+    assert body["total_items"] == 3
+    assert body["has_more"] is False
+    assert [(item["storage_data_id"], item["fill_ratio"]) for item in body["data"]] == [
+        ("width_20_depth_30_height_30", 1.0),
+        ("width_20_depth_30_height_25", 0.8333),
+        ("width_30_depth_20_height_25", 0.8333),
+    ]
+    assert "image_url_list" not in body["data"][0]
+
+
+def test_fits_rotation_modes(setup_inverted_search_database, test_client):
+    """許容する向きによって収まるデータが変わることを確認"""
+    url = f"{FITS_URL}&width=30&depth=25&height=35"
+
+    def matched_ids(rotation):
+        return sorted(
+            item["storage_data_id"]
+            for item in test_client.get(f"{url}&rotation={rotation}").json()["data"]
+        )
+
+    assert matched_ids("none") == ["width_30_depth_20_height_25"]
+    assert matched_ids("horizontal") == [
+        "width_20_depth_30_height_25",
+        "width_20_depth_30_height_30",
+        "width_30_depth_20_height_25",
+    ]
+    # 全ての向きを許容すると、寝かせることで奥行き35cmのデータも収まる
+    assert len(matched_ids("any")) == 5
+
+
+def test_fits_clearance_and_paging(setup_inverted_search_database, test_client):
+    """すき間を差し引いた空間で判定され、ページングされることを確認"""
+    url = f"{FITS_URL}&width=31&depth=21&height=30&clearance=1&page_size=1"
+
+    first = test_client.get(url).json()
+    second = test_client.get(f"{url}&page=1").json()
+
+    assert first["total_items"] == 2
+    assert first["has_more"] is True
+    assert second["has_more"] is False
+    assert [
+        first["data"][0]["storage_data_id"],
+        second["data"][0]["storage_data_id"],
+    ] == [
+        "width_20_depth_30_height_25",
+        "width_30_depth_20_height_25",
+    ]
+
+
+def test_fits_validation(setup_inverted_search_database, test_client):
+    """向き・すき間・寸法の不正な値は422になることを確認"""
+    for params in [
+        "&width=30&depth=20&height=30&rotation=diagonal",
+        "&width=30&depth=20&height=30&clearance=-1",
+        "&width=0&depth=20&height=30",
+    ]:
+        assert test_client.get(f"{FITS_URL}{params}").status_code == 422
+
+
+def test_fits_rejects_non_finite_values(setup_inverted_search_database, test_client):
+    """NaN・無限大の寸法・すき間は（入力値を含まない）422になることを確認"""
+    for params in [
+        "&width=nan&depth=20&height=30",
+        "&width=30&depth=inf&height=30",
+        "&width=30&depth=20&height=30&clearance=nan",
+    ]:
+        response = test_client.get(f"{FITS_URL}{params}")
+        assert response.status_code == 422
+        assert all("input" not in error for error in response.json()["detail"])
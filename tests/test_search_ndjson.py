@@ -0,0 +1,107 @@
+import json
+import logging
+from contextlib import contextmanager
+
+import pytest
+
+from app.core.logging import setup_logging
+from app.crud import storage_crud
+from app.db.session import settings
+from app.routers import storage_router
+
+# ログ設定をセットアップ
+setup_logging("DEBUG")
+logger = logging.getLogger(__name__)
+
+SEARCH_URL = (
+    "/search_storage?country_code=jp&storage_category=0&width=20&depth=30"
+    "&enable_inverted_search=true"
+)
+
+
+def parse_ndjson(response):
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    return lines[:-1], lines[-1]["meta"]
+
+
+@pytest.mark.parametrize("index_enabled", [False, True])
+def test_search_ndjson_matches_json(
+    setup_inverted_search_database, test_client, monkeypatch, index_enabled
+):
+    """NDJSONの各行と最後のmeta行が、JSONのレスポンスと同じ内容になることを確認"""
+    monkeypatch.setattr(settings, "search_index_enabled", index_enabled)
+    # 複数回に分けて読み込まれるようにする
+    monkeypatch.setattr(settings, "search_stream_chunk_size", 1)
+
+    expected = test_client.get(SEARCH_URL).json()
+    response = test_client.get(f"{SEARCH_URL}&format=ndjson")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows, meta = parse_ndjson(response)
+    logger.info(f"NDJSON rows: {rows}, meta: {meta}")
+    assert len(rows) == 3
+    assert rows == expected["data"]
+    assert meta == {key: value for key, value in expected.items() if key != "data"}
+
+
+def test_search_ndjson_accept_header_and_paging(
+    setup_inverted_search_database, test_client
+):
+    """Acceptヘッダーでも選択でき、next_page_urlでNDJSONの次のページを取得できることを確認"""
+    response = test_client.get(
+        f"{SEARCH_URL}&page_size=1", headers={"Accept": "application/x-ndjson"}
+    )
+
+    rows, meta = parse_ndjson(response)
+    assert len(rows) == 1
+    assert meta["has_more"] is True
+    assert meta["next_page_url"].endswith("&format=ndjson")
+
+    next_rows, next_meta = parse_ndjson(test_client.get(f"/{meta['next_page_url']}"))
+    assert next_rows[0]["storage_data_id"] > rows[0]["storage_data_id"]
+    assert next_meta["page"] == 1
+
+
+def test_search_ndjson_out_of_range_page_and_invalid_format(
+    setup_inverted_search_database, test_client
+):
+    """範囲外のページではmeta行のみが返され、不正なformatは422になることを確認"""
+    rows, meta = parse_ndjson(
+        test_client.get(f"{SEARCH_URL}&page=5&page_size=1&format=ndjson")
+    )
+
+    assert rows == []
+    assert meta["total_items"] > 0
+    assert meta["has_more"] is False
+    assert test_client.get(f"{SEARCH_URL}&format=csv").status_code == 422
+
+
+@pytest.mark.parametrize("index_enabled", [False, True])
+def test_search_ndjson_db_time_not_nested(
+    setup_inverted_search_database, test_client, monkeypatch, index_enabled
+):
+    """NDJSONの読み込みでDBの時間を二重に計測しない（track_time("db")が入れ子にならない）ことを確認"""
+    monkeypatch.setattr(settings, "search_index_enabled", index_enabled)
+    monkeypatch.setattr(settings, "search_stream_chunk_size", 1)
+    depth = {"current": 0, "max": 0}
+
+    @contextmanager
+    def recording_track_time(kind):
+        if kind != "db":
+            yield
+            return
+        depth["current"] += 1
+        depth["max"] = max(depth["max"], depth["current"])
+        try:
+            yield
+        finally:
+            depth["current"] -= 1
+
+    monkeypatch.setattr(storage_router, "track_time", recording_track_time)
+    monkeypatch.setattr(storage_crud, "track_time", recording_track_time)
+
+    response = test_client.get(f"{SEARCH_URL}&format=ndjson")
+
+    assert response.status_code == 200
+    assert depth["max"] == 1
@@ -0,0 +1,98 @@
+import logging
+
+import numpy as np
+
+from app.core.logging import setup_logging
+from app.crud.storage_index import DimensionGrid
+
+# ログ設定をセットアップ
+setup_logging("DEBUG")
+logger = logging.getLogger(__name__)
+
+NEAREST_URL = "/search_storage/nearest?country_code=jp&storage_category=0"
+
+
+def test_grid_nearest_matches_brute_force():
+    """グリッドでの近傍検索が全件の距離計算と同じ結果になることを確認"""
+    rng = np.random.default_rng(0)
+    points = np.round(rng.lognormal(np.log(30), 0.35, (5000, 3)) * 2) / 2
+    grid = DimensionGrid(points, cell_size=5.0)
+
+    for query, weights in [
+        ((41.3, 30.0, 25.0), (1.0, 1.0, 1.0)),
+        ((5.0, 5.0, 5.0), (1.0, 2.0, 0.5)),
+        ((300.0, 10.0, 300.0), (1.0, 1.0, 1.0)),
+    ]:
+        query, weights = np.array(query), np.array(weights)
+        _, distances = grid.nearest(query, weights, k=20)
+        expected = np.sort(np.sqrt((((points - query) * weights) ** 2).sum(axis=1)))[
+            :20
+        ]
+        assert np.allclose(distances, expected)
+
+
+def test_nearest_returns_closest_items_in_order(
+    setup_inverted_search_database, test_client
+):
+    """一致するデータがない寸法でも、近い順にk件が距離付きで返されることを確認"""
+    response = test_client.get(f"{NEAREST_URL}&width=30.4&depth=20&height=25.3&k=2")
+
+    assert response.status_code == 200
+    data = response.json()["data"]
+    logger.info(f"Nearest response: {data}")
+    assert [item["storage_data_id"] for item in data] == [
+        "width_30_depth_20_height_25",
+        "width_35_depth_25_height_25",
+    ]
+    assert data[0]["distance"] == 0.5
+    assert data[0]["rotated"] is False
+    assert "image_url_list" not in data[0]
+
+
+def test_nearest_orientation_invariant(setup_inverted_search_database, test_client):
+    """orientation_invariantの場合、幅と奥行きを入れ替えた向きでの距離も使われることを確認"""
+    url = f"{NEAREST_URL}&width=20.2&depth=30&height=25&k=2"
+
+    fixed = test_client.get(url).json()["data"]
+    invariant = test_client.get(f"{url}&orientation_invariant=true").json()["data"]
+
+    assert fixed[0]["storage_data_id"] == "width_20_depth_30_height_25"
+    assert fixed[1]["distance"] > 1
+    assert [(item["storage_data_id"], item["rotated"]) for item in invariant] == [
+        ("width_20_depth_30_height_25", False),
+        ("width_30_depth_20_height_25", True),
+    ]
+    assert invariant[1]["distance"] == invariant[0]["distance"]
+
+
+def test_nearest_axis_weights(setup_inverted_search_database, test_client):
+    """軸ごとの重みで近さの順位が変わることを確認"""
+    url = f"{NEAREST_URL}&width=23&depth=32&height=25&k=1"
+
+    width_weighted = test_client.get(f"{url}&width_weight=2").json()["data"]
+    depth_weighted = test_client.get(f"{url}&depth_weight=2").json()["data"]
+
+    assert width_weighted[0]["storage_data_id"] == "width_25_depth_35_height_25"
+    assert depth_weighted[0]["storage_data_id"] == "width_20_depth_30_height_25"
+
+
+def test_nearest_validation(setup_inverted_search_database, test_client):
+    """件数・重み・寸法の不正な値は422になることを確認"""
+    for params in [
+        "&width=20&depth=30&height=25&k=0",
+        "&width=20&depth=30&height=25&height_weight=0",
+        "&width=-1&depth=30&height=25",
+    ]:
+        assert test_client.get(f"{NEAREST_URL}{params}").status_code == 422
+
+
+def test_nearest_rejects_non_finite_values(setup_inverted_search_database, test_client):
+    """NaN・無限大の寸法・重みは（入力値を含まない）422になることを確認"""
+    for params in [
+        "&width=nan&depth=30&height=25",
+        "&width=20&depth=inf&height=25",
+        "&width=20&depth=30&height=25&width_weight=nan",
+    ]:
+        response = test_client.get(f"{NEAREST_URL}{params}")
+        assert response.status_code == 422
+        assert all("input" not in error for error in response.json()["detail"])
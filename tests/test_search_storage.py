@@ -1,5 +1,8 @@
 import logging
 from app.core.logging import setup_logging
+from app.crud.storage_crud import StorageDataCRUD
+from app.models.storage_model import StorageData
+from app.schemas.storage_schemas import SearchCursor, SearchStorageRequest, StorageDataSearchResponse
 
 # ログ設定をセットアップ
 setup_logging("DEBUG")
@@ -426,3 +429,169 @@ def test_inverted_search_width_range_20_30cm(setup_inverted_search_database, tes
 
     # 反転検索で結果が増えることを確認
     assert data_inverted["total_items"] > data_normal["total_items"]
+
+
+def test_search_storage_pagination_in_sql(setup_inverted_search_database, test_client):
+    """ページネーションと総件数がDB側で正しく計算されることを確認"""
+    logger.info("DB側ページネーションのテストを開始")
+
+    base_url = "/search_storage?height=25&storage_category=0&country_code=jp&page_size=3"
+
+    first_page = test_client.get(f"{base_url}&page=0").json()
+    second_page = test_client.get(f"{base_url}&page=1").json()
+    out_of_range_page = test_client.get(f"{base_url}&page=5").json()
+
+    # 高さ25cmのデータは4件
+    assert first_page["total_items"] == 4
+    assert first_page["total_pages"] == 2
+    assert len(first_page["data"]) == 3
+    assert first_page["has_more"] is True
+
+    assert second_page["total_items"] == 4
+    assert len(second_page["data"]) == 1
+    assert second_page["has_more"] is False
+
+    # 範囲外のページでも総件数は返される
+    assert out_of_range_page["total_items"] == 4
+    assert out_of_range_page["data"] == []
+
+    ids = [item["storage_data_id"] for item in first_page["data"] + second_page["data"]]
+    assert len(set(ids)) == 4
+
+
+def test_search_by_params_loads_only_one_page(setup_inverted_search_database, test_session_factory):
+    """search_by_paramsがページ分の行のみを返し、総件数を併せて返すことを確認"""
+    db = test_session_factory()
+    try:
+        crud = StorageDataCRUD(db)
+        params = SearchStorageRequest(height=25, storage_category=0, country_code="jp")
+
+        rows, total_items = crud.search_by_params(params, page=0, page_size=2)
+        assert len(rows) == 2
+        assert total_items == 4
+
+        all_rows, total_items = crud.search_by_params(params)
+        assert len(all_rows) == 4
+        assert total_items == 4
+    finally:
+        db.close()
+
+
+def _collect_all_pages(test_client, url):
+    """next_page_urlをたどって全ページのIDとページ情報を取得する"""
+    ids = []
+    pages = []
+    while url:
+        response = test_client.get(url)
+        assert response.status_code == 200
+        data = response.json()
+        ids.extend(item["storage_data_id"] for item in data["data"])
+        pages.append(data)
+        url = f"/{data['next_page_url']}" if data["next_page_url"] else None
+    return ids, pages
+
+
+def test_search_storage_cursor_pagination(setup_inverted_search_database, test_client):
+    """カーソルによるページ送りで全件が重複なくID順に取得できることを確認"""
+    logger.info("カーソルページネーションのテストを開始")
+
+    ids, pages = _collect_all_pages(
+        test_client, "/search_storage?height=25&storage_category=0&country_code=jp&page_size=1"
+    )
+
+    assert ids == sorted(ids)
+    assert len(ids) == len(set(ids)) == 4
+    assert [page["page"] for page in pages] == [0, 1, 2, 3]
+    assert all(page["total_items"] == 4 for page in pages)
+    assert pages[-1]["has_more"] is False
+
+    # next_page_urlはページ番号ではなくカーソルを持つ
+    assert "cursor=" in pages[0]["next_page_url"]
+    assert "page=" not in pages[0]["next_page_url"]
+
+
+def test_search_storage_cursor_keeps_range_params(setup_inverted_search_database, test_client):
+    """カーソルに範囲指定を含む検索条件が保持されることを確認"""
+    logger.info("カーソルの検索条件保持テストを開始")
+
+    ids, pages = _collect_all_pages(
+        test_client,
+        "/search_storage?width_lower_limit=20&width_upper_limit=30&use_width_range=true"
+        "&enable_inverted_search=true&storage_category=0&country_code=jp&page_size=2",
+    )
+
+    # 範囲検索（反転あり）は5件一致する
+    assert len(ids) == len(set(ids)) == 5
+    assert len(pages) == 3
+
+
+def test_search_storage_invalid_cursor(setup_database, test_client):
+    """不正なカーソルの場合は400が返ることを確認"""
+    response = test_client.get("/search_storage?cursor=invalid")
+
+    assert response.status_code == 400
+
+
+def test_search_storage_tampered_cursor(setup_database, test_client):
+    """デコードできるが検索条件が不正なカーソルの場合も400が返ることを確認"""
+    cursor = SearchCursor(
+        query={"country_code": "xx", "storage_category": 0, "width": 20.0},
+        page=1,
+        page_size=10,
+        last_id="id_1",
+    ).encode()
+
+    response = test_client.get(f"/search_storage?cursor={cursor}")
+
+    assert response.status_code == 400
+
+
+def test_search_by_params_selects_only_response_columns(setup_database, test_session_factory):
+    """search_by_paramsが検索レスポンスに必要な列のみを読み込むことを確認"""
+    db = test_session_factory()
+    try:
+        crud = StorageDataCRUD(db)
+        params = SearchStorageRequest(width=20, storage_category=0, country_code="jp")
+
+        rows, total_items = crud.search_by_params(params)
+
+        assert total_items == 1
+        loaded_columns = set(rows[0]._fields)
+        assert "image_url_list" not in loaded_columns
+        assert "box_likelihood" not in loaded_columns
+        assert "shelf_likelihood" not in loaded_columns
+        assert set(StorageDataSearchResponse.model_fields) <= loaded_columns
+    finally:
+        db.close()
+
+
+def test_search_storage_skips_invalid_rows(setup_inverted_search_database, test_client, test_session_factory):
+    """スキーマに変換できないデータはスキップされ、他のデータは返されることを確認"""
+    db = test_session_factory()
+    try:
+        item = db.get(StorageData, "width_20_depth_30_height_25")
+        item.colors = ["red"]  # List[int]に変換できない
+        db.commit()
+    finally:
+        db.close()
+
+    response = test_client.get("/search_storage?width=20&storage_category=0&country_code=jp")
+
+    assert response.status_code == 200
+    returned_ids = {item["storage_data_id"] for item in response.json()["data"]}
+    assert returned_ids == {"width_20_depth_30_height_30"}
+
+
+def test_search_storage_converts_rows_in_bulk(setup_inverted_search_database, test_client, monkeypatch):
+    """正常なデータは1件ずつのmodel_validateを使わずに一括で変換されることを確認"""
+
+    def fail_model_validate(*args, **kwargs):
+        raise AssertionError("model_validate should not be called per row")
+
+    monkeypatch.setattr(StorageDataSearchResponse, "model_validate", fail_model_validate)
+
+    response = test_client.get("/search_storage?width=20&storage_category=0&country_code=jp")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert len(response.json()["data"]) == 2
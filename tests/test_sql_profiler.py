@@ -0,0 +1,152 @@
+import logging
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.logging import setup_logging
+from app.crud.storage_crud import AsyncStorageDataCRUD
+from app.db.profiler import QueryProfiler, fingerprint
+from app.db.session import settings, sql_profiler
+from app.schemas.storage_schemas import SearchStorageRequest
+
+# ログ設定をセットアップ
+setup_logging("DEBUG")
+logger = logging.getLogger(__name__)
+
+
+def test_fingerprint_normalizes_literals_and_in_lists():
+    """値やINリストの件数だけが異なるSQLは同じフィンガープリントになることを確認"""
+    a = fingerprint(
+        "SELECT *  FROM storage_data\nWHERE width = 20 AND storage_data_id IN (?, ?)"
+    )
+    b = fingerprint(
+        "SELECT * FROM storage_data WHERE width = 35.5 "
+        "AND storage_data_id IN (?, ?, ?, ?)"
+    )
+    c = fingerprint(
+        "SELECT * FROM storage_data WHERE width = %s AND storage_data_id IN (%s)"
+    )
+
+    assert (
+        a
+        == b
+        == c
+        == "SELECT * FROM storage_data WHERE width = ? AND storage_data_id IN (...)"
+    )
+    assert fingerprint("SELECT 'a''b', anon_1 FROM t1") == "SELECT ?, anon_1 FROM t1"
+
+
+def test_profiler_aggregates_and_explains_slow_queries(tmp_path, app_caplog):
+    """フィンガープリントごとに集計し、閾値を超えたSELECTの実行計画を取得することを確認"""
+    engine = create_engine(f"sqlite:///{tmp_path}/profile.db")
+    profiler = QueryProfiler(slow_query_seconds=0.0)
+    profiler.attach(engine)
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE item (id INTEGER PRIMARY KEY, width REAL)"))
+            conn.execute(
+                text("INSERT INTO item (width) VALUES (:w)"), [{"w": 10}, {"w": 20}]
+            )
+        with app_caplog.at_level(logging.WARNING, logger="hakopita_fast_api.sql"):
+            with engine.connect() as conn:
+                for width in (10, 20, 30):
+                    rows = conn.execute(
+                        text("SELECT id FROM item WHERE width = :w"), {"w": width}
+                    ).all()
+                    # EXPLAINを実行しても元のクエリの結果は取得できる
+                    assert len(rows) == (1 if width < 30 else 0)
+    finally:
+        profiler.detach(engine)
+        engine.dispose()
+
+    report = {entry["fingerprint"]: entry for entry in profiler.report()}
+    logger.info(f"SQL profile: {report}")
+    select = report["SELECT id FROM item WHERE width = ?"]
+    assert select["count"] == 3
+    assert select["slow_count"] == 3
+    assert select["explain"] and "detail" in select["explain"][0]
+    # executemanyやSELECT以外はEXPLAINを取得しない
+    assert report["INSERT INTO item (width) VALUES (?)"]["explain"] is None
+    assert any("Slow query" in record.getMessage() for record in app_caplog.records)
+
+
+def test_profiler_discards_start_time_of_failed_query(tmp_path):
+    """実行に失敗したSQLの開始時刻が接続に残らないことを確認"""
+    engine = create_engine(f"sqlite:///{tmp_path}/profile.db")
+    profiler = QueryProfiler()
+    profiler.attach(engine)
+    try:
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing_table"))
+            assert conn.info["query_started_at"] == []
+            conn.execute(text("SELECT 1"))
+            assert conn.info["query_started_at"] == []
+    finally:
+        profiler.detach(engine)
+        engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_profiler_does_not_explain_streamed_query(
+    setup_database, test_async_engine
+):
+    """サーバーサイドカーソルで読み込むSQLはスロークエリでもEXPLAINせず、全件を読み込めることを確認"""
+    profiler = QueryProfiler(slow_query_seconds=0.0)
+    profiler.attach(test_async_engine.sync_engine)
+    params = SearchStorageRequest(
+        country_code="jp",
+        storage_category=0,
+        use_width_range=True,
+        width_lower_limit=0,
+        width_upper_limit=1000,
+    )
+    try:
+        async with AsyncSession(test_async_engine) as db:
+            crud = AsyncStorageDataCRUD(db)
+            streamed = []
+            async for rows in crud.stream_search_by_params(params, chunk_size=1):
+                streamed.extend(rows)
+            _, total_items = await crud.search_by_params(params)
+    finally:
+        profiler.detach(test_async_engine.sync_engine)
+
+    assert len(streamed) == total_items > 1
+    slow_selects = [
+        entry
+        for entry in profiler.report()
+        if "FROM storage_table" in entry["fingerprint"]
+    ]
+    assert slow_selects and all(entry["slow_count"] >= 1 for entry in slow_selects)
+    # ストリーミングしたSQLのみEXPLAINを取得していない
+    assert sorted(entry["explain"] is None for entry in slow_selects) == [False, True]
+
+
+def test_sql_profile_endpoint(
+    setup_inverted_search_database, test_client, test_async_engine, capsys, monkeypatch
+):
+    """検索で発行したSQLが/debug/sql_profileで確認でき、標準出力には出力されないことを確認"""
+    monkeypatch.setattr(settings, "sql_profile_endpoint_enabled", True)
+    sql_profiler.reset()
+    sql_profiler.attach(test_async_engine.sync_engine)
+    try:
+        test_client.get("/search_storage?width=20&storage_category=0&country_code=jp")
+        response = test_client.get("/debug/sql_profile")
+    finally:
+        sql_profiler.detach(test_async_engine.sync_engine)
+        sql_profiler.reset()
+
+    assert response.status_code == 200
+    queries = response.json()["queries"]
+    assert any(
+        "FROM storage_table" in q["fingerprint"] and q["count"] >= 1 for q in queries
+    )
+    assert "SELECT" not in capsys.readouterr().out
+
+
+def test_sql_profile_endpoint_disabled_by_default(test_client, monkeypatch):
+    """SQL_PROFILE_ENDPOINT_ENABLEDを有効にしない場合は（DEBUGが有効でも）公開しないことを確認"""
+    monkeypatch.setattr(settings, "debug", True)
+    assert test_client.get("/debug/sql_profile").status_code == 404
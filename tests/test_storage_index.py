@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import threading
+
+import httpx
+import pytest
+
+from app.core.logging import setup_logging
+from app.crud.storage_index import storage_index
+from app.db.session import settings
+from app.main import app
+
+# ログ設定をセットアップ
+setup_logging("DEBUG")
+logger = logging.getLogger(__name__)
+
+
+# インデックス経由とSQL経由で結果が一致することを確認する検索条件
+SEARCH_QUERIES = [
+    "width=20",
+    "depth=20",
+    "height=25",
+    "width=20&depth=30",
+    "width=20&enable_inverted_search=true",
+    "depth=20&enable_inverted_search=true",
+    "width=20&depth=30&enable_inverted_search=true",
+    "height=30&enable_inverted_search=true",
+    "width_lower_limit=20&width_upper_limit=30&use_width_range=true",
+    "width_lower_limit=20&width_upper_limit=30&use_width_range=true"
+    "&enable_inverted_search=true",
+    "width=25&depth_lower_limit=30&depth_upper_limit=40&use_depth_range=true"
+    "&enable_inverted_search=true",
+    "width=30&depth=20&enable_inverted_search=true",
+    "width=35&depth=25&height=25&enable_inverted_search=true",
+    # 一方の範囲が他方を含む反転検索
+    "width_lower_limit=15&width_upper_limit=40&use_width_range=true"
+    "&depth_lower_limit=22&depth_upper_limit=28&use_depth_range=true"
+    "&enable_inverted_search=true",
+    "width=100",
+]
+
+
+@pytest.fixture
+def enable_search_index(monkeypatch):
+    """検索用インメモリインデックスを有効にする"""
+    monkeypatch.setattr(settings, "search_index_enabled", True)
+
+
+def _search(test_client, query):
+    response = test_client.get(
+        f"/search_storage?{query}&storage_category=0&country_code=jp"
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.mark.parametrize("query", SEARCH_QUERIES)
+def test_search_index_matches_sql(
+    setup_inverted_search_database, test_client, monkeypatch, query
+):
+    """インデックス経由の検索結果がSQL経由の検索結果と一致することを確認"""
+    logger.info(f"インデックス検索の整合性テストを開始: {query}")
+
+    sql_data = _search(test_client, query)
+
+    monkeypatch.setattr(settings, "search_index_enabled", True)
+    index_data = _search(test_client, query)
+
+    sql_ids = sorted(item["storage_data_id"] for item in sql_data["data"])
+    index_ids = [item["storage_data_id"] for item in index_data["data"]]
+
+    assert index_data["total_items"] == sql_data["total_items"]
+    # インデックス経由ではID順に並ぶ
+    assert index_ids == sql_ids
+
+
+def test_search_index_pagination(
+    setup_inverted_search_database, test_client, enable_search_index
+):
+    """インデックス経由のページネーションのテスト"""
+    query = "height=25&page_size=2"
+
+    first_page = _search(test_client, f"{query}&page=0")
+    second_page = _search(test_client, f"{query}&page=1")
+
+    assert first_page["total_items"] == 4
+    assert first_page["total_pages"] == 2
+    assert first_page["has_more"] is True
+    assert second_page["has_more"] is False
+
+    ids = [item["storage_data_id"] for item in first_page["data"] + second_page["data"]]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == 4
+
+
+def test_search_index_excludes_inactive(
+    setup_database_with_active_data, test_client, enable_search_index
+):
+    """インデックスにはactive=Trueのデータのみが含まれることを確認"""
+    data = _search(test_client, "width=20")
+
+    assert data["total_items"] == 1
+    assert data["data"][0]["storage_data_id"] == "active_true_2"
+    assert "image_url_list" not in data["data"][0]
+
+
+def test_search_index_partition_is_reused(
+    setup_inverted_search_database, test_client, enable_search_index
+):
+    """パーティションが構築後に再利用されることを確認"""
+    _search(test_client, "width=20")
+    partition = storage_index._partitions[("jp", 0)]
+
+    _search(test_client, "height=30")
+
+    assert storage_index._partitions[("jp", 0)] is partition
+    assert len(partition) == 5
+
+
+def test_search_index_cursor_pagination(
+    setup_inverted_search_database, test_client, enable_search_index
+):
+    """インデックス経由でもカーソルによるページ送りができることを確認"""
+    url = "/search_storage?height=25&page_size=3&storage_category=0&country_code=jp"
+
+    first_page = test_client.get(url).json()
+    second_page = test_client.get(f"/{first_page['next_page_url']}").json()
+
+    ids = [item["storage_data_id"] for item in first_page["data"] + second_page["data"]]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == 4
+    assert second_page["page"] == 1
+    assert second_page["total_items"] == 4
+    assert second_page["has_more"] is False
+
+
+def test_search_index_concurrent_cold_partition(
+    setup_inverted_search_database, test_client, enable_search_index
+):
+    """未構築のパーティションへの同時検索がデッドロックせずに完了することを確認"""
+    queries = [
+        "width=20",
+        "height=25",
+        "depth=20&enable_inverted_search=true",
+        "height=30",
+    ]
+    results = {}
+
+    async def search_concurrently():
+        async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
+            responses = await asyncio.gather(
+                *(
+                    client.get(
+                        f"/search_storage?{query}&storage_category=0&country_code=jp"
+                    )
+                    for query in queries
+                )
+            )
+        results["responses"] = responses
+
+    # デッドロックした場合はイベントループごと止まるため、別スレッドで実行して待機時間を制限する
+    worker = threading.Thread(
+        target=asyncio.run, args=(search_concurrently(),), daemon=True
+    )
+    worker.start()
+    worker.join(timeout=10)
+
+    assert not worker.is_alive()
+    responses = results["responses"]
+    assert [response.status_code for response in responses] == [200] * len(queries)
+    for query, response in zip(queries, responses):
+        assert (
+            response.json()["total_items"] == _search(test_client, query)["total_items"]
+        )
+    assert len(storage_index._partitions[("jp", 0)]) == 5
+
+
+def test_search_index_partition_built_off_event_loop(
+    setup_inverted_search_database, test_client, enable_search_index, monkeypatch
+):
+    """パーティションのNumPy配列への変換がイベントループ外（ワーカースレッド）で行われることを確認"""
+    running_loops = []
+    original_build = storage_index._build_partition
+
+    def build_partition(rows):
+        try:
+            running_loops.append(asyncio.get_running_loop())
+        except RuntimeError:
+            running_loops.append(None)
+        return original_build(rows)
+
+    monkeypatch.setattr(storage_index, "_build_partition", build_partition)
+
+    assert _search(test_client, "width=20")["total_items"] == 2
+    assert running_loops == [None]